@@ -0,0 +1,151 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from lms_backend.caching import cache_is_shared
+from .models import User
+from .roles import attach_role
+
+PRINCIPAL_CACHE_TIMEOUT = getattr(settings, 'PRINCIPAL_CACHE_TIMEOUT', 300)
+PRINCIPAL_LOCAL_CACHE_SIZE = getattr(settings, 'PRINCIPAL_LOCAL_CACHE_SIZE', 2048)
+PRINCIPAL_LOCAL_CACHE_TIMEOUT = getattr(settings, 'PRINCIPAL_LOCAL_CACHE_TIMEOUT', 5)
+
+
+class PrincipalLRU:
+    """
+    Small thread-safe LRU of pickled principals, local to this process.
+
+    Entries are keyed by (user id, profile version) so a version bump made by
+    any process makes the old entries unreachable; they simply age out. Each
+    entry also expires after ``timeout`` seconds, which bounds how long a
+    worker can miss a bump it doesn't see.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return payload
+
+    def set(self, key, payload):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_principals = PrincipalLRU(PRINCIPAL_LOCAL_CACHE_SIZE, PRINCIPAL_LOCAL_CACHE_TIMEOUT)
+
+
+def _version_key(user_id):
+    return f'accounts:principal-version:{user_id}'
+
+
+def _cache_timeout():
+    # A per-process cache is as blind to other workers' bumps as the LRU
+    return PRINCIPAL_CACHE_TIMEOUT if cache_is_shared() else PRINCIPAL_LOCAL_CACHE_TIMEOUT
+
+
+def principal_version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # A fresh, never reused value: an evicted or expired version key must
+        # not make an older cached payload reachable again.
+        cache.add(_version_key(user_id), time.time_ns(), _cache_timeout())
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def invalidate_principal(user_id):
+    """Make every cached copy of this user's principal stale."""
+    cache.set(_version_key(user_id), time.time_ns(), _cache_timeout())
+
+
+def load_principal(user_id):
+    """
+    Return the user with their student/instructor profile attached, or None.
+
+    Served from the process-local LRU, then the shared cache, then a single
+    ``select_related`` query. A new instance is returned on every call so
+    request handlers can't mutate each other's copy.
+    """
+    version = principal_version(user_id)
+    local_key = (user_id, version)
+    payload = local_principals.get(local_key)
+    if payload is None:
+        shared_key = f'accounts:principal:{user_id}:{version}'
+        payload = cache.get(shared_key)
+        if payload is None:
+            user = User.objects.select_related('student', 'instructor').filter(pk=user_id).first()
+            if user is None:
+                return None
+            payload = pickle.dumps(user, pickle.HIGHEST_PROTOCOL)
+            cache.set(shared_key, payload, _cache_timeout())
+        local_principals.set(local_key, payload)
+    return pickle.loads(payload)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user and their role profile with one
+    query and caches the result, so ``request.user.student`` and
+    ``request.user.instructor`` cost nothing on later requests.
+
+    It also sets ``request.role`` and ``request.profile`` for the
+    authenticated user (see accounts.roles).
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            attach_role(request._request, result[0])
+        return result
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = load_principal(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
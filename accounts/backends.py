@@ -1,6 +1,7 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
 from django.db.models import Q
+from django.db.models.functions import Lower
 
 User = get_user_model()
 
@@ -18,11 +19,12 @@ class EmailBackend(ModelBackend):
             
             # If no username, try email authentication
             if email:
-                query = Q(email__iexact=email) & Q(is_active=True)
+                # Matches the functional index on (lower(email), role)
+                query = Q(email_lower=email.lower()) & Q(is_active=True)
                 if role:
                     query &= Q(role=role)
                 
-                user = User.objects.get(query)
+                user = User.objects.annotate(email_lower=Lower('email')).get(query)
                 print(f"Found user: {user.username}, Role: {user.role}")  # Debug print
                 
                 if user.check_password(password):
@@ -43,7 +45,7 @@ class EmailBackend(ModelBackend):
         except User.MultipleObjectsReturned:
             print(f"Multiple users found with email: {email}")  # Debug print
             # If multiple users found, get the most recently created one
-            user = User.objects.filter(query).order_by('-date_joined').first()
+            user = User.objects.annotate(email_lower=Lower('email')).filter(query).order_by('-date_joined').first()
             if user and user.check_password(password):
                 return user
             return None
@@ -51,6 +53,6 @@ class EmailBackend(ModelBackend):
 
     def get_user(self, user_id):
         try:
-            return User.objects.get(pk=user_id, is_active=True)
+            return User.objects.select_related('student', 'instructor').get(pk=user_id, is_active=True)
         except User.DoesNotExist:
             return None 
\ No newline at end of file
@@ -0,0 +1,152 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from lms_backend.caching import cache_is_shared
+
+FILTER_SETTINGS = {
+    'CAPACITY': 1000000,
+    'ERROR_RATE': 0.001,
+    'MAX_STALENESS': 5,
+    # None: only when the cache is shared, so every worker sees new rows at once
+    'ENABLED': None,
+    **getattr(settings, 'TOKEN_BLACKLIST_FILTER', {}),
+}
+
+GENERATION_KEY = 'accounts:token-blacklist-generation'
+
+# Ids come from a sequence but rows may commit out of order: ids skipped
+# below the high-water mark are re-read on each sync until they show up or
+# are this many seconds old (rolled back, or pruned).
+SYNC_GAP_TTL = 60
+# Gaps wider than this are pruned rows or a restarted sequence, not commits in flight
+SYNC_MAX_GAP = 1000
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on blake2b)."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        positions = self._positions(item)
+        if all(self.bits[p >> 3] & (1 << (p & 7)) for p in positions):
+            return
+        for position in positions:
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class BlacklistFilter:
+    """
+    In-process summary of ``BlacklistedToken`` jtis.
+
+    A miss means the token is definitely not blacklisted, so the refresh can
+    skip the blacklist query; a hit falls through to the database. New rows
+    are folded in by id, past the high-water mark, whenever the shared
+    generation counter changes (bumped on every new blacklist row) or
+    ``MAX_STALENESS`` seconds pass.
+
+    Without a shared cache other workers wouldn't see the generation change,
+    so by default the filter is off there and every refresh asks the database.
+    """
+
+    def __init__(self, capacity, error_rate, max_staleness):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        self._filter = None
+        self._high_water = 0
+        self._gaps = {}
+        self._generation = None
+        self._synced_at = 0.0
+
+    @property
+    def enabled(self):
+        enabled = FILTER_SETTINGS['ENABLED']
+        return cache_is_shared() if enabled is None else enabled
+
+    def might_contain(self, jti):
+        if not self.enabled:
+            return True
+        self.sync()
+        return jti in self._filter
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+
+    def sync(self):
+        generation = cache.get(GENERATION_KEY)
+        if (
+            self._filter is not None
+            and generation == self._generation
+            and time.monotonic() - self._synced_at < self.max_staleness
+        ):
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if self._filter is None or self._filter.count > self._filter.capacity:
+                # (Re)build from scratch; pruned jtis drop out at this point
+                capacity = self.capacity if self._filter is None else max(self.capacity, self._filter.count * 2)
+                self._filter = BloomFilter(capacity, self.error_rate)
+                self._high_water = 0
+                self._gaps = {}
+
+            building = self._high_water == 0
+            self._gaps = {row_id: seen for row_id, seen in self._gaps.items() if now - seen < SYNC_GAP_TTL}
+            rows = (
+                BlacklistedToken.objects
+                .filter(Q(id__gt=self._high_water) | Q(id__in=list(self._gaps)))
+                .order_by('id')
+                .values_list('id', 'token__jti')
+            )
+            for row_id, jti in rows.iterator(chunk_size=5000):
+                self._gaps.pop(row_id, None)
+                if row_id > self._high_water:
+                    if not building and row_id - self._high_water <= SYNC_MAX_GAP:
+                        for missing in range(self._high_water + 1, row_id):
+                            self._gaps[missing] = now
+                    self._high_water = row_id
+                self._filter.add(jti)
+
+            self._generation = generation
+            self._synced_at = now
+
+
+def bump_generation():
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+blacklist_filter = BlacklistFilter(
+    FILTER_SETTINGS['CAPACITY'],
+    FILTER_SETTINGS['ERROR_RATE'],
+    FILTER_SETTINGS['MAX_STALENESS'],
+)
@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import User, Student
+from accounts.views import login, login_candidates
+
+
+class Command(BaseCommand):
+    help = 'Measures query count and latency of the login endpoint against a synthetic user table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000, help='Number of synthetic student accounts')
+        parser.add_argument('--logins', type=int, default=200, help='Number of logins to time')
+        parser.add_argument('--batch-size', type=int, default=5000, help='bulk_create batch size')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for picking which accounts log in')
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic accounts instead of rolling back')
+
+    def handle(self, *args, **options):
+        total = options['users']
+        password = 'Bench-login-1!'
+
+        with transaction.atomic():
+            self.stdout.write(f'Creating {total} synthetic students...')
+            # One hash for everybody; hashing 100k passwords would dominate the setup
+            password_hash = make_password(password)
+            users = [
+                User(
+                    username=f'bench-login-{i}',
+                    email=f'Bench.Login.{i}@GAS.education',
+                    first_name='Bench',
+                    last_name=f'Student{i}',
+                    role='student',
+                    password=password_hash,
+                    must_change_password=False,
+                )
+                for i in range(total)
+            ]
+            User.objects.bulk_create(users, batch_size=options['batch_size'])
+            users = User.objects.filter(username__startswith='bench-login-').only('id', 'username')
+            Student.objects.bulk_create(
+                [Student(user_id=user.id, student_id=f'BL{user.username[12:]}') for user in users],
+                batch_size=options['batch_size'],
+            )
+
+            sample = random.Random(options['seed']).sample(range(total), min(options['logins'], total))
+            emails = [f'bench.login.{i}@gas.education' for i in sample]
+
+            self.stdout.write('Lookup plan:')
+            self.stdout.write(login_candidates(emails[0], 'student').explain())
+
+            factory = APIRequestFactory()
+            timings = []
+            query_counts = []
+            for email in emails:
+                request = factory.post(
+                    '/api/accounts/login-original/',
+                    {'email': email, 'password': password, 'role': 'student'},
+                    format='json',
+                )
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = login(request)
+                    timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    self.stdout.write(self.style.ERROR(f'Login failed for {email}: {response.data}'))
+                    transaction.set_rollback(True)
+                    return
+                query_counts.append(len(queries.captured_queries))
+
+            timings.sort()
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(emails)} logins over {total} users: '
+                f'queries/login min={min(query_counts)} max={max(query_counts)}, '
+                f'latency mean={statistics.mean(timings):.2f}ms '
+                f'p50={timings[len(timings) // 2]:.2f}ms '
+                f'p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms'
+            ))
+            self.stdout.write('Latency includes one PBKDF2 check_password per login.')
+
+            if not options['keep']:
+                transaction.set_rollback(True)
@@ -0,0 +1,67 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from accounts.services import parse_roster, bulk_register_students
+
+
+class Command(BaseCommand):
+    help = 'Registers every student in a CSV or JSON roster'
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', type=str, help='Path to a .csv or .json roster')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Roster format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, help='Students inserted per transaction')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default: CPU count)')
+        parser.add_argument('--assigned-by', type=str, help='Username of the instructor the students are assigned to')
+        parser.add_argument('--report', type=str, help='Write the per-row report (incl. generated passwords) to this CSV file')
+
+    def handle(self, *args, **options):
+        path = options['roster']
+        fmt = options['format'] or ('json' if path.lower().endswith('.json') else 'csv')
+
+        assigned_by = None
+        if options['assigned_by']:
+            assigned_by = User.objects.filter(username=options['assigned_by']).first()
+            if assigned_by is None:
+                raise CommandError(f'User {options["assigned_by"]} does not exist')
+
+        if not os.path.exists(path):
+            raise CommandError(f'Roster {path} does not exist')
+        with open(path, 'rb') as roster:
+            try:
+                rows = parse_roster(roster.read(), fmt)
+            except (ValueError, UnicodeDecodeError) as e:
+                raise CommandError(f'Could not read roster: {e}')
+
+        self.stdout.write(f'Registering {len(rows)} students...')
+        report = bulk_register_students(
+            rows,
+            assigned_by=assigned_by,
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+        )
+
+        for row in report['rows']:
+            if row['status'] != 'created':
+                errors = '; '.join(f'{field}: {message}' for field, message in row['errors'].items())
+                self.stdout.write(self.style.WARNING(f'Row {row["row"]} ({row["student_id"] or "-"}): {errors}'))
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(['row', 'student_id', 'status', 'errors', 'generated_password'])
+                for row in report['rows']:
+                    writer.writerow([
+                        row['row'],
+                        row['student_id'],
+                        row['status'],
+                        '; '.join(f'{field}: {message}' for field, message in row.get('errors', {}).items()),
+                        row.get('generated_password', ''),
+                    ])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {report["created"]} students, {report["failed"]} rows failed'
+        ))
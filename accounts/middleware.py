@@ -0,0 +1,18 @@
+from .roles import attach_role
+
+
+class RoleMiddleware:
+    """
+    Attaches ``request.role`` and ``request.profile`` once per request.
+
+    This covers session-authenticated Django views. API views authenticated
+    by CachedJWTAuthentication get the attributes replaced with the JWT
+    user's role when DRF authenticates the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        attach_role(request, request.user)
+        return self.get_response(request)
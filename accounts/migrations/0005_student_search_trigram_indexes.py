@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# (index name, table, column); the expressions match what icontains compiles
+# to on PostgreSQL, UPPER("column"::text), so LIKE '%term%' can use them.
+TRIGRAM_INDEXES = [
+    ('accounts_user_first_name_trgm', 'accounts_user', 'first_name'),
+    ('accounts_user_last_name_trgm', 'accounts_user', 'last_name'),
+    ('accounts_user_email_trgm', 'accounts_user', 'email'),
+    ('accounts_student_student_id_trgm', 'accounts_student', 'student_id'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_last_name_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
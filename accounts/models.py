@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 class User(AbstractUser):
@@ -16,6 +17,14 @@ class User(AbstractUser):
     address = models.TextField(blank=True, null=True)
     date_of_birth = models.DateField(null=True, blank=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Backs the case-insensitive login lookup in accounts.views.login
+            models.Index(Lower('email'), 'role', name='accounts_user_email_role_idx'),
+            # Seek order of the student directory (accounts.views.StudentViewSet.directory)
+            models.Index(fields=['last_name'], name='accounts_user_last_name_idx'),
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.role})"
 
@@ -0,0 +1,11 @@
+from rest_framework import permissions
+
+
+class IsInstructor(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.role == 'instructor'
+
+
+class IsStudent(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.role == 'student'
@@ -0,0 +1,22 @@
+def resolve_role(user):
+    """
+    Return ``(role, profile)`` for a user.
+
+    ``role`` is ``'instructor'`` or ``'student'`` when the matching profile
+    exists, otherwise None. Users loaded through CachedJWTAuthentication or
+    EmailBackend.get_user already carry both profiles, so this never queries.
+    """
+    if user is None or not user.is_authenticated:
+        return None, None
+    student = getattr(user, 'student', None)
+    instructor = getattr(user, 'instructor', None)
+    if instructor is not None and (user.role == 'instructor' or student is None):
+        return 'instructor', instructor
+    if student is not None:
+        return 'student', student
+    return None, None
+
+
+def attach_role(request, user):
+    """Set ``request.role`` and ``request.profile`` for the given user."""
+    request.role, request.profile = resolve_role(user)
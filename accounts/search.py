@@ -0,0 +1,195 @@
+"""
+Typeahead search over students (name, email, student ID).
+
+On PostgreSQL the query runs in the database: ``icontains`` compiles to
+``UPPER(col::text) LIKE UPPER('%term%')``, which the pg_trgm GIN indexes from
+migration 0005 serve directly, as long as each condition stays on its own
+table (so matches are a UNION of a student query and a user query). Other backends (SQLite in development) can't
+index substring matches, so each process keeps an in-memory trigram index of
+the active students instead, rebuilt whenever the shared generation counter
+moves or ``STUDENT_SEARCH_MAX_STALENESS`` seconds pass.
+"""
+import bisect
+import heapq
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from .models import Student, User
+
+STUDENT_SEARCH_MAX_STALENESS = getattr(settings, 'STUDENT_SEARCH_MAX_STALENESS', 60)
+
+GENERATION_KEY = 'accounts:student-search-generation'
+
+SEARCH_FIELDS = {
+    'first_name': 'user__first_name',
+    'last_name': 'user__last_name',
+    'email': 'user__email',
+    'student_id': 'student_id',
+}
+USER_SEARCH_FIELDS = ('first_name', 'last_name', 'email')
+RESULT_FIELDS = ('id', 'student_id', 'first_name', 'last_name', 'email', 'program', 'batch')
+
+
+def _terms(query):
+    return [term for term in query.lower().split() if term]
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _projection(queryset):
+    return queryset.values(
+        'id', 'student_id', 'program', 'batch',
+        first_name=F('user__first_name'), last_name=F('user__last_name'), email=F('user__email'),
+    )
+
+
+def _database_search(terms, batch, program, limit):
+    students = Student.objects.filter(is_active=True)
+    if batch:
+        students = students.filter(batch=batch)
+    if program:
+        students = students.filter(program=program)
+    # Every term must match one of the fields. ORing them across the join
+    # would leave the indexes unused; each side of the UNION uses its own
+    for term in terms:
+        users = User.objects.filter(
+            Q(*[Q(**{f'{field}__icontains': term}) for field in USER_SEARCH_FIELDS], _connector=Q.OR)
+        )
+        matches = Student.objects.filter(student_id__icontains=term).values('pk').union(
+            Student.objects.filter(user__in=users.values('pk')).values('pk')
+        )
+        students = students.filter(pk__in=matches)
+    # Prefix matches on the first term rank first
+    prefix = Q(*[Q(**{f'{path}__istartswith': terms[0]}) for path in SEARCH_FIELDS.values()], _connector=Q.OR)
+    students = students.annotate(
+        rank=Case(When(prefix, then=Value(0)), default=Value(1), output_field=IntegerField())
+    )
+    rows = _projection(students).order_by('rank', 'last_name', 'id')[:limit]
+    return [{field: row[field] for field in RESULT_FIELDS} for row in rows]
+
+
+class StudentSearchIndex:
+    """
+    In-process index of active students for backends without trigram indexes.
+
+    Terms of three or more characters are looked up through a trigram ->
+    student posting table and then verified; shorter terms use bisection over
+    the sorted field values, i.e. match as prefixes only.
+    """
+
+    def __init__(self, max_staleness):
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        # (records, postings, sorted values), swapped as one so readers never
+        # see a half-rebuilt index
+        self._data = None
+        self._generation = None
+        self._built_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+    def _build(self):
+        records = {}
+        postings = {}
+        sorted_values = []
+        for row in _projection(Student.objects.filter(is_active=True)).iterator(chunk_size=5000):
+            values = [(row[name] or '').lower() for name in SEARCH_FIELDS]
+            records[row['id']] = (row, values)
+            for value in values:
+                sorted_values.append((value, row['id']))
+                for trigram in _trigrams(value):
+                    postings.setdefault(trigram, set()).add(row['id'])
+        sorted_values.sort()
+        return records, postings, sorted_values
+
+    def _is_fresh(self, generation):
+        return (
+            self._data is not None
+            and generation == self._generation
+            and time.monotonic() - self._built_at < self.max_staleness
+        )
+
+    def sync(self):
+        generation = cache.get(GENERATION_KEY)
+        if self._is_fresh(generation):
+            return
+        with self._lock:
+            # Another thread may have rebuilt it while this one waited
+            if self._is_fresh(generation):
+                return
+            self._data = self._build()
+            self._generation = generation
+            self._built_at = time.monotonic()
+
+    @staticmethod
+    def _prefixed(term, sorted_values):
+        ids = set()
+        position = bisect.bisect_left(sorted_values, (term, 0))
+        while position < len(sorted_values) and sorted_values[position][0].startswith(term):
+            ids.add(sorted_values[position][1])
+            position += 1
+        return ids
+
+    def search(self, terms, batch=None, program=None, limit=20):
+        self.sync()
+        records, postings, sorted_values = self._data
+        prefixed = self._prefixed(terms[0], sorted_values)
+
+        ids = None
+        for term in terms:
+            if len(term) < 3:
+                candidates = prefixed if term == terms[0] else self._prefixed(term, sorted_values)
+            else:
+                # Smallest posting lists first keeps the intersection cheap
+                lists = sorted((postings.get(trigram, set()) for trigram in _trigrams(term)), key=len)
+                candidates = lists[0].intersection(*lists[1:])
+            ids = candidates if ids is None else ids & candidates
+            if not ids:
+                return []
+
+        # Trigram hits for terms longer than three characters may be false positives
+        long_terms = [term for term in terms if len(term) > 3]
+
+        def ranked():
+            for student_pk in ids:
+                row, values = records[student_pk]
+                if batch and row['batch'] != batch or program and row['program'] != program:
+                    continue
+                if long_terms and not all(any(term in value for value in values) for term in long_terms):
+                    continue
+                yield (0 if student_pk in prefixed else 1, row['last_name'], student_pk)
+
+        return [
+            {field: records[student_pk][0][field] for field in RESULT_FIELDS}
+            for _, _, student_pk in heapq.nsmallest(limit, ranked())
+        ]
+
+
+def bump_generation():
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+student_search_index = StudentSearchIndex(STUDENT_SEARCH_MAX_STALENESS)
+
+
+def search_students(query, batch=None, program=None, limit=20):
+    """
+    Active students matching every whitespace-separated term of ``query`` as a
+    substring of their first name, last name, email or student ID. Prefix
+    matches come first, then by last name.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+    if connection.vendor == 'postgresql':
+        return _database_search(terms, batch, program, limit)
+    return student_search_index.search(terms, batch, program, limit)
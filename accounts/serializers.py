@@ -1,7 +1,8 @@
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from django.core.exceptions import ValidationError
 from .models import User, Student, Instructor
+from .tokens import FilteredRefreshToken
 from django.contrib.auth import get_user_model
 from django.contrib.auth import authenticate
 
@@ -46,6 +47,9 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['email'] = user.email
         return token
 
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -1,7 +1,27 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
 from django.core.mail import send_mail
+from django.core.validators import validate_email
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.template.loader import render_to_string
+from django.utils import timezone
 from .models import User, Student
+from .search import bump_generation as bump_search_generation
+
+BULK_REGISTRATION_CHUNK_SIZE = getattr(settings, 'BULK_REGISTRATION_CHUNK_SIZE', 500)
+BULK_REGISTRATION_HASH_WORKERS = getattr(settings, 'BULK_REGISTRATION_HASH_WORKERS', None)
+BULK_REGISTRATION_MAX_ROWS = getattr(settings, 'BULK_REGISTRATION_MAX_ROWS', 10000)
+
+ROSTER_FIELDS = ('student_id', 'email', 'first_name', 'last_name', 'batch', 'program', 'password')
+REQUIRED_ROSTER_FIELDS = ('student_id', 'email', 'first_name', 'last_name')
 
 def register_student(student_data):
     """
@@ -74,4 +94,199 @@ def change_student_password(student, new_password):
     user.must_change_password = False
     user.save()
     
-    return True 
\ No newline at end of file
+    return True
+
+
+def parse_roster(content, fmt='csv'):
+    """
+    Turn a CSV or JSON roster into a list of row dicts.
+
+    CSV needs a header row; JSON is either a list of objects or an object
+    with a ``students`` list. Header names are matched case-insensitively and
+    unknown columns are dropped. Raises ValueError on unreadable input.
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+
+    if fmt == 'json':
+        data = json.loads(content) if isinstance(content, str) else content
+        if isinstance(data, dict):
+            data = data.get('students')
+        if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+            raise ValueError('Expected a list of student objects')
+        rows = data
+    elif fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(content))
+        if not reader.fieldnames:
+            raise ValueError('CSV roster has no header row')
+        rows = list(reader)
+    else:
+        raise ValueError(f'Unsupported roster format: {fmt}')
+
+    if len(rows) > BULK_REGISTRATION_MAX_ROWS:
+        raise ValueError(f'Roster has {len(rows)} rows; the limit is {BULK_REGISTRATION_MAX_ROWS}')
+
+    parsed = []
+    for row in rows:
+        row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+        parsed.append({
+            field: str(row[field]).strip() if row.get(field) is not None else ''
+            for field in ROSTER_FIELDS
+        })
+    return parsed
+
+
+def _validate_roster_row(row):
+    errors = {}
+    for field in REQUIRED_ROSTER_FIELDS:
+        if not row[field]:
+            errors[field] = 'This field is required.'
+    limits = {
+        'student_id': Student._meta.get_field('student_id').max_length,
+        'first_name': User._meta.get_field('first_name').max_length,
+        'last_name': User._meta.get_field('last_name').max_length,
+        'batch': Student._meta.get_field('batch').max_length,
+        'program': Student._meta.get_field('program').max_length,
+    }
+    for field, limit in limits.items():
+        if len(row[field]) > limit:
+            errors[field] = f'Ensure this field has no more than {limit} characters.'
+    if row['email'] and 'email' not in errors:
+        try:
+            validate_email(row['email'])
+        except ValidationError:
+            errors['email'] = 'Enter a valid email address.'
+    return errors
+
+
+def _init_hash_worker():
+    # Spawned (not forked) workers start without configured apps/settings
+    django.setup()
+
+
+def _hash_passwords(passwords, workers):
+    if workers <= 1 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_hash_worker) as pool:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def _insert_students(entries, assigned_by, now):
+    """Insert prepared (row, password_hash, must_change) entries; returns the Students."""
+    users = User.objects.bulk_create([
+        User(
+            username=row['student_id'],
+            email=row['email'],
+            first_name=row['first_name'],
+            last_name=row['last_name'],
+            role='student',
+            password=password_hash,
+            must_change_password=must_change,
+            last_password_change=now,
+        )
+        for row, password_hash, must_change in entries
+    ])
+    if any(user.pk is None for user in users):
+        # Backends that can't return ids from a bulk insert
+        ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+        for user in users:
+            user.pk = ids[user.username]
+    return Student.objects.bulk_create([
+        Student(
+            user=user,
+            student_id=row['student_id'],
+            batch=row['batch'] or None,
+            program=row['program'] or None,
+            assigned_by=assigned_by,
+        )
+        for user, (row, _, _) in zip(users, entries)
+    ])
+
+
+def bulk_register_students(rows, assigned_by=None, chunk_size=None, workers=None):
+    """
+    Register many students at once; the bulk counterpart of register_student.
+
+    Rows are validated and checked against existing accounts up front, the
+    passwords of the surviving rows are hashed in a process pool, and users
+    and students are inserted with ``bulk_create`` in one transaction per
+    chunk. If a chunk hits a conflict (e.g. a concurrent registration), its
+    rows are retried one by one so only the offending rows fail.
+
+    Returns a report: ``{'created': n, 'failed': n, 'rows': [...]}`` with one
+    entry per input row (1-based ``row`` numbers). Rows without a password
+    get a generated one, which is returned in the report as
+    ``generated_password``.
+    """
+    chunk_size = chunk_size or BULK_REGISTRATION_CHUNK_SIZE
+    if workers is None:
+        workers = BULK_REGISTRATION_HASH_WORKERS or os.cpu_count() or 1
+
+    results = [{'row': index, 'student_id': row['student_id'], 'status': 'error', 'errors': {}}
+               for index, row in enumerate(rows, start=1)]
+
+    # Validation and duplicate detection (within the roster and against the database)
+    seen = set()
+    pending = []
+    for index, row in enumerate(rows):
+        errors = _validate_roster_row(row)
+        key = row['student_id'].lower()
+        if not errors and key in seen:
+            errors['student_id'] = 'Duplicate student ID in roster.'
+        seen.add(key)
+        if errors:
+            results[index]['errors'] = errors
+        else:
+            pending.append(index)
+
+    valid = []
+    for start in range(0, len(pending), chunk_size):
+        indexes = pending[start:start + chunk_size]
+        ids = [rows[i]['student_id'] for i in indexes]
+        taken = {value.lower() for value in User.objects.filter(username__in=ids).values_list('username', flat=True)}
+        taken.update(value.lower() for value in Student.objects.filter(student_id__in=ids).values_list('student_id', flat=True))
+        for i in indexes:
+            if rows[i]['student_id'].lower() in taken:
+                results[i]['errors'] = {'student_id': 'A student with this ID already exists.'}
+            else:
+                valid.append(i)
+
+    # Same password semantics as register_student
+    passwords = {}
+    for i in valid:
+        if rows[i]['password']:
+            passwords[i] = (rows[i]['password'], True)
+        else:
+            generated = Student(student_id=rows[i]['student_id']).generate_default_password()
+            passwords[i] = (generated, False)
+            results[i]['generated_password'] = generated
+    hashes = dict(zip(valid, _hash_passwords([passwords[i][0] for i in valid], workers)))
+
+    now = timezone.now()
+    for start in range(0, len(valid), chunk_size):
+        indexes = valid[start:start + chunk_size]
+        entries = [(rows[i], hashes[i], passwords[i][1]) for i in indexes]
+        try:
+            with transaction.atomic():
+                _insert_students(entries, assigned_by, now)
+            succeeded = indexes
+        except IntegrityError:
+            succeeded = []
+            for i, entry in zip(indexes, entries):
+                try:
+                    with transaction.atomic():
+                        _insert_students([entry], assigned_by, now)
+                    succeeded.append(i)
+                except IntegrityError:
+                    results[i]['errors'] = {'student_id': 'A student with this ID already exists.'}
+                    results[i].pop('generated_password', None)
+        for i in succeeded:
+            results[i]['status'] = 'created'
+            del results[i]['errors']
+
+    created = sum(1 for result in results if result['status'] == 'created')
+    if created:
+        # bulk_create sends no post_save, so tell the search index directly
+        transaction.on_commit(bump_search_generation)
+    return {'created': created, 'failed': len(results) - created, 'rows': results}
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import invalidate_principal
+from .blacklist import bump_generation
+from .models import User, Student, Instructor
+from .search import bump_generation as bump_search_generation
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_principal(sender, instance, **kwargs):
+    invalidate_principal(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Student)
+@receiver([post_save, post_delete], sender=Instructor)
+def invalidate_profile_principal(sender, instance, **kwargs):
+    invalidate_principal(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Student)
+def invalidate_student_search(sender, instance, **kwargs):
+    if sender is Student or instance.role == 'student':
+        bump_search_generation()
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def announce_blacklisted_token(sender, instance, created, **kwargs):
+    # Tells every worker's blacklist filter to fold in the new row
+    if created:
+        bump_generation()
@@ -1,3 +1,394 @@
+import threading
+import time
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User, Student, Instructor
+
+
+class LoginTests(TestCase):
+    url = '/api/accounts/login-original/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='S1001', email='Jane.Doe@GAS.education', password='Secret-pass-1',
+            first_name='Jane', last_name='Doe', role='student'
+        )
+        self.student = Student.objects.create(user=self.user, student_id='S1001')
+
+    def login(self, email, password='Secret-pass-1', role='student'):
+        return self.client.post(
+            self.url, {'email': email, 'password': password, 'role': role},
+            content_type='application/json'
+        )
+
+    def test_login_is_case_insensitive_and_returns_profile(self):
+        response = self.login('  jane.doe@gas.EDUCATION ')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['id'], self.user.id)
+        self.assertEqual(response.data['role_data']['student_id'], 'S1001')
+        self.student.refresh_from_db()
+        self.assertIsNotNone(self.student.last_login_at)
+
+    def test_login_query_count(self):
+        # user + profiles lookup, outstanding token insert, last_login_at update
+        with self.assertNumQueries(3):
+            response = self.login('jane.doe@gas.education')
+        self.assertEqual(response.status_code, 200)
+
+    def test_wrong_password_or_role_is_rejected(self):
+        self.assertEqual(self.login('jane.doe@gas.education', password='nope').status_code, 401)
+        self.assertEqual(self.login('jane.doe@gas.education', role='instructor').status_code, 401)
+
+    def test_instructor_without_profile_is_rejected(self):
+        user = User.objects.create_user(
+            username='I2001', email='teach@GAS.education', password='Secret-pass-1', role='instructor'
+        )
+        self.assertEqual(self.login('teach@gas.education', role='instructor').status_code, 401)
+        Instructor.objects.create(user=user, employee_id='I2001', department='IT', designation='Lecturer')
+        self.assertEqual(self.login('teach@gas.education', role='instructor').status_code, 200)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    url = '/api/accounts/student/profile/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='S1002', email='sam@GAS.education', password='Secret-pass-1', role='student'
+        )
+        self.student = Student.objects.create(user=self.user, student_id='S1002', batch='2025A')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return response, [q['sql'] for q in queries if '"accounts_user"' in q['sql'].split('WHERE')[0]]
+
+    def test_principal_is_loaded_once_and_cached(self):
+        _, first = self.user_queries()
+        self.assertEqual(len(first), 1)
+        self.assertIn('"accounts_student"', first[0])
+        response, second = self.user_queries()
+        self.assertEqual(second, [])
+        self.assertEqual(response.data['student_id'], 'S1002')
+
+    def test_profile_save_invalidates_principal(self):
+        self.user_queries()
+        self.student.batch = '2025B'
+        self.student.save()
+        response, queries = self.user_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['batch'], '2025B')
+
+    def test_inactive_user_is_rejected(self):
+        self.user_queries()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url, **self.auth).status_code, 401)
+
+    def test_changes_from_other_workers_are_seen_after_the_local_timeout(self):
+        import time
+        from .authentication import PRINCIPAL_LOCAL_CACHE_TIMEOUT
+
+        self.user_queries()
+        # No signal, as when another process made the change
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.url, **self.auth).status_code, 200)
+
+        later = PRINCIPAL_LOCAL_CACHE_TIMEOUT + 1
+        with mock.patch('time.monotonic', return_value=time.monotonic() + later), \
+                mock.patch('time.time', return_value=time.time() + later):
+            self.assertEqual(self.client.get(self.url, **self.auth).status_code, 401)
+
+
+class RoleResolutionTests(TestCase):
+    def setUp(self):
+        student_user = User.objects.create_user(username='S1003', email='s3@GAS.education', role='student')
+        Student.objects.create(user=student_user, student_id='S1003')
+        instructor_user = User.objects.create_user(username='I1003', email='i3@GAS.education', role='instructor')
+        Instructor.objects.create(user=instructor_user, employee_id='I1003', department='IT', designation='Lecturer')
+        self.student_auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(student_user)}'}
+        self.instructor_auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(instructor_user)}'}
+
+    def test_role_checks_use_resolved_profile(self):
+        self.assertEqual(self.client.get('/api/modules/student/modules/', **self.student_auth).status_code, 200)
+        self.assertEqual(self.client.get('/api/modules/student/modules/', **self.instructor_auth).status_code, 403)
+        self.assertEqual(self.client.get('/api/accounts/instructor/profile/', **self.student_auth).status_code, 403)
+
+        # Warm principal: role checks cost no profile queries
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/accounts/instructor/profile/', **self.instructor_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['employee_id'], 'I1003')
+        self.assertFalse([q for q in queries if 'accounts_instructor' in q['sql']])
+
+
+class TokenRefreshTests(TestCase):
+    url = '/api/accounts/token/refresh/'
+
+    def setUp(self):
+        from .blacklist import FILTER_SETTINGS, blacklist_filter
+        # As with a shared cache
+        patcher = mock.patch.dict(FILTER_SETTINGS, {'ENABLED': True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        blacklist_filter.reset()
+        self.user = User.objects.create_user(username='S1004', email='s4@GAS.education', role='student')
+
+    def refresh(self, token):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'refresh': str(token)}, content_type='application/json')
+        blacklist_checks = [
+            q for q in queries
+            if q['sql'].startswith('SELECT') and 'token_blacklist_blacklistedtoken' in q['sql'] and '"jti" =' in q['sql']
+        ]
+        return response, blacklist_checks
+
+    def test_rotation_rejects_reused_token_and_skips_blacklist_query(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+        first = RefreshToken.for_user(self.user)
+
+        response, checks = self.refresh(first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(checks, [])
+
+        # The rotated-out token is now in the filter and the table
+        response, checks = self.refresh(first)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(checks), 1)
+
+    def test_without_shared_cache_every_refresh_checks_the_table(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from .blacklist import FILTER_SETTINGS
+
+        with mock.patch.dict(FILTER_SETTINGS, {'ENABLED': None}):
+            response, checks = self.refresh(RefreshToken.for_user(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(checks), 1)
+
+    def test_sync_folds_in_rows_committed_out_of_order(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+        from .blacklist import blacklist_filter
+
+        expires = timezone.now() + timedelta(days=1)
+        tokens = [
+            OutstandingToken.objects.create(user=self.user, jti=f'jti-{i}', token='x', expires_at=expires)
+            for i in range(3)
+        ]
+        first = BlacklistedToken.objects.create(token=tokens[0])
+        self.assertTrue(blacklist_filter.might_contain('jti-0'))
+
+        # The row after it commits late: the sync in between sees a gap
+        BlacklistedToken.objects.create(id=first.id + 2, token=tokens[2])
+        self.assertTrue(blacklist_filter.might_contain('jti-2'))
+        self.assertFalse(blacklist_filter.might_contain('jti-1'))
+
+        BlacklistedToken.objects.create(id=first.id + 1, token=tokens[1])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(blacklist_filter.might_contain('jti-1'))
+        self.assertEqual(len(queries), 1)
+
+    def test_prune_tokens_removes_expired_tokens(self):
+        from datetime import timedelta
+        from django.core.management import call_command
+        from django.utils import timezone
+        from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+
+        past = timezone.now() - timedelta(days=2)
+        expired = [
+            OutstandingToken.objects.create(user=self.user, jti=f'old-{i}', token='x', expires_at=past)
+            for i in range(5)
+        ]
+        BlacklistedToken.objects.create(token=expired[0])
+        live = OutstandingToken.objects.create(
+            user=self.user, jti='live', token='x', expires_at=timezone.now() + timedelta(days=1)
+        )
+
+        call_command('prune_tokens', batch_size=2, stdout=open('/dev/null', 'w'))
+        self.assertEqual(list(OutstandingToken.objects.values_list('id', flat=True)), [live.id])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class BulkStudentRegistrationTests(TestCase):
+    url = '/api/accounts/instructors/bulk_add_students/'
+
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='I1005', email='i5@GAS.education', role='instructor')
+        Instructor.objects.create(user=self.instructor, employee_id='I1005', department='IT', designation='Lecturer')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.instructor)}'}
+        existing = User.objects.create_user(username='S0001', email='old@GAS.education', role='student')
+        Student.objects.create(user=existing, student_id='S0001')
+
+    def test_csv_roster_reports_each_row(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        roster = (
+            'Student_ID,Email,First_Name,Last_Name,Batch,Password\n'
+            'S2001,a@GAS.education,Ann,Lee,2025A,Given-pass-1\n'
+            'S2002,b@GAS.education,Bob,Ray,2025A,\n'
+            'S0001,c@GAS.education,Cat,Old,2025A,\n'
+            'S2002,d@GAS.education,Dup,Row,2025A,\n'
+            'S2003,not-an-email,Eve,Bad,2025A,\n'
+        )
+        response = self.client.post(
+            self.url, {'file': SimpleUploadedFile('intake.csv', roster.encode())}, **self.auth
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 3))
+        rows = response.data['rows']
+        self.assertEqual([row['status'] for row in rows], ['created', 'created', 'error', 'error', 'error'])
+        self.assertIn('student_id', rows[2]['errors'])
+        self.assertIn('student_id', rows[3]['errors'])
+        self.assertIn('email', rows[4]['errors'])
+
+        given = User.objects.get(username='S2001')
+        self.assertTrue(given.check_password('Given-pass-1'))
+        self.assertTrue(given.must_change_password)
+        generated = User.objects.get(username='S2002')
+        self.assertTrue(generated.check_password(rows[1]['generated_password']))
+        self.assertFalse(generated.must_change_password)
+        self.assertEqual(Student.objects.get(student_id='S2001').assigned_by, self.instructor)
+
+    def test_json_roster_inserts_in_chunks(self):
+        from .services import bulk_register_students, parse_roster
+        rows = parse_roster({'students': [
+            {'student_id': f'S3{i:03}', 'email': f's{i}@GAS.education', 'first_name': 'F', 'last_name': 'L'}
+            for i in range(10)
+        ]}, 'json')
+        with CaptureQueriesContext(connection) as queries:
+            report = bulk_register_students(rows, chunk_size=4, workers=1)
+        self.assertEqual(report['created'], 10)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT')]
+        # users + students per chunk of 4, 4, 2
+        self.assertEqual(len(inserts), 6)
+
+    def test_students_cannot_bulk_register(self):
+        user = User.objects.get(username='S0001')
+        response = self.client.post(
+            self.url, {'students': []}, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class StudentDirectoryTests(TestCase):
+    url = '/api/accounts/students/directory/'
+
+    def setUp(self):
+        instructor = User.objects.create_user(username='I1007', email='i7@GAS.education', role='instructor')
+        Instructor.objects.create(user=instructor, employee_id='I1007', department='IT', designation='Lecturer')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(instructor)}'}
+        for i, last_name in enumerate(['Silva', 'Perera', 'Silva', 'Fernando', 'Perera', 'Abeysekara', 'Silva']):
+            user = User.objects.create_user(
+                username=f'S7{i:03}', email=f's7{i}@GAS.education', first_name=f'F{i}', last_name=last_name, role='student'
+            )
+            Student.objects.create(user=user, student_id=f'S7{i:03}', batch='2025A' if i % 2 else '2025B')
+        # Warm the cached principal so only the page query is counted
+        self.client.get(self.url, **self.auth)
+
+    def test_pages_follow_last_name_then_id(self):
+        seen = []
+        url = f'{self.url}?page_size=3&fields=student_id,last_name'
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, **self.auth)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.data['results'])
+            url = response.data['next']
+        expected = list(
+            Student.objects.order_by('user__last_name', 'id').values_list('student_id', 'user__last_name')
+        )
+        self.assertEqual([(row['student_id'], row['last_name']) for row in seen], expected)
+        self.assertEqual(set(seen[0]), {'student_id', 'last_name'})
+
+    def test_filters_and_bad_parameters(self):
+        response = self.client.get(f'{self.url}?batch=2025A', **self.auth)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(self.client.get(f'{self.url}?fields=password', **self.auth).status_code, 400)
+        self.assertEqual(self.client.get(f'{self.url}?cursor=garbage', **self.auth).status_code, 400)
+        from lms_backend.pagination import encode_cursor
+        for values in (['x', 'abc'], ['x', None], [['x'], {}]):
+            response = self.client.get(self.url, {'cursor': encode_cursor(values)}, **self.auth)
+            self.assertEqual(response.status_code, 400)
+
+
+class StudentSearchTests(TestCase):
+    url = '/api/accounts/students/search/'
+
+    def setUp(self):
+        from .search import student_search_index
+        student_search_index.invalidate()
+        instructor = User.objects.create_user(username='I1008', email='i8@GAS.education', role='instructor')
+        Instructor.objects.create(user=instructor, employee_id='I1008', department='IT', designation='Lecturer')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(instructor)}'}
+        for student_id, first, last, batch in [
+            ('GAS001', 'Nimali', 'Perera', '2025A'),
+            ('GAS002', 'Kamal', 'Pereira', '2025B'),
+            ('GAS003', 'Amal', 'Silva', '2025A'),
+            ('XYZ004', 'Perry', 'Jones', '2025A'),
+        ]:
+            user = User.objects.create_user(
+                username=student_id, email=f'{first.lower()}@gas.education',
+                first_name=first, last_name=last, role='student'
+            )
+            Student.objects.create(user=user, student_id=student_id, batch=batch)
+
+    def search(self, query):
+        response = self.client.get(self.url, {'q': query}, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return [row['student_id'] for row in response.data]
+
+    def test_prefix_matches_rank_before_substring_matches(self):
+        # Perry, Perera and Pereira all start with "per"; then by last name
+        self.assertEqual(self.search('per'), ['XYZ004', 'GAS002', 'GAS001'])
+        self.assertEqual(self.search('pe'), ['XYZ004', 'GAS002', 'GAS001'])
+        self.assertEqual(self.search('mal'), ['GAS002', 'GAS001', 'GAS003'])
+        self.assertEqual(self.search('amal'), ['GAS003', 'GAS002'])
+        self.assertEqual(self.search('nimali perera'), ['GAS001'])
+        self.assertEqual(self.search('gas00'), ['GAS002', 'GAS001', 'GAS003'])
+        self.assertEqual(self.search('zzz'), [])
+
+    def test_database_search_matches_the_index(self):
+        from . import search
+        for query in ('per', 'mal', 'nimali perera', 'gas00', 'education', 'zzz'):
+            with self.subTest(query=query):
+                terms = search._terms(query)
+                self.assertEqual(
+                    search._database_search(terms, None, None, 20),
+                    search.student_search_index.search(terms, limit=20),
+                )
+
+    def test_waiting_threads_do_not_rebuild_the_index_again(self):
+        from .search import student_search_index
+        data = student_search_index._build()
+        student_search_index.invalidate()
+        builds = []
+
+        # Without the database: other threads have no test transaction
+        def slow_build():
+            builds.append(1)
+            time.sleep(0.05)
+            return data
+
+        with mock.patch.object(student_search_index, '_build', side_effect=slow_build):
+            threads = [threading.Thread(target=student_search_index.sync) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(builds), 1)
+
+    def test_filters_and_index_refresh(self):
+        response = self.client.get(self.url, {'q': 'per', 'batch': '2025A'}, **self.auth)
+        self.assertEqual({row['student_id'] for row in response.data}, {'GAS001', 'XYZ004'})
 
-# Create your tests here.
+        user = User.objects.create_user(username='GAS005', email='new@gas.education', first_name='Perdita', role='student')
+        Student.objects.create(user=user, student_id='GAS005')
+        self.assertIn('GAS005', self.search('perd'))
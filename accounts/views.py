@@ -19,16 +19,20 @@ from .serializers import (
     LoginSerializer, TokenSerializer
 )
 from .services import change_student_password
+from .authentication import invalidate_principal
 from django.utils import timezone
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import make_password
-from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from courses.models import Module
+from lms_backend.pagination import InvalidCursor, paginate_keyset, page_size_param, next_page_url
 #from .serializers import ModuleSerializer
 
 
@@ -81,6 +85,20 @@ class UserViewSet(viewsets.ModelViewSet):
         user.save()
         return Response({'detail': 'Password changed successfully.'})
 
+# Public name -> ORM path for StudentViewSet.directory
+DIRECTORY_FIELDS = {
+    'id': 'id',
+    'student_id': 'student_id',
+    'first_name': 'user__first_name',
+    'last_name': 'user__last_name',
+    'email': 'user__email',
+    'program': 'program',
+    'batch': 'batch',
+    'enrollment_status': 'enrollment_status',
+    'enrolled_date': 'enrolled_date',
+}
+DIRECTORY_DEFAULT_FIELDS = ('id', 'student_id', 'first_name', 'last_name', 'program', 'batch')
+
 class StudentViewSet(viewsets.ModelViewSet):
     queryset = Student.objects.all()
     serializer_class = StudentSerializer
@@ -114,20 +132,94 @@ class StudentViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def list_all(self, request):
         """Get all active students with their names for the select dropdown"""
-        students = self.get_queryset()
-        data = [{
-            'id': student.id,
-            'student_id': student.student_id,
-            'first_name': student.user.first_name,
-            'last_name': student.user.last_name,
-            'program': student.program,
-            'batch': student.batch
-        } for student in students]
-        return Response(data)
+        data = self.get_queryset().values(
+            'id', 'student_id', 'program', 'batch',
+            first_name=F('user__first_name'), last_name=F('user__last_name'),
+        )
+        return Response(list(data))
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Typeahead: ``?q=`` (substring of name, email or student ID; every
+        word must match), optional ``?batch=``/``?program=``, ``?limit=`` (max 50).
+        """
+        if request.role != 'instructor':
+            return Response(
+                {"detail": "User is not an instructor"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        from .search import search_students
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 50))
+        except ValueError:
+            limit = 20
+        results = search_students(
+            request.query_params.get('q', ''),
+            batch=request.query_params.get('batch'),
+            program=request.query_params.get('program'),
+            limit=limit,
+        )
+        return Response(results)
+
+    @action(detail=False, methods=['get'])
+    def directory(self, request):
+        """
+        Active students, one page at a time, ordered by last name.
+
+        ``?fields=`` picks columns (see DIRECTORY_FIELDS), ``?batch=`` and
+        ``?program=`` filter, ``?page_size=`` (max 500) and ``?cursor=`` page.
+        Each page is a single keyset query over a ``values()`` projection.
+        """
+        if request.role != 'instructor':
+            return Response(
+                {"detail": "User is not an instructor"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        requested = request.query_params.get('fields')
+        fields = [f.strip() for f in requested.split(',') if f.strip()] if requested else list(DIRECTORY_DEFAULT_FIELDS)
+        unknown = [f for f in fields if f not in DIRECTORY_FIELDS]
+        if unknown:
+            return Response(
+                {"detail": f"Unknown fields: {', '.join(unknown)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        students = Student.objects.filter(is_active=True)
+        for param in ('batch', 'program'):
+            if request.query_params.get(param):
+                students = students.filter(**{param: request.query_params[param]})
+
+        # The ordering keys are always selected so the cursor can be built
+        projection = set(fields) | {'last_name', 'id'}
+        students = students.values(
+            *(name for name in projection if DIRECTORY_FIELDS[name] == name),
+            **{name: F(DIRECTORY_FIELDS[name]) for name in projection if DIRECTORY_FIELDS[name] != name},
+        )
+        try:
+            rows, next_cursor = paginate_keyset(
+                students, ['last_name', 'id'],
+                cursor=request.query_params.get('cursor'),
+                page_size=page_size_param(request),
+            )
+        except InvalidCursor as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'next': next_page_url(request, next_cursor),
+            'results': [{name: row[name] for name in fields} for row in rows],
+        })
 
     @action(detail=False, methods=['get'])
     def available_courses(self, request):
-        student = request.user.student
+        if request.role != 'student':
+            return Response(
+                {"detail": "User is not a student"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        student = request.profile
         courses = student.get_available_courses()
         from courses.serializers import CourseSerializer
         serializer = CourseSerializer(courses, many=True)
@@ -135,7 +227,12 @@ class StudentViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def my_enrollments(self, request):
-        student = request.user.student
+        if request.role != 'student':
+            return Response(
+                {"detail": "User is not a student"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        student = request.profile
         enrollments = student.enrollments.all()
         from courses.serializers import EnrollmentSerializer
         serializer = EnrollmentSerializer(enrollments, many=True)
@@ -143,7 +240,12 @@ class StudentViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def enroll(self, request):
-        student = request.user.student
+        if request.role != 'student':
+            return Response(
+                {"detail": "User is not a student"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        student = request.profile
         course_id = request.data.get('course_id')
         
         if not course_id:
@@ -169,12 +271,12 @@ class StudentViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def profile(self, request):
         """Get the current student's profile"""
-        if not hasattr(request.user, 'student'):
+        if request.role != 'student':
             return Response(
                 {"detail": "User is not a student"},
                 status=status.HTTP_403_FORBIDDEN
             )
-        student = request.user.student
+        student = request.profile
         serializer = self.get_serializer(student)
         return Response(serializer.data)
 
@@ -194,46 +296,53 @@ class InstructorViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def profile(self, request):
         """Get the current instructor's profile"""
-        if not hasattr(request.user, 'instructor'):
+        if request.role != 'instructor':
             return Response(
                 {"detail": "User is not an instructor"},
                 status=status.HTTP_403_FORBIDDEN
             )
-        instructor = request.user.instructor
+        instructor = request.profile
         serializer = self.get_serializer(instructor)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def assigned_modules(self, request):
         """Get all modules assigned to the current instructor"""
-        if not hasattr(request.user, 'instructor'):
+        if request.role != 'instructor':
             return Response(
                 {"detail": "User is not an instructor"},
                 status=status.HTTP_403_FORBIDDEN
             )
         
         from courses.models import Module
-        modules = Module.objects.filter(instructor=request.user.instructor)
+        from modules.queries import ModuleFieldset, with_module_relations
         from modules.serializers import ModuleSerializer
-        serializer = ModuleSerializer(modules, many=True)
+        fieldset = ModuleFieldset.from_request(request)
+        modules = with_module_relations(Module.objects.filter(instructor=request.profile), fieldset)
+        serializer = ModuleSerializer(modules, many=True, context={'module_fieldset': fieldset})
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def students(self, request):
         """Get all students for the current instructor"""
-        if not hasattr(request.user, 'instructor'):
+        if request.role != 'instructor':
             return Response(
                 {"detail": "User is not an instructor"},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        students = Student.objects.filter(is_active=True)
+        students = Student.objects.filter(is_active=True).select_related('user', 'user__ewallet')
         serializer = StudentSerializer(students, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def my_courses(self, request):
-        instructor = request.user.instructor
+        if request.role != 'instructor':
+            return Response(
+                {"detail": "User is not an instructor"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        instructor = request.profile
         courses = instructor.get_active_courses()
         from courses.serializers import CourseDetailSerializer
         serializer = CourseDetailSerializer(courses, many=True)
@@ -241,7 +350,11 @@ class InstructorViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def my_students(self, request):
-        instructor = request.user.instructor
+        if request.role != 'instructor':
+            return Response(
+                {"detail": "User is not an instructor"},
+                status=status.HTTP_403_FORBIDDEN
+            )
         from courses.models import CourseEnrollment
         enrollments = CourseEnrollment.objects.filter(
             course__instructor=request.user,
@@ -272,6 +385,40 @@ class InstructorViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=False, methods=['post'])
+    def bulk_add_students(self, request):
+        """
+        Register a whole roster: a CSV/JSON ``file`` upload or a JSON
+        ``students`` list. Responds with a per-row report.
+        """
+        if request.role != 'instructor':
+            return Response(
+                {"detail": "User is not an instructor"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        from .services import parse_roster, bulk_register_students
+        upload = request.FILES.get('file')
+        try:
+            if upload is not None:
+                fmt = 'json' if upload.name.lower().endswith('.json') else 'csv'
+                rows = parse_roster(upload.read(), fmt)
+            elif 'students' in request.data:
+                rows = parse_roster(request.data['students'], 'json')
+            else:
+                return Response(
+                    {"detail": "Provide a roster file or a students list."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = bulk_register_students(rows, assigned_by=request.user)
+        return Response(
+            report,
+            status=status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST
+        )
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = 'login'
 
@@ -320,12 +467,13 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 
 class CustomTokenRefreshView(TokenRefreshView):
     def post(self, request, *args, **kwargs):
-        print("Token refresh attempt - Request data:", request.data)  # Debug print
         try:
             response = super().post(request, *args, **kwargs)
             print("Token refresh successful")  # Debug print
             return response
-        except TokenError as e:
+        except (TokenError, InvalidToken) as e:
+            # TokenRefreshView re-raises TokenError as InvalidToken; a reused
+            # (blacklisted) or expired refresh token is a 401, not a 500
             print(f"Token refresh error: {str(e)}")  # Debug print
             return Response(
                 {'detail': 'Token is invalid or expired'},
@@ -340,99 +488,86 @@ class CustomTokenRefreshView(TokenRefreshView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+def login_candidates(email, role):
+    """
+    Every account matching the login email and role, fetched in one query.
+
+    The student/instructor profile (and the e-wallet shown in the student
+    payload) are joined in, so checking the password and building the login
+    response needs no further lookups. Filtering on ``Lower('email')`` rather
+    than ``email__iexact`` lets Postgres use ``accounts_user_email_role_idx``.
+    """
+    return (
+        User.objects.annotate(email_lower=Lower('email'))
+        .filter(email_lower=email.lower(), role=role)
+        .select_related('student', 'instructor', 'ewallet')
+        .order_by('-date_joined')
+    )
+
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login(request):
     try:
-        print("Raw request data:", request.data)  # Log raw request data
-        print("Request content type:", request.content_type)  # Log content type
-        
         email = request.data.get('email', '').strip().lower()  # Convert to lowercase and strip whitespace
         password = request.data.get('password')
         role = request.data.get('role')
 
-        print(f"Login attempt - Email: {email}, Role: {role}")  # Debug print
-
         if not email or not password or not role:
-            print(f"Missing fields - Email: {bool(email)}, Password: {bool(password)}, Role: {bool(role)}")  # Debug print
             return Response(
                 {'detail': 'Email, password, and role are required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # First, find all users with this email and role
-        users = User.objects.filter(email__iexact=email, role=role).order_by('-date_joined')
-        print(f"Found {users.count()} users with email {email} and role {role}")  # Debug print
-
-        if not users.exists():
-            print(f"No user found with email: {email} and role: {role}")  # Debug print
-            return Response(
-                {'detail': 'Invalid credentials'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-
         # Try each user until we find one with the correct password
-        for user in users:
-            if user.check_password(password):
-                print(f"Found matching user: {user.username}, Role: {user.role}")  # Debug print
-                
-                # For instructors, check if they have an instructor profile
-                if role == 'instructor':
-                    print("Checking instructor profile...")  # Debug print
-                    try:
-                        instructor = user.instructor
-                        print(f"Found instructor profile: {instructor.employee_id}")  # Debug print
-                    except Instructor.DoesNotExist:
-                        print("No instructor profile found")  # Debug print
-                        continue  # Try next user if this one doesn't have an instructor profile
-                    except Exception as e:
-                        print(f"Error checking instructor profile: {str(e)}")  # Debug print
-                        return Response(
-                            {'detail': 'Error checking instructor profile'},
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                        )
-
-                # Generate tokens
-                refresh = RefreshToken.for_user(user)
-                print(f"Generated refresh token: {str(refresh)}")  # Debug print
-                
-                # Update last login time
-                if hasattr(user, 'student'):
-                    user.student.last_login_at = timezone.now()
-                    user.student.save()
-                elif hasattr(user, 'instructor'):
-                    user.instructor.last_login_at = timezone.now()
-                    user.instructor.save()
-
-                # Get role-specific data
-                role_data = None
-                if hasattr(user, 'student'):
-                    role_data = StudentSerializer(user.student).data
-                elif hasattr(user, 'instructor'):
-                    role_data = InstructorSerializer(user.instructor).data
-
-                # Prepare response data
-                token_data = {
-                    'access': str(refresh.access_token),
-                    'refresh': str(refresh),
-                    'user': UserSerializer(user).data,
-                    'role_data': role_data
-                }
-                
-                print(f"Login successful for {email}")  # Debug print
-                return Response(token_data, status=status.HTTP_200_OK)
-
-        # If we get here, no user had the correct password
-        print("No user found with correct password")  # Debug print
+        for user in login_candidates(email, role):
+            if not user.check_password(password):
+                continue
+
+            # Profiles were joined in, so these checks don't hit the database
+            student = getattr(user, 'student', None)
+            instructor = getattr(user, 'instructor', None)
+
+            # For instructors, check if they have an instructor profile
+            if role == 'instructor' and instructor is None:
+                continue  # Try next user if this one doesn't have an instructor profile
+
+            # Generate tokens
+            refresh = RefreshToken.for_user(user)
+
+            # Update last login time without re-saving the whole profile;
+            # update() sends no signals, so drop the cached principal here
+            now = timezone.now()
+            role_data = None
+            if student is not None:
+                Student.objects.filter(pk=student.pk).update(last_login_at=now)
+                invalidate_principal(user.pk)
+                student.last_login_at = now
+                role_data = StudentSerializer(student).data
+            elif instructor is not None:
+                Instructor.objects.filter(pk=instructor.pk).update(last_login_at=now)
+                invalidate_principal(user.pk)
+                instructor.last_login_at = now
+                role_data = InstructorSerializer(instructor).data
+
+            # Prepare response data
+            token_data = {
+                'access': str(refresh.access_token),
+                'refresh': str(refresh),
+                'user': UserSerializer(user).data,
+                'role_data': role_data
+            }
+            return Response(token_data, status=status.HTTP_200_OK)
+
+        # If we get here, no user matched or had the correct password
         return Response(
             {'detail': 'Invalid credentials'},
             status=status.HTTP_401_UNAUTHORIZED
         )
 
     except Exception as e:
-        print(f"Login error: {str(e)}")  # Debug print
         import traceback
+        print(f"Login error: {str(e)}")  # Debug print
         print(traceback.format_exc())  # Print full traceback
         return Response(
             {'detail': str(e)},
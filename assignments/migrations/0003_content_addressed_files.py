@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 19:45
+
+import modules.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='assignment',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=modules.storage.content_storage, upload_to='assignments/'),
+        ),
+        migrations.AlterField(
+            model_name='assignmentsubmission',
+            name='submitted_file',
+            field=models.FileField(blank=True, null=True, storage=modules.storage.content_storage, upload_to='assignment_submissions/'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from accounts.models import Instructor, Student
+from modules.storage import content_storage
 
 User = get_user_model()
 
@@ -15,7 +16,7 @@ class Assignment(models.Model):
     assignment_type = models.CharField(max_length=20, choices=ASSIGNMENT_TYPES, default='standalone')
     due_date = models.DateTimeField()
     total_marks = models.IntegerField()
-    file = models.FileField(upload_to='assignments/', null=True, blank=True)
+    file = models.FileField(upload_to='assignments/', storage=content_storage, null=True, blank=True)
     instructor = models.ForeignKey(Instructor, on_delete=models.CASCADE, related_name='created_assignments')
     students = models.ManyToManyField(Student, through='AssignmentSubmission', related_name='enrolled_assignments')
     module = models.ForeignKey('courses.Module', on_delete=models.SET_NULL, null=True, blank=True, related_name='assignments')
@@ -31,7 +32,7 @@ class Assignment(models.Model):
 class AssignmentSubmission(models.Model):
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='submissions', null=True, blank=True)
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='assignment_submissions', null=True, blank=True)
-    submitted_file = models.FileField(upload_to='assignment_submissions/', null=True, blank=True)
+    submitted_file = models.FileField(upload_to='assignment_submissions/', storage=content_storage, null=True, blank=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
     grade = models.PositiveIntegerField(null=True, blank=True)
     feedback = models.TextField(blank=True)
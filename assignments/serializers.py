@@ -2,8 +2,10 @@ from rest_framework import serializers
 from .models import Assignment, AssignmentSubmission
 from accounts.models import Student, Instructor
 from courses.models import Module
+from modules.serializers import SIGNED_FILE_FIELD_MAPPING
 
 class AssignmentSubmissionSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = SIGNED_FILE_FIELD_MAPPING
     student_name = serializers.SerializerMethodField()
     student_id = serializers.SerializerMethodField()
 
@@ -25,6 +27,7 @@ class SimpleModuleSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'code']
 
 class AssignmentSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = SIGNED_FILE_FIELD_MAPPING
     instructor_name = serializers.SerializerMethodField()
     submissions_count = serializers.SerializerMethodField()
     submissions = AssignmentSubmissionSerializer(many=True, read_only=True)
@@ -56,9 +59,8 @@ class AssignmentSerializer(serializers.ModelSerializer):
         return value
 
     def create(self, validated_data):
-        # Get the instructor from the request user
-        instructor = Instructor.objects.get(user=self.context['request'].user)
-        validated_data['instructor'] = instructor
+        # Get the instructor from the request's resolved profile
+        validated_data['instructor'] = self.context['request'].profile
         return super().create(validated_data)
 
 class AssignmentSubmissionCreateSerializer(serializers.ModelSerializer):
@@ -68,9 +70,8 @@ class AssignmentSubmissionCreateSerializer(serializers.ModelSerializer):
         read_only_fields = ['student']
 
     def create(self, validated_data):
-        # Get the student from the request user
-        student = Student.objects.get(user=self.context['request'].user)
-        validated_data['student'] = student
+        # Get the student from the request's resolved profile
+        validated_data['student'] = self.context['request'].profile
         return super().create(validated_data)
 
     def validate_submitted_file(self, value):
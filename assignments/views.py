@@ -18,13 +18,12 @@ class AssignmentViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         logger.debug(f"get_queryset called for user: {self.request.user}")
-        user = self.request.user
         # Only instructors can access
-        if not hasattr(user, 'instructor'):
+        if self.request.role != 'instructor':
             logger.debug("User is not an instructor")
             return Assignment.objects.none()
         # Filter assignments by instructor directly
-        queryset = Assignment.objects.filter(instructor=user.instructor)
+        queryset = Assignment.objects.filter(instructor=self.request.profile)
         logger.debug(f"Returning {queryset.count()} assignments")
         return queryset
 
@@ -33,8 +32,7 @@ class AssignmentViewSet(viewsets.ModelViewSet):
         logger.debug(f"Request path: {request.path}")
         logger.debug(f"Request method: {request.method}")
         logger.debug(f"Request user: {request.user}")
-        user = request.user
-        if not hasattr(user, 'instructor'):
+        if request.role != 'instructor':
             logger.debug("User is not an instructor")
             return Response({"detail": "Only instructors can access this view"}, status=status.HTTP_403_FORBIDDEN)
         return super().list(request, *args, **kwargs)
@@ -47,7 +45,7 @@ class AssignmentViewSet(viewsets.ModelViewSet):
                 module = Module.objects.get(pk=module_id)
             except Module.DoesNotExist:
                 module = None
-        serializer.save(instructor=self.request.user.instructor, module=module)
+        serializer.save(instructor=self.request.profile, module=module)
 
     def create(self, request, *args, **kwargs):
         try:
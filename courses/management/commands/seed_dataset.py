@@ -0,0 +1,439 @@
+"""
+Seeded rows go in with ``bulk_create``, which sends no signals, so the state
+the signals keep is rebuilt here: search documents for sections, section
+contents and notifications (modules.search), inbox deliveries
+(modules.inbox) and the student search index generation (accounts.search).
+Content positions are assigned in order, so completion (modules.completion)
+starts from empty bitsets. The seeded file names aren't content-addressed
+and point at no stored blob, so there are no blob references to take, and
+``generate_previews`` marks their previews failed.
+"""
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+
+from accounts.models import User, Student, Instructor, EWallet, EWalletTransaction
+from accounts.search import bump_generation as bump_search_generation
+from assignments.models import Assignment, AssignmentSubmission
+from courses.models import Module, ModuleEnrollment
+from modules import inbox, search
+from modules.models import (
+    ModuleContent, ModuleNotification, NotificationComment, ModuleTest,
+    Quiz, QuizQuestion, QuizChoice, QuizAttempt, QuizAnswer,
+    ModuleSection, SectionContent, StudentNotification,
+)
+
+FIRST_NAMES = [
+    'Amal', 'Nimal', 'Kasun', 'Dilini', 'Sachini', 'Tharindu', 'Ishara', 'Ruwan', 'Chathura', 'Nadeesha',
+    'Anna', 'Ben', 'Chloe', 'David', 'Emma', 'Farah', 'George', 'Hana', 'Ivan', 'Julia',
+]
+LAST_NAMES = [
+    'Perera', 'Fernando', 'Silva', 'Jayasinghe', 'Bandara', 'Wickramasinghe', 'Herath', 'Dissanayake',
+    'Smith', 'Brown', 'Khan', 'Garcia', 'Nguyen', 'Müller', 'Rossi', 'Kowalski',
+]
+WORDS = (
+    'data structures algorithms networks security design systems database cloud mobile web '
+    'analysis testing project management ethics statistics machine learning graphics compiler '
+    'operating theory practice introduction advanced applied fundamentals lab workshop review'
+).split()
+PROGRAMS = ['BSc Software Engineering', 'BSc Computer Science', 'BSc Information Systems', 'HND Computing']
+FILE_TYPES = ['pdf', 'pdf', 'pdf', 'pptx', 'docx', 'mp4', 'zip']
+
+# Everything is dated relative to this instant rather than "now", so two runs
+# with the same seed produce the same rows.
+EPOCH = datetime.datetime(2025, 1, 6, 8, 0, tzinfo=datetime.timezone.utc)
+
+
+class Command(BaseCommand):
+    help = 'Generates a large, deterministic synthetic dataset for load tests and benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; same seed, same data')
+        parser.add_argument('--prefix', type=str, default='seed', help='Prefix for usernames, IDs and module codes')
+        parser.add_argument('--students', type=int, default=100000)
+        parser.add_argument('--instructors', type=int, default=200)
+        parser.add_argument('--modules', type=int, default=2000)
+        parser.add_argument('--sections-per-module', type=int, default=5)
+        parser.add_argument('--contents-per-section', type=int, default=4)
+        parser.add_argument('--files-per-module', type=int, default=3, help='Module-level ModuleContent rows')
+        parser.add_argument('--tests-per-module', type=int, default=1)
+        parser.add_argument('--quizzes-per-module', type=int, default=2)
+        parser.add_argument('--questions-per-quiz', type=int, default=5)
+        parser.add_argument('--assignments-per-module', type=int, default=1)
+        parser.add_argument('--notifications-per-module', type=int, default=3)
+        parser.add_argument('--comments-per-notification', type=int, default=2)
+        parser.add_argument('--modules-per-student', type=int, default=4)
+        parser.add_argument('--attempt-rate', type=float, default=0.5, help='Share of enrollments with a quiz attempt')
+        parser.add_argument('--submission-rate', type=float, default=0.6, help='Share of enrollments with a submission per assignment')
+        parser.add_argument('--transactions-per-student', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=5000, help='bulk_create batch size')
+        parser.add_argument('--flush', action='store_true', help='Delete previously seeded rows with this prefix first')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        self.counts = {}
+        self._auto_fields = {}
+        self.enrolled = {}
+
+        if options['modules'] < 1 and options['students']:
+            raise CommandError('Students need at least one module to enroll in')
+        if options['modules'] and options['instructors'] < 1:
+            raise CommandError('Modules need at least one instructor')
+        if options['modules_per_student'] > options['modules']:
+            raise CommandError('--modules-per-student cannot exceed --modules')
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            if options['flush']:
+                self.flush()
+            elif User.objects.filter(username__startswith=f'{self.prefix}-').exists():
+                raise CommandError(f'Seeded rows with prefix "{self.prefix}" already exist; pass --flush or another --prefix')
+
+            # One deterministic hash for every account; PBKDF2 per user would dominate the run
+            self.password_hash = make_password(f'{self.prefix}-Pass-1!', salt=f'{self.prefix}{options["seed"]}')
+
+            instructors = self.create_instructors()
+            modules = self.create_modules(instructors)
+            catalogue = self.create_module_content(modules, instructors)
+            student_user_ids = self.create_students(catalogue)
+            self.create_comments(catalogue, student_user_ids)
+            self.deliver_notifications()
+        bump_search_generation()
+
+        elapsed = time.perf_counter() - started
+        for label, count in self.counts.items():
+            self.stdout.write(f'{label:<24}{count:>12,}')
+        self.stdout.write(self.style.SUCCESS(f'Seeded dataset "{self.prefix}" (seed {options["seed"]}) in {elapsed:.1f}s'))
+        self.stdout.write(f'Every seeded account uses the password {self.prefix}-Pass-1!')
+
+    # Helpers
+
+    def auto_fields(self, model):
+        if model not in self._auto_fields:
+            self._auto_fields[model] = [
+                field for field in model._meta.concrete_fields
+                if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+            ]
+        return self._auto_fields[model]
+
+    def at(self, model, when):
+        """Values for the model's auto_now/auto_now_add fields, so they are seeded too."""
+        return {
+            field.name: when if isinstance(field, models.DateTimeField) else when.date()
+            for field in self.auto_fields(model)
+        }
+
+    def insert(self, model, objs):
+        """bulk_create keeping the seeded timestamps; returns objs with their pks."""
+        # The flags are on the model's fields, shared by the whole process:
+        # they are only off for the insert
+        fields = self.auto_fields(model)
+        saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+        for field in fields:
+            field.auto_now = field.auto_now_add = False
+        try:
+            model.objects.bulk_create(objs, batch_size=self.batch_size)
+        finally:
+            for field, auto_now, auto_now_add in saved:
+                field.auto_now, field.auto_now_add = auto_now, auto_now_add
+        label = model._meta.verbose_name_plural
+        self.counts[label] = self.counts.get(label, 0) + len(objs)
+        return objs
+
+    def words(self, count):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(count))
+
+    def when(self, max_days=180):
+        return EPOCH + datetime.timedelta(seconds=self.rng.randrange(max_days * 86400))
+
+    def flush(self):
+        self.stdout.write(f'Deleting previously seeded "{self.prefix}" rows...')
+        Module.objects.filter(code__startswith=self.prefix.upper()).delete()
+        User.objects.filter(username__startswith=f'{self.prefix}-').delete()
+
+    # Generators
+
+    def create_instructors(self):
+        count = self.options['instructors']
+        self.stdout.write(f'Creating {count} instructors...')
+        users = self.insert(User, [
+            User(
+                username=f'{self.prefix}-i{i:05}',
+                email=f'{self.prefix}.instructor{i}@gas.education',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                role='instructor',
+                password=self.password_hash,
+                must_change_password=False,
+                date_joined=EPOCH,
+            )
+            for i in range(count)
+        ])
+        return self.insert(Instructor, [
+            Instructor(
+                user=user,
+                employee_id=f'{self.prefix}-I{i:05}',
+                department=self.rng.choice(['Computing', 'Engineering', 'Business']),
+                designation=self.rng.choice(['Lecturer', 'Senior Lecturer', 'Instructor']),
+                qualification='MSc',
+                **self.at(Instructor, EPOCH),
+            )
+            for i, user in enumerate(users)
+        ])
+
+    def create_modules(self, instructors):
+        count = self.options['modules']
+        self.stdout.write(f'Creating {count} modules...')
+        modules = []
+        for i in range(count):
+            created = self.when(30)
+            modules.append(Module(
+                code=f'{self.prefix.upper()}{i:06}',
+                title=self.words(3).title(),
+                description=self.words(30),
+                duration=datetime.timedelta(hours=self.rng.choice([20, 30, 45, 60])),
+                credits=self.rng.choice([2, 3, 4]),
+                instructor=self.rng.choice(instructors),
+                **self.at(Module, created),
+            ))
+        return self.insert(Module, modules)
+
+    def create_module_content(self, modules, instructors):
+        """Sections, files, tests, quizzes, assignments and notifications; returns a per-module catalogue."""
+        opts = self.options
+        self.stdout.write('Creating module content...')
+        instructor_user = {instructor.pk: instructor.user_id for instructor in instructors}
+        instructor_by_pk = {instructor.pk: instructor for instructor in instructors}
+
+        sections, files, tests, quizzes, assignments, notifications = [], [], [], [], [], []
+        for module in modules:
+            owner = instructor_user[module.instructor_id]
+            for s in range(opts['sections_per_module']):
+                sections.append(ModuleSection(
+                    module=module, title=f'Week {s + 1}: {self.words(2).title()}',
+                    description=self.words(15), order=s, **self.at(ModuleSection, self.when()),
+                ))
+            for f in range(opts['files_per_module']):
+                file_type = self.rng.choice(FILE_TYPES)
+                files.append(ModuleContent(
+                    module=module, title=self.words(3).title(),
+                    file=f'module_contents/{self.prefix}/{module.code}-{f}.{file_type}', file_type=file_type,
+                    position=f, uploaded_by_id=owner, **self.at(ModuleContent, self.when()),
+                ))
+            for _ in range(opts['tests_per_module']):
+                tests.append(ModuleTest(
+                    module=module, title=f'{self.words(2).title()} Test', description=self.words(20),
+                    date=self.when(), duration=datetime.timedelta(minutes=self.rng.choice([30, 60, 90])),
+                    **self.at(ModuleTest, self.when()),
+                ))
+            for q in range(opts['quizzes_per_module']):
+                quizzes.append(Quiz(
+                    module=module, title=f'Quiz {q + 1}: {self.words(2).title()}', description=self.words(12),
+                    time_limit=datetime.timedelta(minutes=20), total_points=opts['questions_per_quiz'],
+                    reward_points=self.rng.choice([0, 5, 10]), is_published=True, **self.at(Quiz, self.when()),
+                ))
+            for a in range(opts['assignments_per_module']):
+                assignments.append(Assignment(
+                    title=f'Assignment {a + 1}: {self.words(3).title()}', description=self.words(40),
+                    assignment_type='module', due_date=self.when(), total_marks=100,
+                    instructor=instructor_by_pk[module.instructor_id], module=module,
+                    **self.at(Assignment, self.when()),
+                ))
+            for _ in range(opts['notifications_per_module']):
+                notifications.append(ModuleNotification(
+                    module=module, title=self.words(4).capitalize(), content=self.words(60),
+                    created_by_id=owner, **self.at(ModuleNotification, self.when()),
+                ))
+
+        self.insert(ModuleSection, sections)
+        self.insert(ModuleContent, files)
+        self.insert(ModuleTest, tests)
+        self.insert(Quiz, quizzes)
+        self.insert(Assignment, assignments)
+        self.insert(ModuleNotification, notifications)
+
+        section_contents = []
+        for section in sections:
+            owner = instructor_user[section.module.instructor_id]
+            for c in range(opts['contents_per_section']):
+                is_text = self.rng.random() < 0.4
+                file_type = self.rng.choice(FILE_TYPES)
+                section_contents.append(SectionContent(
+                    section=section, title=self.words(3).title(), order=c,
+                    file=None if is_text else f'section_contents/{self.prefix}/{section.module.code}-{section.order}-{c}.{file_type}',
+                    file_type='text' if is_text else file_type,
+                    text_content=self.words(self.rng.randrange(100, 800)) if is_text else '',
+                    uploaded_by_id=owner, **self.at(SectionContent, self.when()),
+                ))
+        self.insert(SectionContent, section_contents)
+        search.index_many(sections)
+        search.index_many(section_contents)
+        search.index_many(notifications)
+
+        questions = []
+        for quiz in quizzes:
+            for order in range(opts['questions_per_quiz']):
+                questions.append(QuizQuestion(
+                    quiz=quiz, question_text=f'{self.words(8).capitalize()}?',
+                    question_type='MCQ', points=1, order=order,
+                ))
+        self.insert(QuizQuestion, questions)
+
+        choices = []
+        for question in questions:
+            correct = self.rng.randrange(4)
+            choices.extend(
+                QuizChoice(question=question, choice_text=self.words(3), is_correct=index == correct)
+                for index in range(4)
+            )
+        self.insert(QuizChoice, choices)
+
+        catalogue = {module.pk: {'quizzes': [], 'assignments': [], 'notifications': []} for module in modules}
+        questions_by_quiz = {}
+        for question in questions:
+            questions_by_quiz.setdefault(question.quiz_id, []).append(question.pk)
+        for quiz in quizzes:
+            catalogue[quiz.module_id]['quizzes'].append((quiz.pk, questions_by_quiz.get(quiz.pk, [])))
+        for assignment in assignments:
+            catalogue[assignment.module_id]['assignments'].append(assignment.pk)
+        for notification in notifications:
+            catalogue[notification.module_id]['notifications'].append(notification.pk)
+        return catalogue
+
+    def create_students(self, catalogue):
+        """Students with enrollments, quiz attempts, submissions and wallets, one batch at a time."""
+        opts = self.options
+        total = opts['students']
+        module_ids = sorted(catalogue)
+        user_ids = []
+        self.stdout.write(f'Creating {total} students...')
+
+        for start in range(0, total, self.batch_size):
+            indexes = range(start, min(start + self.batch_size, total))
+            users = self.insert(User, [
+                User(
+                    username=f'{self.prefix}-s{i:07}',
+                    email=f'{self.prefix}.student{i}@gas.education',
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                    role='student',
+                    password=self.password_hash,
+                    must_change_password=False,
+                    date_joined=EPOCH,
+                )
+                for i in indexes
+            ])
+            user_ids.extend(user.pk for user in users)
+            students = self.insert(Student, [
+                Student(
+                    user=user,
+                    student_id=f'{self.prefix}-S{i:07}',
+                    batch=f'20{self.rng.randrange(22, 26)}{self.rng.choice("AB")}',
+                    program=self.rng.choice(PROGRAMS),
+                    enrollment_status='enrolled',
+                    **self.at(Student, EPOCH),
+                )
+                for i, user in zip(indexes, users)
+            ])
+
+            enrollments, attempts, submissions = [], [], []
+            attempt_questions = []
+            for student in students:
+                for module_id in self.rng.sample(module_ids, opts['modules_per_student']):
+                    enrolled_at = self.when(30)
+                    completed = self.rng.random() < 0.2
+                    enrollments.append(ModuleEnrollment(
+                        student=student, module_id=module_id, completed=completed,
+                        completion_date=enrolled_at + datetime.timedelta(days=90) if completed else None,
+                        **self.at(ModuleEnrollment, enrolled_at),
+                    ))
+                    entry = catalogue[module_id]
+                    if entry['quizzes'] and self.rng.random() < opts['attempt_rate']:
+                        quiz_id, question_ids = self.rng.choice(entry['quizzes'])
+                        started_at = self.when()
+                        finished = self.rng.random() < 0.9
+                        attempts.append(QuizAttempt(
+                            student=student, quiz_id=quiz_id, is_completed=finished,
+                            completed_at=started_at + datetime.timedelta(minutes=15) if finished else None,
+                            score=self.rng.randrange(len(question_ids) + 1) if finished else None,
+                            **self.at(QuizAttempt, started_at),
+                        ))
+                        attempt_questions.append(question_ids if finished else [])
+                    for assignment_id in entry['assignments']:
+                        if self.rng.random() < opts['submission_rate']:
+                            graded = self.rng.random() < 0.5
+                            submissions.append(AssignmentSubmission(
+                                assignment_id=assignment_id, student=student,
+                                submitted_file=f'assignment_submissions/{self.prefix}/{assignment_id}-{student.student_id}.pdf',
+                                grade=self.rng.randrange(30, 101) if graded else None,
+                                feedback=self.words(10) if graded else '',
+                                status='graded' if graded else 'submitted',
+                                **self.at(AssignmentSubmission, self.when()),
+                            ))
+            self.insert(ModuleEnrollment, enrollments)
+            for enrollment in enrollments:
+                self.enrolled.setdefault(enrollment.module_id, []).append(enrollment.student_id)
+            self.insert(QuizAttempt, attempts)
+            self.insert(AssignmentSubmission, submissions)
+
+            answers = []
+            for attempt, question_ids in zip(attempts, attempt_questions):
+                for question_id in question_ids:
+                    correct = self.rng.random() < 0.7
+                    answers.append(QuizAnswer(
+                        attempt=attempt, question_id=question_id, answer_text=self.words(2),
+                        is_correct=correct, points_earned=1 if correct else 0,
+                    ))
+            self.insert(QuizAnswer, answers)
+
+            wallets, transactions = [], []
+            for student in students:
+                amounts = [Decimal(self.rng.choice([5, 10, 20])) for _ in range(opts['transactions_per_student'])]
+                wallet = EWallet(student=student, balance=sum(amounts, Decimal(0)), **self.at(EWallet, EPOCH))
+                wallets.append(wallet)
+                transactions.extend(
+                    EWalletTransaction(
+                        ewallet=wallet, amount=amount, transaction_type='credit',
+                        reason=f'Quiz reward: {self.words(2)}', **self.at(EWalletTransaction, self.when()),
+                    )
+                    for amount in amounts
+                )
+            self.insert(EWallet, wallets)
+            self.insert(EWalletTransaction, transactions)
+
+            self.stdout.write(f'  {indexes.stop}/{total} students')
+        return user_ids
+
+    def create_comments(self, catalogue, student_user_ids):
+        per_notification = self.options['comments_per_notification']
+        if not student_user_ids or not per_notification:
+            return
+        comments = []
+        for entry in catalogue.values():
+            for notification_id in entry['notifications']:
+                for _ in range(per_notification):
+                    comments.append(NotificationComment(
+                        notification_id=notification_id, user_id=self.rng.choice(student_user_ids),
+                        text=self.words(12), **self.at(NotificationComment, self.when()),
+                    ))
+                if len(comments) >= self.batch_size:
+                    self.insert(NotificationComment, comments)
+                    comments = []
+        self.insert(NotificationComment, comments)
+
+    def deliver_notifications(self):
+        """Each module's notifications into the inboxes of its students."""
+        self.stdout.write('Delivering notifications...')
+        for module_id, student_ids in self.enrolled.items():
+            inbox.deliver_module(module_id, student_ids)
+        self.counts[StudentNotification._meta.verbose_name_plural] = StudentNotification.objects.filter(
+            module__code__startswith=self.prefix.upper(),
+        ).count()
@@ -29,6 +29,11 @@ class ModuleEnrollment(models.Model):
     enrolled_at = models.DateTimeField(auto_now_add=True)
     completed = models.BooleanField(default=False)
     completion_date = models.DateTimeField(null=True, blank=True)
+    # Completed contents, bit n for the content at position n (see
+    # modules.completion); completed_contents is its popcount
+    completion_bits = models.BinaryField(default=b'')
+    completed_contents = models.PositiveIntegerField(default=0)
+    last_accessed = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ['student', 'module']
@@ -0,0 +1,76 @@
+import io
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from accounts.models import Student, User
+from accounts.search import search_students
+from assignments.models import Assignment
+from modules import search
+from modules.models import (
+    ModuleContent, ModuleNotification, ModuleSection, NotificationComment, Quiz, QuizChoice, QuizQuestion,
+    SearchDocument, SectionContent, StudentNotification,
+)
+from .models import Module, ModuleEnrollment
+
+
+class SeedDatasetTests(TestCase):
+    def seed(self, **options):
+        options = {
+            'students': 6, 'instructors': 2, 'modules': 3, 'sections_per_module': 2, 'contents_per_section': 2,
+            'files_per_module': 2, 'quizzes_per_module': 1, 'questions_per_quiz': 2, 'modules_per_student': 2,
+            'notifications_per_module': 2, 'comments_per_notification': 1, 'batch_size': 4, **options,
+        }
+        call_command('seed_dataset', stdout=io.StringIO(), **options)
+
+    def test_seeds_the_requested_counts(self):
+        self.seed()
+
+        self.assertEqual(User.objects.filter(username__startswith='seed-', role='instructor').count(), 2)
+        self.assertEqual(Student.objects.filter(student_id__startswith='seed-').count(), 6)
+        self.assertEqual(Module.objects.filter(code__startswith='SEED').count(), 3)
+        self.assertEqual(ModuleSection.objects.count(), 6)
+        self.assertEqual(SectionContent.objects.count(), 12)
+        self.assertEqual(ModuleContent.objects.count(), 6)
+        self.assertEqual(Quiz.objects.count(), 3)
+        self.assertEqual(QuizQuestion.objects.count(), 6)
+        self.assertEqual(QuizChoice.objects.count(), 24)
+        self.assertEqual(Assignment.objects.count(), 3)
+        self.assertEqual(ModuleNotification.objects.count(), 6)
+        self.assertEqual(NotificationComment.objects.count(), 6)
+        self.assertEqual(ModuleEnrollment.objects.count(), 12)
+        for module in Module.objects.all():
+            self.assertEqual(
+                list(module.contents.order_by('position').values_list('position', flat=True)), [0, 1],
+            )
+
+    def test_rebuilds_the_state_signals_would_keep(self):
+        self.seed()
+
+        # Every enrolled student has each of the module's notifications
+        self.assertEqual(StudentNotification.objects.count(), 12 * 2)
+        for enrollment in ModuleEnrollment.objects.all():
+            self.assertEqual(
+                StudentNotification.objects.filter(student=enrollment.student, module=enrollment.module).count(), 2,
+            )
+        # Same documents a rebuild makes
+        documents = set(SearchDocument.objects.values_list('kind', 'object_id', 'module_id', 'title', 'body'))
+        self.assertEqual(len(documents), 6 + 12 + 6)
+        search.rebuild()
+        self.assertEqual(
+            set(SearchDocument.objects.values_list('kind', 'object_id', 'module_id', 'title', 'body')), documents,
+        )
+        # Seeded students are searchable straight away
+        self.assertEqual(search_students('seed-S0000005')[0]['student_id'], 'seed-S0000005')
+
+    def test_restores_the_auto_now_flags(self):
+        fields = [Module._meta.get_field('created_at'), Module._meta.get_field('updated_at')]
+        flags = [(field.auto_now, field.auto_now_add) for field in fields]
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+        self.assertEqual([(field.auto_now, field.auto_now_add) for field in fields], flags)
+        module = Module.objects.create(code='NEW001', title='New', description='')
+        self.assertIsNotNone(module.created_at)
@@ -81,7 +81,7 @@ class StudentLessonViewSet(viewsets.ReadOnlyModelViewSet):
     def complete(self, request, pk=None):
         lesson = self.get_object()
         progress, created = StudentProgress.objects.get_or_create(
-            student=request.user.student,
+            student=request.profile,
             course=lesson.module.course,
             module=lesson.module,
             lesson=lesson,
@@ -116,7 +116,7 @@ class StudentAssignmentViewSet(viewsets.ReadOnlyModelViewSet):
             
         submission = AssignmentSubmission.objects.create(
             assignment=assignment,
-            student=request.user.student,
+            student=request.profile,
             submission_file=request.data.get('file'),
             comments=request.data.get('comments', ''),
             status='submitted'
@@ -492,10 +492,10 @@ class AnnouncementViewSet(viewsets.ModelViewSet):
         if course_id:
             queryset = queryset.filter(course_id=course_id)
         # Students see only announcements for their courses
-        if hasattr(self.request.user, 'student'):
+        if self.request.role == 'student':
             queryset = queryset.filter(course__enrollments__student__user=self.request.user)
         # Instructors see only their courses
-        elif hasattr(self.request.user, 'instructor'):
+        elif self.request.role == 'instructor':
             queryset = queryset.filter(course__instructor=self.request.user)
         return queryset.distinct()
 
@@ -504,5 +504,5 @@ class AnnouncementViewSet(viewsets.ModelViewSet):
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
-            return [permissions.IsAuthenticated(), permissions.IsAdminUser() if not hasattr(self.request.user, 'instructor') else permissions.IsAuthenticated()]
+            return [permissions.IsAuthenticated(), permissions.IsAdminUser() if self.request.role != 'instructor' else permissions.IsAuthenticated()]
         return [permissions.IsAuthenticated()] 
\ No newline at end of file
@@ -0,0 +1,21 @@
+"""
+Whether the configured cache is shared between worker processes.
+
+Some features keep state in the cache that other workers must see, like the
+token blacklist filter's generation (accounts.blacklist), principal
+versions (accounts.authentication) or enrollment membership versions
+(modules.membership). With a per-process backend (the LocMem
+default when REDIS_URL isn't set) they fall back to doing the work directly,
+or to short timeouts, instead.
+"""
+from django.conf import settings
+
+# Backends whose entries only the process that wrote them can see
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def cache_is_shared(alias='default'):
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
@@ -0,0 +1,101 @@
+"""
+Keyset (seek) pagination helpers.
+
+Unlike OFFSET pagination, every page is fetched with a ``WHERE (key) > (last
+key seen)`` filter against an index, so page 1,000 costs the same as page 1
+and no COUNT query is needed. Cursors are opaque, URL-safe encodings of the
+ordering values of the last row on the previous page.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    payload = json.dumps(list(values), cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def keyset_filter(ordering, values):
+    """
+    The Q object selecting rows strictly after ``values`` in ``ordering``.
+
+    ``ordering`` is a list of field names, optionally prefixed with ``-``; the
+    last one must be unique so that rows never tie.
+    """
+    condition = Q()
+    for position in reversed(range(len(ordering))):
+        field = ordering[position].lstrip('-')
+        lookup = 'lt' if ordering[position].startswith('-') else 'gt'
+        step = Q(**{f'{field}__{lookup}': values[position]})
+        if position < len(ordering) - 1:
+            step |= Q(**{field: values[position]}) & condition
+        condition = step
+    return condition
+
+
+def _row_value(row, field):
+    if isinstance(row, dict):
+        return row[field]
+    for attribute in field.split('__'):
+        row = getattr(row, attribute)
+    return row
+
+
+def paginate_keyset(queryset, ordering, cursor=None, page_size=50):
+    """
+    Fetch one page of ``queryset`` ordered by ``ordering``.
+
+    Works on model and ``values()`` querysets (for the latter every ordering
+    field must be in the projection). Returns ``(rows, next_cursor)``;
+    ``next_cursor`` is None on the last page. Raises InvalidCursor for a
+    malformed cursor.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor, len(ordering))
+        try:
+            queryset = queryset.filter(keyset_filter(ordering, values))
+        except (ValueError, TypeError, ValidationError):
+            # Well-formed, but the values don't fit the fields (e.g. a string for an id)
+            raise InvalidCursor('Invalid cursor')
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(_row_value(rows[-1], field.lstrip('-')) for field in ordering)
+    return rows, next_cursor
+
+
+def page_size_param(request, default=50, maximum=500):
+    try:
+        size = int(request.query_params.get('page_size', default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def next_page_url(request, next_cursor):
+    if next_cursor is None:
+        return None
+    return replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -95,6 +96,37 @@ DATABASES = {
         }
     }
 
+REDIS_URL = os.getenv('REDIS_URL')
+
+# Cache: shared Redis in production (set REDIS_URL), per-process memory otherwise
+# (development and tests). Principals, the token blacklist filter and module
+# payload versions all live here, so every worker must see the same cache.
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'lms',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'lms',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Live event fan-out between processes (see modules.events). The event stream
+# view is async and needs an ASGI server, e.g.
+#   gunicorn lms_backend.asgi:application -k uvicorn.workers.UvicornWorker
+# Under plain (WSGI) gunicorn each open stream ties up a whole sync worker.
+EVENTS_BACKEND = 'modules.events.RedisBackend' if REDIS_URL else 'modules.events.LocalBackend'
+
+# Cached module payloads (see modules.cache)
+MODULE_CACHE_TIMEOUT = 600  # seconds; changes bump the module version immediately
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -123,6 +155,13 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Delivery of protected media (see modules.media): set MEDIA_ACCEL to
+# 'x-accel-redirect' behind nginx, with an internal location serving
+# MEDIA_ROOT at MEDIA_ACCEL_PREFIX, or 'x-sendfile' behind Apache/lighttpd.
+MEDIA_ACCEL = os.getenv('MEDIA_ACCEL') or None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_SIGNED_URL_MAX_AGE = 600  # seconds
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -146,12 +185,30 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'TOKEN_TYPE_CLAIM': 'token_type',
     'JTI_CLAIM': 'jti',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.FilteredTokenRefreshSerializer',
 }
 
+# In-process Bloom filter in front of the refresh token blacklist (see accounts.blacklist).
+# Prune expired tokens with `manage.py prune_tokens`.
+TOKEN_BLACKLIST_FILTER = {
+    'CAPACITY': 1000000,  # jtis before the filter is rebuilt larger
+    'ERROR_RATE': 0.001,  # share of refreshes that still hit the blacklist table
+    'MAX_STALENESS': 5,  # seconds between forced resyncs, in case a generation bump was lost
+    'ENABLED': None,  # None: only with a shared cache (REDIS_URL), else every refresh asks the database
+}
+
+# Cached JWT principals (see accounts.authentication)
+PRINCIPAL_CACHE_TIMEOUT = 300  # seconds a user + profile stays in the shared cache (Redis only)
+PRINCIPAL_LOCAL_CACHE_SIZE = 2048  # principals kept in each worker's LRU
+PRINCIPAL_LOCAL_CACHE_TIMEOUT = 5  # seconds a worker may serve a principal without seeing another's changes
+
+# In-process student search index, used when the database has no trigram indexes (see accounts.search)
+STUDENT_SEARCH_MAX_STALENESS = 60  # seconds before a worker rebuilds its index regardless
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
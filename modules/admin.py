@@ -10,7 +10,8 @@ from .models import (
 # admin.site.register(Module)  # Removed to avoid duplicate registration
 @admin.register(ModuleTemplate)
 class ModuleTemplateAdmin(admin.ModelAdmin):
-    list_display = ('code', 'name', 'is_active', 'created_at', 'updated_at')
+    list_display = ('code', 'name', 'source_module', 'is_active', 'created_at', 'updated_at')
+    raw_id_fields = ('source_module',)
     list_filter = ('is_active', 'created_at')
     search_fields = ('code', 'name', 'description')
     ordering = ('code',)
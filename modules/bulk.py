@@ -0,0 +1,162 @@
+"""
+Bulk reordering and editing of sections and section contents.
+
+Reordering used to be one PATCH, and one UPDATE, per item. Here a whole new
+order or a batch of partial edits is checked against the instructor's rows
+with one query and written with one ``bulk_update`` in a transaction.
+
+``order`` keys are sparse, ``ORDER_GAP`` apart. A new order keeps the keys
+of the longest run of items that are still in sequence and only gives the
+moved items new keys in the gaps between their neighbours, so dragging one
+item anywhere writes one row. Only when a gap has no room left is the whole
+list renumbered.
+
+``bulk_update`` sends no signals, so the module payload versions and search
+documents (see modules.search) are refreshed here.
+"""
+import bisect
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import search
+from .cache import bump_module_versions
+from .models import ModuleSection, SectionContent
+
+ORDER_GAP = 1024
+BULK_BATCH_SIZE = 500
+
+# The field whose items are ordered among each other
+PARENT_FIELD = {ModuleSection: 'module', SectionContent: 'section'}
+
+
+class BulkEditError(Exception):
+    """A reorder or edit batch the client has to correct; the message says how."""
+
+
+def sparse_keys(keys):
+    """
+    New ``order`` keys for items now in this sequence with these current keys:
+    increasing, and equal to the current key for as many items as possible.
+    """
+    kept = set(_increasing_run(keys))
+    new_keys = list(keys)
+    low, pending = 0, []
+    for index, key in enumerate(keys + [None]):
+        if index < len(keys) and index not in kept:
+            pending.append(index)
+            continue
+        if pending:
+            high = key if key is not None else low + (len(pending) + 1) * ORDER_GAP
+            step = (high - low) // (len(pending) + 1)
+            if step < 1:
+                # No room between the neighbours
+                return [(position + 1) * ORDER_GAP for position in range(len(keys))]
+            for offset, pending_index in enumerate(pending, 1):
+                new_keys[pending_index] = low + offset * step
+            pending = []
+        if key is not None:
+            low = key
+    return new_keys
+
+
+def _increasing_run(keys):
+    """Indices of a longest strictly increasing subsequence of ``keys`` (patience sorting)."""
+    tails, tail_indices, previous = [], [], [None] * len(keys)
+    for index, key in enumerate(keys):
+        # Keys of 0 stay put only as the first item: new keys go above the previous one
+        if key <= 0 and index:
+            continue
+        position = bisect.bisect_left(tails, key)
+        if position:
+            previous[index] = tail_indices[position - 1]
+        if position == len(tails):
+            tails.append(key)
+            tail_indices.append(index)
+        else:
+            tails[position] = key
+            tail_indices[position] = index
+    run, index = [], tail_indices[-1] if tail_indices else None
+    while index is not None:
+        run.append(index)
+        index = previous[index]
+    return run[::-1]
+
+
+def reorder(queryset, parent_id, ids):
+    """
+    Put the items of parent ``parent_id`` among ``queryset`` in the order of
+    ``ids``, which must list each of them once. Returns ``[(id, order)]``
+    and how many rows changed.
+    """
+    model = queryset.model
+    with transaction.atomic():
+        rows = {
+            row.pk: row
+            for row in _rows(queryset.filter(**{f'{PARENT_FIELD[model]}_id': parent_id})).select_for_update()
+        }
+        if not rows:
+            raise BulkEditError(f'No {PARENT_FIELD[model]} {parent_id} of yours has anything to order')
+        if len(ids) != len(set(ids)) or set(ids) != set(rows):
+            raise BulkEditError(f'order must list every item of {PARENT_FIELD[model]} {parent_id} exactly once')
+
+        sequence = [rows[pk] for pk in ids]
+        changed = []
+        for row, key in zip(sequence, sparse_keys([row.order for row in sequence])):
+            if row.order != key:
+                row.order = key
+                changed.append(row)
+        _write(model, changed, {'order'})
+    return [(row.pk, row.order) for row in sequence], len(changed)
+
+
+def edit(queryset, edits):
+    """
+    Apply partial edits, dicts of an ``id`` and the fields to set, to rows of
+    ``queryset``. Returns how many rows changed.
+    """
+    model = queryset.model
+    with transaction.atomic():
+        rows = _rows(queryset).select_for_update().in_bulk([item['id'] for item in edits])
+        missing = sorted({item['id'] for item in edits} - set(rows))
+        if missing:
+            raise BulkEditError(f'Not yours or not found: {", ".join(str(pk) for pk in missing)}')
+
+        changed, fields = {}, set()
+        for item in edits:
+            row = rows[item['id']]
+            for field, value in item.items():
+                if field != 'id' and getattr(row, field) != value:
+                    setattr(row, field, value)
+                    changed[row.pk] = row
+                    fields.add(field)
+        _write(model, list(changed.values()), fields)
+    return len(changed)
+
+
+def _rows(queryset):
+    if queryset.model is SectionContent:
+        # The module, for versions and search documents
+        return queryset.select_related('section')
+    return queryset
+
+
+def _write(model, rows, fields):
+    if not rows:
+        return
+    fields = set(fields)
+    if model is ModuleSection:
+        # auto_now isn't applied by bulk_update
+        now = timezone.now()
+        for row in rows:
+            row.updated_at = now
+        fields.add('updated_at')
+    model.objects.bulk_update(rows, sorted(fields), batch_size=BULK_BATCH_SIZE)
+
+    if model is SectionContent:
+        module_ids = {row.section.module_id for row in rows}
+    else:
+        module_ids = {row.module_id for row in rows}
+    bump_module_versions(*module_ids)
+    if fields & search.INDEXED_FIELDS[model]:
+        search.index_many(rows)
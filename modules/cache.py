@@ -0,0 +1,115 @@
+"""
+Versioned response cache for module payloads.
+
+Every module has a version number in the cache; cached payloads are keyed by
+the versions of the modules they contain, so bumping a version (see
+modules.signals) makes every payload that includes that module unreachable
+without having to find and delete them. Stale entries just expire.
+
+Writes that bypass model signals (``QuerySet.update()``, ``bulk_create``,
+raw SQL) must call ``bump_module_versions`` themselves.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import media
+from .conditional import conditional_response
+
+MODULE_CACHE_TIMEOUT = getattr(settings, 'MODULE_CACHE_TIMEOUT', 600)
+
+# Query parameters that change the rendered payload
+VARYING_PARAMS = ('fields', 'expand')
+
+
+def _version_key(module_id):
+    return f'modules:version:{module_id}'
+
+
+def module_versions(module_ids):
+    """Map of module id -> current version, seeding missing versions."""
+    keys = {_version_key(module_id): module_id for module_id in module_ids}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # Fresh, never reused values; see accounts.authentication.principal_version
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_module_versions(*module_ids):
+    """
+    Give the modules new versions now, for the rest of this transaction, and
+    again once it commits: a payload another request builds before then,
+    from the old rows, would otherwise be cached under the new version.
+    """
+    module_ids = [module_id for module_id in module_ids if module_id is not None]
+    if not module_ids:
+        return
+
+    def bump():
+        now = time.time_ns()
+        cache.set_many({_version_key(module_id): now for module_id in module_ids}, None)
+
+    bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def payload_signature(namespace, versions, request, signed_media=False):
+    """
+    What a module payload depends on: versions, host (absolute file URLs),
+    shaping params and, with ``signed_media``, the window its signed media
+    URLs were made in (see modules.media.signing_window).
+    """
+    parts = [
+        namespace,
+        request.get_host(),
+        ','.join(f'{module_id}:{versions[module_id]}' for module_id in sorted(versions)),
+        '&'.join(f'{name}={request.query_params.get(name, "")}' for name in VARYING_PARAMS),
+    ]
+    if signed_media:
+        parts.append(f'media:{media.signing_window()}')
+    return '|'.join(parts)
+
+
+def cached_payload(signature, build):
+    key = 'modules:payload:' + hashlib.md5(signature.encode()).hexdigest()
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, MODULE_CACHE_TIMEOUT)
+    return data
+
+
+def module_payload_response(namespace, module_ids, request, build, signed_media=False):
+    """
+    Response for a payload built from the modules in ``module_ids``, cached
+    by their versions. The version signature doubles as the ETag, so a
+    matching If-None-Match gets a 304 before any serialization.
+
+    Versions are bump timestamps, so for a single module the version is also
+    its Last-Modified. Not for lists: dropping a module from a list doesn't
+    make the remaining ones any newer.
+
+    Payloads with signed media URLs (previews) pass ``signed_media``: they
+    are rebuilt, and their ETag changes, once per signing window, so neither
+    the cache nor a client holds URLs that have expired.
+    """
+    versions = module_versions(module_ids)
+    signature = payload_signature(namespace, versions, request, signed_media)
+    last_modified = versions[module_ids[0]] // 10 ** 9 if len(module_ids) == 1 else None
+    if last_modified is not None and signed_media:
+        last_modified = max(last_modified, media.signing_window() * media.MEDIA_SIGNED_URL_WINDOW)
+    return conditional_response(
+        request,
+        lambda: cached_payload(signature, build),
+        etag=signature,
+        last_modified=last_modified,
+    )
@@ -0,0 +1,132 @@
+"""
+Deep copies of modules for a new intake, from a prior module or a ModuleTemplate.
+
+A module is copied with its sections and their contents, its contents, its
+tests and its quizzes with their questions and choices. Each level is one
+query to read and one ``bulk_create`` to write, with the new primary keys
+(returned by the insert) mapping the old parents to the new ones, so a
+copy takes the same dozen queries whatever the module holds.
+
+Files are shared rather than copied: the new rows hold the same
+content-addressed names and the blobs gain a reference each (see
+modules.storage). Previews come along with them. Enrollments, notifications
+and student work are not copied, and copied quizzes start unpublished.
+
+``bulk_create`` sends no signals, so the module payload versions and search
+documents (see modules.search) are refreshed here.
+"""
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+
+from courses.models import Module
+from . import previews, search
+from .cache import bump_module_versions
+from .models import (
+    ModuleContent, ModuleSection, ModuleTest, Quiz, QuizChoice, QuizQuestion, SectionContent,
+)
+from .storage import content_storage
+
+CLONE_BATCH_SIZE = 500
+
+
+def _copy(rows, **changes):
+    """Unsaved copies of ``rows`` with ``changes``; values may be callables of the row."""
+    copies = []
+    for row in rows:
+        values = {}
+        for field in row._meta.concrete_fields:
+            if not field.primary_key:
+                value = getattr(row, field.attname)
+                # The name, not the FieldFile: that stays bound to the original
+                values[field.attname] = value.name if isinstance(value, FieldFile) else value
+        copy = type(row)(**values)
+        for name, value in changes.items():
+            setattr(copy, name, value(row) if callable(value) else value)
+        copies.append(copy)
+    return copies
+
+
+def _create(rows, **changes):
+    """bulk_create copies of ``rows``; returns ``{old pk: new pk}`` and the copies."""
+    rows = list(rows)
+    copies = _copy(rows, **changes)
+    if copies:
+        type(copies[0]).objects.bulk_create(copies, batch_size=CLONE_BATCH_SIZE)
+    return {row.pk: copy.pk for row, copy in zip(rows, copies)}, copies
+
+
+def clone_module(source, code, instructor, title=None, description=None):
+    """
+    A new module of ``instructor``'s with everything ``source`` holds (see
+    the module docstring for what is and isn't copied). Returns the module
+    and how many rows of each kind were copied.
+    """
+    with transaction.atomic():
+        module = Module.objects.create(
+            code=code,
+            title=title or source.title,
+            description=description if description is not None else source.description,
+            duration=source.duration,
+            credits=source.credits,
+            instructor=instructor,
+        )
+        copied = copy_contents(source, module, uploaded_by=instructor.user)
+    return module, copied
+
+
+def copy_contents(source, module, uploaded_by):
+    """Copy everything ``source`` holds into ``module``; returns how many rows of each kind."""
+    section_ids, sections = _create(ModuleSection.objects.filter(module=source), module_id=module.pk)
+    _, section_contents = _create(
+        SectionContent.objects.filter(section__module=source),
+        section_id=lambda row: section_ids[row.section_id], uploaded_by_id=uploaded_by.pk,
+    )
+    # Same positions: they're unique per module, and the new module has no others
+    _, contents = _create(
+        ModuleContent.objects.filter(module=source), module_id=module.pk, uploaded_by_id=uploaded_by.pk,
+    )
+    _, tests = _create(ModuleTest.objects.filter(module=source), module_id=module.pk)
+    quiz_ids, quizzes = _create(Quiz.objects.filter(module=source), module_id=module.pk, is_published=False)
+    question_ids, questions = _create(
+        QuizQuestion.objects.filter(quiz__module=source), quiz_id=lambda row: quiz_ids[row.quiz_id],
+    )
+    _, choices = _create(
+        QuizChoice.objects.filter(question__quiz__module=source),
+        question_id=lambda row: question_ids[row.question_id],
+    )
+
+    content_storage().retain_all([row.file.name for row in section_contents + contents])
+    for model, rows in ((SectionContent, section_contents), (ModuleContent, contents)):
+        for row in rows:
+            # Copied mid-generation: the job only updates the original
+            if row.file and row.previews.get('status') not in ('ready', 'failed'):
+                previews.schedule(model, row.pk)
+
+    # section.module_id for the documents, without a query per content
+    sections_by_id = {section.pk: section for section in sections}
+    for content in section_contents:
+        content.section = sections_by_id[content.section_id]
+    search.index_many(sections)
+    search.index_many(section_contents)
+    bump_module_versions(module.pk)
+    return {
+        'sections': len(sections),
+        'section_contents': len(section_contents),
+        'contents': len(contents),
+        'tests': len(tests),
+        'quizzes': len(quizzes),
+        'questions': len(questions),
+        'choices': len(choices),
+    }
+
+
+def instantiate(template, code, instructor, title=None, description=None):
+    """
+    A new module from a ModuleTemplate: a copy of its source module, or an
+    empty module without one. Returns like ``clone_module``.
+    """
+    title = title or template.name
+    description = description if description is not None else template.description
+    if template.source_module is not None:
+        return clone_module(template.source_module, code, instructor, title=title, description=description)
+    return Module.objects.create(code=code, title=title, description=description, instructor=instructor), {}
@@ -0,0 +1,50 @@
+"""
+Conditional GET for read-heavy endpoints.
+
+Views compute a cheap validator first (module versions, or one aggregate
+query) and only serialize when the client's copy is stale.
+"""
+import hashlib
+
+from django.db.models import Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def conditional_response(request, build, etag, last_modified=None):
+    """
+    Answer If-None-Match/If-Modified-Since with 304, otherwise
+    ``Response(build())``; both carry the validators. ``etag`` is hashed
+    into an opaque tag; ``last_modified`` is a Unix timestamp.
+    """
+    etag = make_etag(etag)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = Response(build())
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Responses are per-user: let clients keep them but always revalidate
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class ScalarAggregate(Subquery):
+    """
+    ``(SELECT FUNC(column) FROM (<queryset>) _agg)``: an aggregate over a
+    whole queryset usable as an expression, so several of them (over
+    unrelated tables) can be fetched in a single query.
+    """
+    template = '(SELECT %(function)s(_agg.%(column)s) FROM (%(subquery)s) _agg)'
+
+    def __init__(self, queryset, function, field, output_field=None):
+        column = queryset.model._meta.get_field(field).column
+        super().__init__(
+            queryset.order_by().values(field), output_field=output_field,
+            function=function, column=f'"{column}"',
+        )
@@ -0,0 +1,171 @@
+"""
+Live events pushed to students over Server-Sent Events.
+
+Signal handlers publish small JSON events (a new notification, a comment, a
+grade) to per-student channels once their transaction commits. The process
+wide ``broker`` hands each event to the streams subscribed to that channel
+in this process; the configured backend (``EVENTS_BACKEND``) decides how
+events reach the other processes:
+
+* ``LocalBackend`` delivers in-process only: development, tests and single
+  worker deployments.
+* ``RedisBackend`` relays through Redis pub/sub (``REDIS_URL``), so a stream
+  held open by one worker sees events published by any other.
+
+The stream view (``student_event_stream``) is async: serve the project
+through ``lms_backend.asgi`` (gunicorn with ``-k uvicorn.workers.UvicornWorker``,
+or any ASGI server); under WSGI every open stream holds a worker.
+
+Subscribers are asyncio queues; publishing is thread-safe and never blocks.
+A subscriber that falls ``EVENTS_QUEUE_SIZE`` events behind loses the oldest
+ones and gets a ``resync`` event telling the client to refetch.
+"""
+import asyncio
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+EVENTS_BACKEND = getattr(settings, 'EVENTS_BACKEND', 'modules.events.LocalBackend')
+EVENTS_QUEUE_SIZE = getattr(settings, 'EVENTS_QUEUE_SIZE', 100)
+
+
+def student_channel(student_id):
+    return f'student:{student_id}'
+
+
+class LocalBackend:
+    """Delivers to subscribers of this process only."""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def start(self):
+        pass
+
+    def publish(self, channel, message):
+        self.broker.dispatch(channel, message)
+
+
+class RedisBackend:
+    """
+    Relays every event through Redis pub/sub; a daemon thread per process
+    listens and dispatches to the local subscribers.
+    """
+    prefix = 'lms:events:'
+
+    def __init__(self, broker, url=None):
+        import redis
+
+        self.broker = broker
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+
+    def start(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self.prefix + '*')
+        threading.Thread(target=self._listen, args=(pubsub,), name='events-redis', daemon=True).start()
+
+    def _listen(self, pubsub):
+        for message in pubsub.listen():
+            channel = message['channel'].decode()[len(self.prefix):]
+            self.broker.dispatch(channel, json.loads(message['data']))
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, json.dumps(message, cls=DjangoJSONEncoder))
+
+
+class Subscription:
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def push(self, message):
+        # Runs on the subscriber's loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            message = {'type': 'resync', 'id': message['id'], 'data': {}}
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    async def __aenter__(self):
+        self.broker._add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker._remove(self)
+
+
+class Broker:
+    def __init__(self, backend_path=EVENTS_BACKEND, queue_size=EVENTS_QUEUE_SIZE):
+        self.backend_path = backend_path
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    backend = import_string(self.backend_path)(self)
+                    backend.start()
+                    self._backend = backend
+        return self._backend
+
+    def subscribe(self, channel):
+        """``async with broker.subscribe(channel) as subscription: await subscription.get()``"""
+        self.backend  # listen before the first event can be missed
+        return Subscription(self, channel, self.queue_size)
+
+    def _add(self, subscription):
+        with self._lock:
+            self._subscribers.setdefault(subscription.channel, set()).add(subscription)
+
+    def _remove(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.channel, None)
+
+    def dispatch(self, channel, message):
+        """Hand a message to this process's subscribers of ``channel``."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, message)
+            except RuntimeError:
+                # Its loop has closed; the stream is gone
+                self._remove(subscription)
+
+    def publish(self, channel, message):
+        self.backend.publish(channel, message)
+
+
+broker = Broker()
+
+
+def publish_to_students(student_ids, event_type, data):
+    """Publish an event to each student's channel after the current transaction commits."""
+    student_ids = list(student_ids)
+    if not student_ids:
+        return
+    message = {'type': event_type, 'id': time.time_ns(), 'data': data}
+    # Round-trip through JSON now so in-process subscribers see what Redis ones would
+    message = json.loads(json.dumps(message, cls=DjangoJSONEncoder))
+
+    def send():
+        for student_id in student_ids:
+            broker.publish(student_channel(student_id), message)
+
+    transaction.on_commit(send)
@@ -0,0 +1,145 @@
+"""
+Per-student notification inbox.
+
+Posting a notification writes one StudentNotification row per enrolled
+student (fan-out on write), so reading a feed is a single range scan over
+``(student, created_at, id)`` instead of a join across every enrolled
+module. Enrolling in a module delivers its existing notifications;
+unenrolling withdraws them. All three happen in modules.signals.
+
+Unread counts are cached per student and dropped whenever a change to an
+inbox commits.
+Writes that bypass model signals (``bulk_create`` of enrollments, raw SQL)
+must call ``deliver_module`` / ``withdraw_module`` themselves.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from courses.models import ModuleEnrollment
+from lms_backend.pagination import paginate_keyset
+from .models import ModuleNotification, StudentNotification
+
+INBOX_UNREAD_TIMEOUT = getattr(settings, 'INBOX_UNREAD_TIMEOUT', 600)
+
+DELIVERY_BATCH_SIZE = 1000
+
+FEED_ORDERING = ['-created_at', '-id']
+
+
+def _unread_key(student_id):
+    return f'modules:inbox-unread:{student_id}'
+
+
+def forget_unread(*student_ids):
+    """
+    Drop the cached unread counts now, for the rest of this transaction, and
+    again once it commits: a count another request reads before then would
+    otherwise be cached again, stale, for good.
+    """
+    keys = [_unread_key(student_id) for student_id in student_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _insert(entries):
+    StudentNotification.objects.bulk_create(entries, batch_size=DELIVERY_BATCH_SIZE, ignore_conflicts=True)
+
+
+def deliver(notification):
+    """Fan ``notification`` out to the students enrolled in its module; returns their ids."""
+    student_ids = list(
+        ModuleEnrollment.objects.filter(module_id=notification.module_id).values_list('student_id', flat=True)
+    )
+    _insert(
+        StudentNotification(
+            student_id=student_id, notification=notification,
+            module_id=notification.module_id, created_at=notification.created_at,
+        )
+        for student_id in student_ids
+    )
+    forget_unread(*student_ids)
+    return student_ids
+
+
+def deliver_module(module_id, student_ids):
+    """Deliver every notification of a module to newly enrolled students."""
+    notifications = list(
+        ModuleNotification.objects.filter(module_id=module_id).values_list('id', 'created_at')
+    )
+    if notifications:
+        _insert(
+            StudentNotification(
+                student_id=student_id, notification_id=notification_id,
+                module_id=module_id, created_at=created_at,
+            )
+            for student_id in student_ids
+            for notification_id, created_at in notifications
+        )
+        forget_unread(*student_ids)
+
+
+def withdraw_module(module_id, student_ids):
+    """Remove a module's notifications from the inboxes of unenrolled students."""
+    StudentNotification.objects.filter(module_id=module_id, student_id__in=student_ids).delete()
+    forget_unread(*student_ids)
+
+
+def unread_count(student_id):
+    key = _unread_key(student_id)
+    count = cache.get(key)
+    if count is None:
+        count = StudentNotification.objects.filter(
+            student_id=student_id, read_at__isnull=True, module__is_active=True
+        ).count()
+        cache.set(key, count, INBOX_UNREAD_TIMEOUT)
+    return count
+
+
+def mark_read(student_id, notification_ids=None):
+    """Mark some (or, without ids, all) of a student's notifications read."""
+    entries = StudentNotification.objects.filter(student_id=student_id, read_at__isnull=True)
+    if notification_ids is not None:
+        entries = entries.filter(notification_id__in=notification_ids)
+    updated = entries.update(read_at=timezone.now())
+    if updated:
+        forget_unread(student_id)
+    return updated
+
+
+def inbox_page(student_id, cursor=None, page_size=50):
+    """
+    One page of a student's feed, newest first, as ``(rows, next_cursor)``.
+    Notifications of inactive modules are left out, as are comments (the
+    notification detail endpoint has those). Raises InvalidCursor.
+    """
+    entries = StudentNotification.objects.filter(
+        student_id=student_id, module__is_active=True
+    ).values(
+        'id', 'created_at', 'read_at', 'module_id',
+        notification_pk=F('notification_id'),
+        title=F('notification__title'),
+        content=F('notification__content'),
+        created_by_name=F('notification__created_by__username'),
+        module_name=F('module__title'),
+    )
+    rows, next_cursor = paginate_keyset(entries, FEED_ORDERING, cursor=cursor, page_size=page_size)
+    return [
+        {
+            'id': row['notification_pk'],
+            'title': row['title'],
+            'content': row['content'],
+            'created_at': row['created_at'],
+            'created_by_name': row['created_by_name'],
+            'module_id': row['module_id'],
+            'module_name': row['module_name'],
+            'is_read': row['read_at'] is not None,
+            'read_at': row['read_at'],
+        }
+        for row in rows
+    ], next_cursor
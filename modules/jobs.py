@@ -0,0 +1,49 @@
+"""
+The thread pool background work runs on, one per worker process: roster
+jobs (modules.roster) and preview generation (modules.previews).
+
+Work is submitted once the current transaction commits, so it sees what the
+request wrote, and runs on its own database connection, closed after each
+job. The pool lives in the process: work still queued when it exits is
+lost, so jobs must leave their state somewhere every worker can read it and
+be safe to redo (``manage.py generate_previews`` catches up on previews).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# 0 runs jobs on the committing thread (tests, management commands)
+BACKGROUND_WORKERS = getattr(settings, 'BACKGROUND_WORKERS', 2)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='background')
+    return _executor
+
+
+def _run(function, args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('Background job %s%r failed', function.__qualname__, args)
+    finally:
+        connection.close()
+
+
+def submit_on_commit(function, *args):
+    """Run ``function(*args)`` on the pool once the current transaction commits."""
+    if not BACKGROUND_WORKERS:
+        transaction.on_commit(lambda: function(*args))
+        return
+    transaction.on_commit(lambda: _pool().submit(_run, function, args))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.models import ModuleEnrollment
+from modules.inbox import deliver_module
+from modules.models import StudentNotification
+
+
+class Command(BaseCommand):
+    help = 'Delivers existing module notifications to the inboxes of enrolled students'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', type=int, action='append', help='Only this module (repeatable)')
+
+    def handle(self, *args, **options):
+        enrollments = ModuleEnrollment.objects.order_by('module_id')
+        if options['module']:
+            enrollments = enrollments.filter(module_id__in=options['module'])
+
+        students_by_module = {}
+        for module_id, student_id in enrollments.values_list('module_id', 'student_id').iterator():
+            students_by_module.setdefault(module_id, []).append(student_id)
+
+        before = StudentNotification.objects.count()
+        for module_id, student_ids in students_by_module.items():
+            # Already delivered rows are skipped (unique student/notification)
+            with transaction.atomic():
+                deliver_module(module_id, student_ids)
+            self.stdout.write(f'Module {module_id}: {len(student_ids)} students')
+
+        delivered = StudentNotification.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Delivered {delivered} notifications across {len(students_by_module)} modules'
+        ))
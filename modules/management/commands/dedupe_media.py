@@ -0,0 +1,65 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from assignments.models import Assignment, AssignmentSubmission
+from modules.cache import bump_module_versions
+from modules.models import ModuleContent, SectionContent
+from modules.storage import content_storage
+
+FIELDS = [
+    (ModuleContent, 'file', 'module_id'),
+    (SectionContent, 'file', 'section__module_id'),
+    (Assignment, 'file', 'module_id'),
+    (AssignmentSubmission, 'submitted_file', None),
+]
+
+
+class Command(BaseCommand):
+    help = 'Moves files uploaded before content-addressed storage into it, storing each distinct file once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would move')
+
+    def handle(self, *args, **options):
+        storage = content_storage()
+        moved = missing = 0
+        module_ids = set()
+        for model, field, module_path in FIELDS:
+            legacy = (
+                model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                .values_list(field, flat=True).distinct()
+            )
+            for name in list(legacy):
+                if storage.blob_name(name):
+                    continue
+                path = storage.path(name)
+                if not os.path.exists(path):
+                    missing += 1
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(f'{model.__name__}: {name}')
+                    moved += 1
+                    continue
+
+                rows = model.objects.filter(**{field: name})
+                with transaction.atomic():
+                    with open(path, 'rb') as f:
+                        # One reference for the save, one more per extra row
+                        new_name = storage.save(name, File(f, name=os.path.basename(name)))
+                    storage.retain(new_name, rows.count() - 1)
+                    if module_path:
+                        module_ids.update(rows.values_list(module_path, flat=True))
+                    # update(): nothing else about the rows changes
+                    rows.update(**{field: new_name})
+                # The blob is a copy; the old file has no rows left
+                os.remove(path)
+                moved += 1
+
+        # Cached module payloads hold the old file URLs
+        bump_module_versions(*(module_id for module_id in module_ids if module_id is not None))
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Would move" if options["dry_run"] else "Moved"} {moved} files; {missing} missing on disk'
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from modules.models import ModuleContent, SectionContent
+from modules.previews import generate, pending
+
+
+class Command(BaseCommand):
+    help = 'Generates thumbnails, renditions and excerpts of module and section contents that have none'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', type=int, action='append', help='Only this module (repeatable)')
+        parser.add_argument('--all', action='store_true', help='Regenerate every content, including failed ones')
+
+    def handle(self, *args, **options):
+        for model, module_path in ((ModuleContent, 'module_id'), (SectionContent, 'section__module_id')):
+            contents = model.objects.exclude(file='').exclude(file__isnull=True) if options['all'] else pending(model)
+            if options['module']:
+                contents = contents.filter(**{f'{module_path}__in': options['module']})
+            statuses = {}
+            for pk in contents.order_by('pk').values_list('pk', flat=True):
+                previews = generate(model, pk) or {}
+                statuses[previews.get('status')] = statuses.get(previews.get('status'), 0) + 1
+            self.stdout.write(f'{model.__name__}: {statuses.get("ready", 0)} ready, {statuses.get("failed", 0)} failed')
+        self.stdout.write(self.style.SUCCESS('Done'))
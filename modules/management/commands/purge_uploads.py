@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from modules.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Removes expired chunked upload sessions and their partial files'
+
+    def handle(self, *args, **options):
+        purged = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Removed {purged} expired upload sessions'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from modules.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recreates the search documents of every section, section content, lesson, notification and announcement'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} documents'))
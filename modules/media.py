@@ -0,0 +1,258 @@
+"""
+Permission-checked delivery of uploaded files.
+
+``/media/`` used to be Django's ``static()`` view: no authorization, every
+byte copied through a Python worker and no byte ranges. Now:
+
+* Files under ``PROTECTED_PREFIXES`` are only served to the module's
+  instructor and enrolled students (``can_access``); the rest of MEDIA_ROOT
+  (profile pictures) stays public.
+* A request with a valid ``?sig=`` (``signed_url``, HMAC over the path with
+  a timestamp, valid ``MEDIA_SIGNED_URL_MAX_AGE`` seconds) is served without
+  touching the database. An authorized request without one is redirected to
+  a signed URL, so a video player's range requests skip the checks. Preview
+  URLs in API payloads are signed up front: an ``<img>`` can't send the
+  Authorization header.
+* With ``MEDIA_ACCEL`` set the front server sends the file: nginx through
+  ``X-Accel-Redirect`` to an internal location at ``MEDIA_ACCEL_PREFIX``,
+  Apache/lighttpd through ``X-Sendfile``. Otherwise ``file_response`` serves
+  single ``Range`` requests from Python, handing the open file to the WSGI
+  server's ``wsgi.file_wrapper`` (gunicorn uses ``sendfile(2)``).
+* Content-addressed files (see modules.storage) are sent with their hash as
+  ETag and cached as ``immutable``.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from assignments.models import Assignment, AssignmentSubmission
+from . import membership
+from .models import ModuleContent, SectionContent
+from .storage import BLOB_DIR, CONTENT_FOLDERS, content_storage, original_name
+
+PROTECTED_PREFIXES = CONTENT_FOLDERS
+MEDIA_SIGNED_URL_MAX_AGE = getattr(settings, 'MEDIA_SIGNED_URL_MAX_AGE', 10 * 60)  # seconds
+# Signatures are timestamped at the start of a window this long, so a path
+# signed twice in one window gets the same URL and payloads holding signed
+# URLs can be cached for the window (modules.cache). Each URL stays valid
+# for at least MEDIA_SIGNED_URL_MAX_AGE - MEDIA_SIGNED_URL_WINDOW seconds.
+MEDIA_SIGNED_URL_WINDOW = MEDIA_SIGNED_URL_MAX_AGE // 2
+MEDIA_ACCEL = getattr(settings, 'MEDIA_ACCEL', None)  # None, 'x-accel-redirect' or 'x-sendfile'
+MEDIA_ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def signing_window():
+    """The number of the current signing window."""
+    return int(time.time()) // MEDIA_SIGNED_URL_WINDOW
+
+
+class _WindowedSigner(signing.TimestampSigner):
+    def timestamp(self):
+        return signing.b62_encode(signing_window() * MEDIA_SIGNED_URL_WINDOW)
+
+
+_signer = _WindowedSigner(salt='modules.media')
+
+
+def clean_path(path):
+    """
+    ``path`` normalized, or None unless it is a plain relative path: no
+    leading ``/``, no empty, ``.`` or ``..`` segments. The checks below run
+    on the path as given, so it has to name the file ``safe_join`` opens.
+    """
+    if not path or path.startswith('/') or '\\' in path or '\x00' in path:
+        return None
+    if any(segment in ('', '.', '..') for segment in path.split('/')):
+        return None
+    return posixpath.normpath(path)
+
+
+def is_blob(path):
+    """Blobs are only ever served under the content-addressed names of their rows."""
+    return path.startswith(f'{BLOB_DIR}/')
+
+
+def is_protected(path):
+    return path.startswith(PROTECTED_PREFIXES)
+
+
+def signed_url(path):
+    """MEDIA_URL for ``path`` with a short-lived signature."""
+    signature = _signer.sign(path)[len(path) + 1:]
+    return f'{settings.MEDIA_URL}{quote(path)}?sig={signature}'
+
+
+def has_valid_signature(path, signature):
+    try:
+        _signer.unsign(f'{path}:{signature}', max_age=MEDIA_SIGNED_URL_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def can_access(role, profile, path):
+    """
+    Whether the principal may download the file at ``path``; None when no
+    content, assignment or submission has that file. Content-addressed
+    files (see modules.storage) may be shared by many rows; any one the
+    principal may see is enough. A preview (see modules.previews) is
+    allowed with its original.
+    """
+    allowed = _can_access(role, profile, path)
+    if allowed is None and original_name(path):
+        allowed = _can_access(role, profile, original_name(path))
+    return allowed
+
+
+def _can_access(role, profile, path):
+    if path.startswith('module_contents/'):
+        owners = ModuleContent.objects.filter(file=path).values_list('module_id', 'module__instructor_id')
+    elif path.startswith('section_contents/'):
+        owners = SectionContent.objects.filter(file=path).values_list(
+            'section__module_id', 'section__module__instructor_id'
+        )
+    elif path.startswith('assignments/'):
+        assignments = list(Assignment.objects.filter(file=path).values_list('id', 'module_id', 'instructor_id'))
+        if not assignments:
+            return None
+        if role == 'instructor':
+            return any(instructor_id == profile.pk for _, _, instructor_id in assignments)
+        # Standalone assignments reach their students through submissions
+        enrolled = membership.enrolled_module_ids(profile.pk)
+        return any(module_id in enrolled for _, module_id, _ in assignments) or AssignmentSubmission.objects.filter(
+            assignment_id__in=[assignment_id for assignment_id, _, _ in assignments], student=profile
+        ).exists()
+    elif path.startswith('assignment_submissions/'):
+        submissions = list(AssignmentSubmission.objects.filter(submitted_file=path).values_list(
+            'student_id', 'assignment__instructor_id'
+        ))
+        if not submissions:
+            return None
+        return any(
+            profile.pk == (instructor_id if role == 'instructor' else student_id)
+            for student_id, instructor_id in submissions
+        )
+    else:
+        return None
+
+    owners = list(owners)
+    if not owners:
+        return None
+    if role == 'instructor':
+        return any(instructor_id == profile.pk for _, instructor_id in owners)
+    enrolled = membership.enrolled_module_ids(profile.pk)
+    return any(module_id in enrolled for module_id, _ in owners)
+
+
+def _parse_range(header, size):
+    """``(start, end)`` inclusive for a single byte range, 'unsatisfiable', or None to send everything."""
+    match = _range_re.match(header.replace(' ', ''))
+    if not match or match.group(1) == match.group(2) == '':
+        # Malformed or multipart ranges may be ignored (RFC 9110 14.2)
+        return None
+    first, last = match.groups()
+    if first == '':
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+
+class RangeFile:
+    """
+    At most ``length`` bytes of an open file from its current offset. Keeps
+    ``fileno()`` so ``wsgi.file_wrapper`` can still sendfile(2) it, bounded
+    by the Content-Length.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def file_response(request, path):
+    """Serve ``path`` from the media storage, through the front server when configured."""
+    # Content-addressed names resolve to their blob (see modules.storage)
+    stored_path = content_storage().stored_name(path)
+    full_path = safe_join(settings.MEDIA_ROOT, stored_path)
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+    last_modified = http_date(stat.st_mtime)
+    # A content-addressed name is the content's SHA-256 (and a derivative's
+    # name that and the variant)
+    etag = f'"{posixpath.splitext(posixpath.basename(path))[0]}"' if stored_path != path else None
+
+    if MEDIA_ACCEL == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(posixpath.join(MEDIA_ACCEL_PREFIX, stored_path))
+    elif MEDIA_ACCEL == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        if etag and request.META.get('HTTP_IF_NONE_MATCH') == etag or not was_modified_since(
+            request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime
+        ):
+            return HttpResponseNotModified()
+        byte_range = None
+        if 'HTTP_RANGE' in request.META and request.META.get('HTTP_IF_RANGE', last_modified) in (last_modified, etag):
+            byte_range = _parse_range(request.META['HTTP_RANGE'], stat.st_size)
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+        file = open(full_path, 'rb')
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+            response['Content-Length'] = stat.st_size
+        else:
+            start, end = byte_range
+            file.seek(start)
+            response = FileResponse(RangeFile(file, end - start + 1), status=206, content_type=content_type)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Accept-Ranges'] = 'bytes'
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['Last-Modified'] = last_modified
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+def is_immutable(path):
+    """Content-addressed files (and their derivatives) never change under their name."""
+    return content_storage().stored_name(path) != path
@@ -0,0 +1,67 @@
+"""
+Cached enrollment membership: which active modules a student is in.
+
+Module-scoped student endpoints authorize with ``is_enrolled`` instead of a
+``module.students.filter(...).exists()`` query per request. Each student's
+set of module ids is cached under a per-student version that
+modules.signals bumps on every enrollment change (ModuleEnrollment rows,
+``module.students.add/remove/set/clear``) and when a module is saved, since
+deactivating a module removes it from everyone's set.
+
+Writes that bypass signals (``bulk_create`` of enrollments, ``update()`` of
+``is_active``) must call ``invalidate`` themselves.
+
+A per-process cache never sees the bumps other workers make, so without a
+shared cache the sets only live ``MEMBERSHIP_LOCAL_CACHE_TIMEOUT`` seconds.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from courses.models import ModuleEnrollment
+from lms_backend.caching import cache_is_shared
+
+MEMBERSHIP_CACHE_TIMEOUT = getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', 600)
+MEMBERSHIP_LOCAL_CACHE_TIMEOUT = getattr(settings, 'MEMBERSHIP_LOCAL_CACHE_TIMEOUT', 5)
+
+
+def _version_key(student_id):
+    return f'modules:membership-version:{student_id}'
+
+
+def _cache_timeout():
+    return MEMBERSHIP_CACHE_TIMEOUT if cache_is_shared() else MEMBERSHIP_LOCAL_CACHE_TIMEOUT
+
+
+def enrolled_module_ids(student_id):
+    """frozenset of the ids of the active modules the student is enrolled in."""
+    version_key = _version_key(student_id)
+    version = cache.get(version_key)
+    if version is None:
+        # Fresh, never reused values; see accounts.authentication.principal_version
+        cache.add(version_key, time.time_ns(), None)
+        version = cache.get(version_key)
+    key = f'modules:membership:{student_id}:{version}'
+    module_ids = cache.get(key)
+    if module_ids is None:
+        module_ids = frozenset(
+            ModuleEnrollment.objects.filter(student_id=student_id, module__is_active=True)
+            .values_list('module_id', flat=True)
+        )
+        cache.set(key, module_ids, _cache_timeout())
+    return module_ids
+
+
+def is_enrolled(student_id, module_id):
+    return module_id in enrolled_module_ids(student_id)
+
+
+def invalidate(*student_ids):
+    now = time.time_ns()
+    cache.set_many({_version_key(student_id): now for student_id in student_ids if student_id is not None}, None)
+
+
+def invalidate_module(module_id):
+    """Invalidate every student enrolled in the module."""
+    invalidate(*ModuleEnrollment.objects.filter(module_id=module_id).values_list('student_id', flat=True))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 19:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_student_search_trigram_indexes'),
+        ('courses', '0001_initial'),
+        ('modules', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.module')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='modules.modulenotification')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox', to='accounts.student')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['student', '-created_at', '-id'], name='modules_inbox_feed_idx'), models.Index(condition=models.Q(('read_at__isnull', True)), fields=['student'], name='modules_inbox_unread_idx')],
+                'unique_together': {('student', 'notification')},
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations, models
+
+
+def backfill_completion(apps, schema_editor):
+    """Number each module's contents, then fold StudentModuleProgress into the bitsets."""
+    ModuleContent = apps.get_model('modules', 'ModuleContent')
+    StudentModuleProgress = apps.get_model('modules', 'StudentModuleProgress')
+    ModuleEnrollment = apps.get_model('courses', 'ModuleEnrollment')
+
+    positions = {}
+    contents = []
+    for content in ModuleContent.objects.order_by('module_id', 'uploaded_at', 'id').only('id', 'module_id'):
+        content.position = positions[content.module_id] = positions.get(content.module_id, -1) + 1
+        contents.append(content)
+    ModuleContent.objects.bulk_update(contents, ['position'], batch_size=1000)
+    position_of = {content.id: content.position for content in contents}
+
+    # (student, module) -> (set positions, last accessed)
+    progress = {}
+    rows = StudentModuleProgress.objects.values_list('student_id', 'module_id', 'content_id', 'completed', 'last_accessed')
+    for student_id, module_id, content_id, completed, last_accessed in rows.iterator():
+        bits, seen = progress.get((student_id, module_id), (0, None))
+        if completed and content_id in position_of:
+            bits |= 1 << position_of[content_id]
+        progress[student_id, module_id] = (bits, max(filter(None, (seen, last_accessed)), default=None))
+
+    enrollments = []
+    for enrollment in ModuleEnrollment.objects.only('id', 'student_id', 'module_id').iterator():
+        if (enrollment.student_id, enrollment.module_id) not in progress:
+            continue
+        bits, enrollment.last_accessed = progress[enrollment.student_id, enrollment.module_id]
+        enrollment.completion_bits = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+        enrollment.completed_contents = bits.bit_count()
+        enrollments.append(enrollment)
+    ModuleEnrollment.objects.bulk_update(
+        enrollments, ['completion_bits', 'completed_contents', 'last_accessed'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_enrollment_completion_bits'),
+        ('modules', '0002_student_notification_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modulecontent',
+            name='position',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_completion, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='modulecontent',
+            unique_together={('module', 'position')},
+        ),
+    ]
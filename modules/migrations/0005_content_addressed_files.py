@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 19:45
+
+import modules.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modules', '0004_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='modulecontent',
+            name='file',
+            field=models.FileField(storage=modules.storage.content_storage, upload_to='module_contents/'),
+        ),
+        migrations.AlterField(
+            model_name='sectioncontent',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=modules.storage.content_storage, upload_to='section_contents/'),
+        ),
+    ]
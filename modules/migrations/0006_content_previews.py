@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modules', '0005_content_addressed_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modulecontent',
+            name='previews',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='sectioncontent',
+            name='previews',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
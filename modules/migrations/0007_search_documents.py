@@ -0,0 +1,111 @@
+# Generated by Django 5.2 on 2026-10-18 19:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# PostgreSQL: a generated tsvector column (titles weigh more) under a GIN index
+POSTGRES_INDEX = [
+    """
+    ALTER TABLE modules_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(body, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX modules_searchdocument_vector_gin ON modules_searchdocument USING gin (search_vector)',
+]
+
+# SQLite: an external-content FTS5 table, kept in step by triggers. A later
+# migration that makes SQLite rebuild modules_searchdocument drops the
+# triggers and has to create them again.
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE modules_searchdocument_fts USING fts5(
+        title, body, content='modules_searchdocument', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER modules_searchdocument_fts_insert AFTER INSERT ON modules_searchdocument BEGIN
+        INSERT INTO modules_searchdocument_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER modules_searchdocument_fts_delete AFTER DELETE ON modules_searchdocument BEGIN
+        INSERT INTO modules_searchdocument_fts (modules_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER modules_searchdocument_fts_update AFTER UPDATE ON modules_searchdocument BEGIN
+        INSERT INTO modules_searchdocument_fts (modules_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO modules_searchdocument_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+
+
+def create_search_index(apps, schema_editor):
+    statements = {'postgresql': POSTGRES_INDEX, 'sqlite': SQLITE_INDEX}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # Dropping the column drops its index
+        schema_editor.execute('ALTER TABLE modules_searchdocument DROP COLUMN IF EXISTS search_vector')
+    elif schema_editor.connection.vendor == 'sqlite':
+        for action in ('insert', 'delete', 'update'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS modules_searchdocument_fts_{action}')
+        schema_editor.execute('DROP TABLE IF EXISTS modules_searchdocument_fts')
+
+
+def index_existing(apps, schema_editor):
+    """One document per existing section, section content, lesson, notification and announcement."""
+    SearchDocument = apps.get_model('modules', 'SearchDocument')
+    sources = [
+        ('section_content', apps.get_model('modules', 'SectionContent'), 'section__module_id', None, 'text_content'),
+        ('section', apps.get_model('modules', 'ModuleSection'), 'module_id', None, 'description'),
+        ('lesson', apps.get_model('courses', 'Lesson'), 'module_id', None, 'content'),
+        ('notification', apps.get_model('modules', 'ModuleNotification'), 'module_id', None, 'content'),
+        ('announcement', apps.get_model('courses', 'Announcement'), None, 'course_id', 'content'),
+    ]
+    for kind, model, module_path, course_path, body in sources:
+        fields = ['id', 'title', body] + [path for path in (module_path, course_path) if path]
+        documents = (
+            SearchDocument(
+                kind=kind, object_id=row['id'], title=row['title'], body=row[body],
+                module_id=row.get(module_path), course_id=row.get(course_path),
+            )
+            for row in model.objects.values(*fields).iterator()
+        )
+        SearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_enrollment_completion_bits'),
+        ('modules', '0006_content_previews'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('section_content', 'Section content'), ('section', 'Section'), ('lesson', 'Lesson'), ('notification', 'Notification'), ('announcement', 'Announcement')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(blank=True, max_length=200)),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+                ('module', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.module')),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
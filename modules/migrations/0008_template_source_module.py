@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 19:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_enrollment_completion_bits'),
+        ('modules', '0007_search_documents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moduletemplate',
+            name='source_module',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='templates', to='courses.module'),
+        ),
+    ]
@@ -1,12 +1,19 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.conf import settings
 from accounts.models import Instructor, Student
-from courses.models import Module
+from courses.models import Course, Module
+from .storage import content_storage
 
 class ModuleTemplate(models.Model):
     name = models.CharField(max_length=200)
     code = models.CharField(max_length=20, unique=True)
     description = models.TextField(blank=True)
+    # Whose sections, contents, tests and quizzes new modules start with (see modules.cloning)
+    source_module = models.ForeignKey(
+        Module, on_delete=models.SET_NULL, null=True, blank=True, related_name='templates'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
@@ -22,16 +29,31 @@ class ModuleTemplate(models.Model):
 class ModuleContent(models.Model):
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='contents')
     title = models.CharField(max_length=200)
-    file = models.FileField(upload_to='module_contents/')
+    file = models.FileField(upload_to='module_contents/', storage=content_storage)
     file_type = models.CharField(max_length=50)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Bit index in ModuleEnrollment.completion_bits (see modules.completion);
+    # bulk inserts must assign it themselves
+    position = models.PositiveIntegerField(editable=False)
+    # Thumbnail, renditions and excerpt of the file (see modules.previews)
+    previews = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.title} - {self.module.title}"
 
+    def save(self, *args, **kwargs):
+        if self.position is None:
+            from .completion import next_position
+
+            with transaction.atomic():
+                self.position = next_position(self.module_id)
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-uploaded_at']
+        unique_together = ['module', 'position']
 
 class ModuleNotification(models.Model):
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='notifications')
@@ -60,7 +82,33 @@ class NotificationComment(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+class StudentNotification(models.Model):
+    """
+    A notification in a student's inbox, written when the notification is
+    posted (see modules.inbox). ``module`` and ``created_at`` are copied from
+    the notification so the feed is one indexed range scan.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='inbox')
+    notification = models.ForeignKey(ModuleNotification, on_delete=models.CASCADE, related_name='deliveries')
+    module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['student', 'notification']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['student', '-created_at', '-id'], name='modules_inbox_feed_idx'),
+            models.Index(
+                fields=['student'], condition=models.Q(read_at__isnull=True), name='modules_inbox_unread_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.student.user.username} - {self.notification.title}"
+
 class StudentModuleProgress(models.Model):
+    # Superseded by ModuleEnrollment.completion_bits; kept for the history it holds
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='module_progress')
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='student_progress')
     content = models.ForeignKey(ModuleContent, on_delete=models.CASCADE, related_name='student_progress')
@@ -199,15 +247,97 @@ class ModuleSection(models.Model):
 class SectionContent(models.Model):
     section = models.ForeignKey(ModuleSection, on_delete=models.CASCADE, related_name='contents')
     title = models.CharField(max_length=200)
-    file = models.FileField(upload_to='section_contents/', blank=True, null=True)
+    file = models.FileField(upload_to='section_contents/', storage=content_storage, blank=True, null=True)
     file_type = models.CharField(max_length=50, blank=True)
     text_content = models.TextField(blank=True)
     order = models.PositiveIntegerField(default=0)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Thumbnail, renditions and excerpt of the file (see modules.previews)
+    previews = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         ordering = ['order']
 
     def __str__(self):
         return f"{self.section.title} - {self.title}"
+
+class UploadSession(models.Model):
+    """
+    A resumable chunked upload (see modules.uploads). Chunks are written at
+    their offsets into one partial file on disk; finalizing attaches it to a
+    new ModuleContent, or SectionContent when ``section`` is set.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='+')
+    section = models.ForeignKey(ModuleSection, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    title = models.CharField(max_length=200)
+    file_name = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=50, blank=True)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    # Expected SHA-256 of the whole file, checked at finalize when given
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def __str__(self):
+        return f"{self.owner.username} - {self.file_name}"
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ['session', 'index']
+        ordering = ['index']
+
+class StoredBlob(models.Model):
+    """
+    One file of the content-addressed storage (see modules.storage) and how
+    many FileField values reference it; the file goes when ``refs`` hits 0.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+class SearchDocument(models.Model):
+    """
+    The searchable text of one row (see modules.search), kept in step with
+    it by modules.signals. The full-text index itself is not a field: the
+    migration adds a tsvector column and GIN index on PostgreSQL, an FTS5
+    table on SQLite.
+    """
+    KINDS = (
+        ('section_content', 'Section content'),
+        ('section', 'Section'),
+        ('lesson', 'Lesson'),
+        ('notification', 'Notification'),
+        ('announcement', 'Announcement'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.PositiveBigIntegerField()
+    # Exactly one is set: what enrollment scopes the document by
+    module = models.ForeignKey(Module, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    title = models.CharField(max_length=200, blank=True)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['kind', 'object_id']
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} - {self.title}"
@@ -0,0 +1,180 @@
+"""
+Previews of course materials, generated off the request path.
+
+When a ModuleContent or SectionContent gets a new file (see
+modules.signals), its ``previews`` become ``{'status': 'pending'}`` and a
+job is queued on the background pool (modules.jobs) once the transaction
+commits. The job
+writes derivatives beside the original (``modules.storage.derivative_name``)
+and records them:
+
+* images: a ``thumb`` thumbnail and ``renditions`` resized to each of
+  ``PREVIEW_WIDTHS`` (never upscaled), as JPEG, with Pillow;
+* PDFs: the first page rasterized (``page``) plus the same thumbnail and
+  renditions, and a text ``excerpt`` of the first pages. Both use poppler's
+  ``pdftoppm``/``pdftotext`` and are skipped when it isn't installed;
+* text files: an ``excerpt``.
+
+``status`` ends up ``ready`` or ``failed``. Files shared through the
+content-addressed storage are processed once: a file that already has
+previews lends them to every row holding it. ``manage.py generate_previews``
+fills in rows from before.
+"""
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from . import jobs
+from .cache import bump_module_versions
+from .models import ModuleContent, SectionContent
+from .storage import content_storage, derivative_name
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_WIDTHS = getattr(settings, 'PREVIEW_WIDTHS', (320, 640, 1280))
+PREVIEW_THUMBNAIL_SIZE = getattr(settings, 'PREVIEW_THUMBNAIL_SIZE', (160, 160))
+PREVIEW_QUALITY = 80
+PREVIEW_EXCERPT_LENGTH = 500  # characters
+PREVIEW_PDF_DPI = 110
+PREVIEW_COMMAND_TIMEOUT = 60  # seconds
+
+TEXT_EXTENSIONS = {'.txt', '.md', '.csv', '.json', '.xml', '.html', '.py', '.java', '.c', '.cpp', '.js', '.sql'}
+
+
+def _module_id(instance):
+    if isinstance(instance, SectionContent):
+        return instance.section.module_id
+    return instance.module_id
+
+
+def schedule(model, pk):
+    """Generate previews for a row once the current transaction commits."""
+    jobs.submit_on_commit(generate, model, pk)
+
+
+def generate(model, pk):
+    """Build and store the previews of one row; returns them (None when the row or file is gone)."""
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not instance.file:
+        return None
+    name = instance.file.name
+    previews = (
+        model.objects.filter(file=name, previews__status='ready').exclude(pk=pk)
+        .values_list('previews', flat=True).first()
+    )
+    if previews is None:
+        previews = build(name)
+    # Only if the file is still the one previewed
+    if model.objects.filter(pk=pk, file=name).update(previews=previews):
+        # update(): cached module payloads carry the preview URLs
+        bump_module_versions(_module_id(instance))
+    return previews
+
+
+def build(name):
+    """The previews of the stored file ``name``, writing its derivatives."""
+    storage = content_storage()
+    path = storage.path(name)
+    if not os.path.exists(path):
+        return {'status': 'failed'}
+    ext = os.path.splitext(name)[1].lower()
+    mimetype = mimetypes.guess_type(name)[0] or ''
+    previews = {'status': 'ready'}
+    try:
+        if mimetype.startswith('image/'):
+            previews.update(_image_previews(name, path))
+        elif ext == '.pdf':
+            previews.update(_pdf_previews(name, path))
+        elif mimetype.startswith('text/') or ext in TEXT_EXTENSIONS:
+            with open(path, 'rb') as f:
+                previews['excerpt'] = excerpt(f.read(PREVIEW_EXCERPT_LENGTH * 8).decode('utf-8', 'replace'))
+    except Exception:
+        logger.exception('Could not generate previews of %s', name)
+        return {'status': 'failed'}
+    return previews
+
+
+def _image_previews(name, path):
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            # JPEG has no alpha: flatten onto white
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, 'white')
+            image.paste(rgba, mask=rgba.getchannel('A'))
+
+        thumbnail = image.copy()
+        thumbnail.thumbnail(PREVIEW_THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        previews = {'thumbnail': _save_image(thumbnail, derivative_name(name, 'thumb')), 'renditions': {}}
+        widths = [width for width in PREVIEW_WIDTHS if width < image.width] or [image.width]
+        for width in widths:
+            rendition = image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+            previews['renditions'][str(width)] = _save_image(rendition, derivative_name(name, f'w{width}'))
+    return previews
+
+
+def _save_image(image, name):
+    path = content_storage().path(name)
+    # Written aside and renamed: a half-written preview is never served
+    partial = f'{path}.partial'
+    image.save(partial, 'JPEG', quality=PREVIEW_QUALITY, optimize=True, progressive=True)
+    os.replace(partial, path)
+    return name
+
+
+def _pdf_previews(name, path):
+    previews = {}
+    if shutil.which('pdftoppm'):
+        with tempfile.TemporaryDirectory() as directory:
+            subprocess.run(
+                ['pdftoppm', '-f', '1', '-l', '1', '-r', str(PREVIEW_PDF_DPI), '-png', '-singlefile',
+                 path, os.path.join(directory, 'page')],
+                check=True, capture_output=True, timeout=PREVIEW_COMMAND_TIMEOUT,
+            )
+            page = os.path.join(directory, 'page.png')
+            previews.update(_image_previews(name, page))
+            with Image.open(page) as image:
+                previews['page'] = _save_image(image.convert('RGB'), derivative_name(name, 'page'))
+    if shutil.which('pdftotext'):
+        text = subprocess.run(
+            ['pdftotext', '-f', '1', '-l', '3', '-enc', 'UTF-8', path, '-'],
+            check=True, capture_output=True, timeout=PREVIEW_COMMAND_TIMEOUT,
+        ).stdout
+        previews['excerpt'] = excerpt(text.decode('utf-8', 'replace'))
+    return previews
+
+
+def excerpt(text, length=PREVIEW_EXCERPT_LENGTH):
+    """The start of ``text`` with whitespace collapsed, cut at a word."""
+    text = re.sub(r'\s+', ' ', text).strip()
+    if len(text) <= length:
+        return text
+    return text[:length].rsplit(' ', 1)[0] + '…'
+
+
+def preview_urls(previews, build_url):
+    """``previews`` with each derivative name turned into a URL by ``build_url``."""
+    urls = {'status': previews.get('status')}
+    if previews.get('thumbnail'):
+        urls['thumbnail'] = build_url(previews['thumbnail'])
+    if previews.get('page'):
+        urls['page'] = build_url(previews['page'])
+    if previews.get('renditions'):
+        urls['renditions'] = {width: build_url(name) for width, name in previews['renditions'].items()}
+    if previews.get('excerpt'):
+        urls['excerpt'] = previews['excerpt']
+    return urls
+
+
+def pending(model, queryset=None):
+    """Rows with a file whose previews were never generated."""
+    queryset = model.objects.all() if queryset is None else queryset
+    return queryset.exclude(file='').exclude(file__isnull=True).filter(previews={})
+
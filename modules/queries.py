@@ -0,0 +1,190 @@
+"""
+Querysets that load everything a serializer in modules.serializers touches.
+
+The serializers only walk relations (``obj.contents.all()``,
+``comment.user.username``...); with these querysets every one of those walks
+is answered from the select_related/prefetch caches, so serializing a page of
+modules costs a fixed number of queries however many modules, sections or
+comments it contains.
+"""
+from django.db.models import (
+    Count, DateTimeField, IntegerField, Max, OuterRef, Prefetch, Subquery, Sum,
+)
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import ValidationError
+
+from accounts.models import Student
+from courses.models import ModuleEnrollment
+from .models import (
+    ModuleContent, ModuleNotification, NotificationComment, ModuleTest,
+    ModuleSection, SectionContent,
+)
+
+
+def notification_queryset():
+    """Notifications ready for ModuleNotificationSerializer."""
+    return (
+        ModuleNotification.objects
+        .select_related('created_by', 'module')
+        .prefetch_related(
+            Prefetch('comments', queryset=NotificationComment.objects.select_related('user')),
+        )
+    )
+
+
+def section_queryset():
+    """Sections ready for ModuleSectionSerializer."""
+    return ModuleSection.objects.prefetch_related(
+        Prefetch('contents', queryset=SectionContent.objects.select_related('uploaded_by')),
+    )
+
+
+# Relations of ModuleSerializer that ``?expand=`` can switch on, and the
+# nested parts that hang off them.
+MODULE_EXPANSIONS = {
+    'contents', 'notifications', 'notifications.comments', 'tests', 'students',
+    'sections', 'sections.contents', 'sections.contents.text_content',
+}
+MODULE_FIELDS = {
+    'id', 'code', 'title', 'description', 'duration', 'credits', 'instructor',
+    'instructor_name', 'created_at', 'updated_at', 'is_active',
+}
+
+
+class ModuleFieldset:
+    """
+    The parts of a module a request asked for with ``?fields=`` (top-level
+    scalar fields; all of them when omitted) and ``?expand=`` (relations,
+    dotted for nested ones, e.g. ``sections.contents``). Expanding a nested
+    relation implies its parents.
+    """
+
+    def __init__(self, fields=None, expand=()):
+        self.fields = fields
+        self.expand = set()
+        for token in expand:
+            parts = token.split('.')
+            self.expand.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+
+    @classmethod
+    def from_request(cls, request):
+        """None when the request uses neither parameter (full legacy payload)."""
+        params = request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None
+
+        def split(name):
+            return [token.strip() for token in params.get(name, '').split(',') if token.strip()]
+
+        fields, expand = split('fields'), split('expand')
+        # A relation named in ?fields= is the same as expanding it
+        expand += [field for field in fields if field in MODULE_EXPANSIONS]
+        fields = [field for field in fields if field not in MODULE_EXPANSIONS]
+        errors = {}
+        unknown = [field for field in fields if field not in MODULE_FIELDS]
+        if unknown:
+            errors['fields'] = f"Unknown fields: {', '.join(unknown)}"
+        unknown = [token for token in expand if token not in MODULE_EXPANSIONS]
+        if unknown:
+            errors['expand'] = f"Unknown expansions: {', '.join(unknown)}"
+        if errors:
+            raise ValidationError(errors)
+        return cls(set(fields) if 'fields' in params else None, expand)
+
+    def wants_field(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, token):
+        return token in self.expand
+
+
+def with_module_relations(queryset, fieldset=None):
+    """
+    Prefetch everything ModuleSerializer renders for each module in
+    ``queryset``; with a ``fieldset``, only what it asks for.
+    """
+    if fieldset is None:
+        return queryset.select_related('instructor__user').prefetch_related(
+            Prefetch('contents', queryset=ModuleContent.objects.all()),
+            # The reverse-FK prefetch sets notification.module itself, so no join here
+            Prefetch(
+                'notifications',
+                queryset=ModuleNotification.objects.select_related('created_by').prefetch_related(
+                    Prefetch('comments', queryset=NotificationComment.objects.select_related('user')),
+                ),
+            ),
+            Prefetch('tests', queryset=ModuleTest.objects.all()),
+            Prefetch('sections', queryset=section_queryset()),
+            # Only the primary keys are rendered
+            Prefetch('students', queryset=Student.objects.only('id')),
+        )
+
+    columns = {'id'} | {
+        field for field in MODULE_FIELDS
+        if fieldset.wants_field(field) and field != 'instructor_name'
+    }
+    if fieldset.wants_field('instructor_name'):
+        columns.add('instructor')
+        queryset = queryset.select_related('instructor__user')
+    queryset = queryset.only(*columns)
+
+    lookups = []
+    if fieldset.expands('contents'):
+        lookups.append(Prefetch('contents', queryset=ModuleContent.objects.all()))
+    if fieldset.expands('notifications'):
+        notifications = ModuleNotification.objects.select_related('created_by')
+        if fieldset.expands('notifications.comments'):
+            notifications = notifications.prefetch_related(
+                Prefetch('comments', queryset=NotificationComment.objects.select_related('user')),
+            )
+        lookups.append(Prefetch('notifications', queryset=notifications))
+    if fieldset.expands('tests'):
+        lookups.append(Prefetch('tests', queryset=ModuleTest.objects.all()))
+    if fieldset.expands('sections'):
+        sections = ModuleSection.objects.all()
+        if fieldset.expands('sections.contents'):
+            contents = SectionContent.objects.select_related('uploaded_by')
+            if not fieldset.expands('sections.contents.text_content'):
+                contents = contents.defer('text_content')
+            sections = sections.prefetch_related(Prefetch('contents', queryset=contents))
+        lookups.append(Prefetch('sections', queryset=sections))
+    if fieldset.expands('students'):
+        lookups.append(Prefetch('students', queryset=Student.objects.only('id')))
+    return queryset.prefetch_related(*lookups)
+
+
+def _per_module(queryset, aggregate, output_field=IntegerField()):
+    """Correlated subquery: ``aggregate`` over the rows of ``queryset`` for each module."""
+    return Subquery(
+        queryset.filter(module=OuterRef('pk')).order_by().values('module')
+        .annotate(value=aggregate).values('value'),
+        output_field=output_field,
+    )
+
+
+def with_progress(queryset, student):
+    """
+    Annotate modules with ``student``'s progress and the cohort's, all in
+    the one query (completion counts are the popcounts cached on
+    ModuleEnrollment, see modules.completion):
+
+    ``total_contents``, ``completed_contents`` and ``last_accessed`` (the
+    student's), ``enrolled_students`` and ``cohort_completed`` (completed
+    contents summed over every student).
+
+    Subqueries rather than joins: ``queryset`` is usually already filtered
+    through the enrollments, and joining them again would be reused.
+    """
+    enrollments = ModuleEnrollment.objects.all()
+    mine = enrollments.filter(student=student)
+    return queryset.annotate(
+        total_contents=Coalesce(_per_module(ModuleContent.objects.all(), Count('pk')), 0),
+        enrolled_students=Coalesce(_per_module(enrollments, Count('pk')), 0),
+        cohort_completed=Coalesce(_per_module(enrollments, Sum('completed_contents')), 0),
+        completed_contents=Coalesce(_per_module(mine, Max('completed_contents')), 0),
+        last_accessed=_per_module(mine, Max('last_accessed'), DateTimeField()),
+    )
+
+
+def percentage(part, whole):
+    return round(part / whole * 100, 2) if whole else 0
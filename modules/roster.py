@@ -0,0 +1,200 @@
+"""
+Bulk module rosters.
+
+Enrollments are written with chunked ``bulk_create(ignore_conflicts=True)``
+and removed with one ``DELETE ... WHERE`` instead of going through
+``module.students.add/remove/set``, which load every Student and send
+per-row signals. Because no signals fire, the side effects those signals
+would have had (module payload versions, membership, inboxes) are applied
+here explicitly.
+
+Very large changes (``ROSTER_ASYNC_THRESHOLD`` module x student pairs) run
+as background jobs (see modules.jobs); their progress lives in the cache
+under the job id. That takes a cache every worker shares, since the polls
+may land on any of them: without one, changes always run in the request.
+"""
+import csv
+import io
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import Student
+from courses.models import ModuleEnrollment
+from lms_backend.caching import cache_is_shared
+from . import inbox, jobs, membership
+from .cache import bump_module_versions
+
+logger = logging.getLogger(__name__)
+
+ROSTER_CHUNK_SIZE = getattr(settings, 'ROSTER_CHUNK_SIZE', 1000)
+ROSTER_ASYNC_THRESHOLD = getattr(settings, 'ROSTER_ASYNC_THRESHOLD', 5000)
+ROSTER_JOB_TIMEOUT = 24 * 60 * 60
+
+
+def parse_student_numbers(content):
+    """Student numbers from the ``student_id`` column of a CSV. Raises ValueError."""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    reader = csv.DictReader(io.StringIO(content))
+    columns = {str(name).strip().lower(): name for name in reader.fieldnames or () if name is not None}
+    if 'student_id' not in columns:
+        raise ValueError('CSV roster needs a student_id column')
+    return [
+        row[columns['student_id']].strip() for row in reader
+        if row.get(columns['student_id']) and row[columns['student_id']].strip()
+    ]
+
+
+def select_students(ids=(), student_numbers=(), batch=None, program=None):
+    """
+    Primary keys of the students matching any selector: primary ``ids``,
+    ``student_numbers`` (Student.student_id), or every active student of a
+    ``batch``/``program`` (both must match when both are given). One query.
+    """
+    condition = Q()
+    if ids:
+        condition |= Q(pk__in=ids)
+    if student_numbers:
+        condition |= Q(student_id__in=student_numbers)
+    if batch or program:
+        cohort = Q(is_active=True)
+        if batch:
+            cohort &= Q(batch=batch)
+        if program:
+            cohort &= Q(program=program)
+        condition |= cohort
+    if not condition:
+        return []
+    return list(Student.objects.filter(condition).order_by('pk').values_list('pk', flat=True))
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def enroll(module_ids, student_ids, progress=None):
+    """Enroll every student in every module; returns how many enrollments were new."""
+    created = 0
+    for module_id in module_ids:
+        for chunk in _chunks(student_ids, ROSTER_CHUNK_SIZE):
+            with transaction.atomic():
+                existing = set(
+                    ModuleEnrollment.objects.filter(module_id=module_id, student_id__in=chunk)
+                    .values_list('student_id', flat=True)
+                )
+                new = [student_id for student_id in chunk if student_id not in existing]
+                # ignore_conflicts: a concurrent enrollment of the same pair is fine
+                ModuleEnrollment.objects.bulk_create(
+                    [ModuleEnrollment(module_id=module_id, student_id=student_id) for student_id in new],
+                    ignore_conflicts=True,
+                )
+                inbox.deliver_module(module_id, new)
+            membership.invalidate(*new)
+            created += len(new)
+            if progress:
+                progress(processed=len(chunk), enrolled=len(new))
+        bump_module_versions(module_id)
+    return created
+
+
+def unenroll(module_ids, student_ids=None, progress=None):
+    """
+    Remove the students (all of them when ``student_ids`` is None) from the
+    modules with a single DELETE; returns how many enrollments went.
+    """
+    enrollments = ModuleEnrollment.objects.filter(module_id__in=module_ids)
+    if student_ids is not None:
+        enrollments = enrollments.filter(student_id__in=student_ids)
+    with transaction.atomic():
+        pairs = list(enrollments.values_list('module_id', 'student_id'))
+        # One DELETE ... WHERE; nothing references enrollments, and the
+        # side effects of the skipped post_delete signals follow
+        enrollments._raw_delete(enrollments.db)
+        by_module = {}
+        for module_id, student_id in pairs:
+            by_module.setdefault(module_id, []).append(student_id)
+        for module_id, removed in by_module.items():
+            inbox.withdraw_module(module_id, removed)
+    membership.invalidate(*{student_id for _, student_id in pairs})
+    bump_module_versions(*module_ids)
+    if progress:
+        progress(processed=len(pairs), removed=len(pairs))
+    return len(pairs)
+
+
+def set_roster(module_id, student_ids):
+    """Make ``student_ids`` the module's exact roster, diffing in the database."""
+    wanted = set(student_ids)
+    current = set(ModuleEnrollment.objects.filter(module_id=module_id).values_list('student_id', flat=True))
+    if current - wanted:
+        unenroll([module_id], sorted(current - wanted))
+    if wanted - current:
+        enroll([module_id], sorted(wanted - current))
+
+
+def apply(operation, module_ids, student_ids, progress=None):
+    """``operation`` is 'add' or 'remove'; returns ``{'enrolled': n, 'removed': n}``."""
+    if operation == 'add':
+        return {'enrolled': enroll(module_ids, student_ids, progress), 'removed': 0}
+    return {'enrolled': 0, 'removed': unenroll(module_ids, student_ids, progress)}
+
+
+# Background jobs
+
+def jobs_available():
+    """Whether a job's state would be visible to every worker polling it."""
+    return cache_is_shared()
+
+
+def _job_key(job_id):
+    return f'modules:roster-job:{job_id}'
+
+
+def job_status(job_id):
+    return cache.get(_job_key(job_id))
+
+
+def start_job(operation, module_ids, student_ids, owner_id=None):
+    """Queue a roster change once the current transaction commits; returns the job state."""
+    state = {
+        'id': uuid.uuid4().hex,
+        'owner': owner_id,
+        'status': 'queued',
+        'action': operation,
+        'total': len(module_ids) * len(student_ids),
+        'processed': 0,
+        'enrolled': 0,
+        'removed': 0,
+        'error': None,
+    }
+    cache.set(_job_key(state['id']), state, ROSTER_JOB_TIMEOUT)
+    jobs.submit_on_commit(_run_job, dict(state), module_ids, student_ids)
+    return state
+
+
+def _run_job(state, module_ids, student_ids):
+    key = _job_key(state['id'])
+
+    def progress(processed=0, enrolled=0, removed=0):
+        state['processed'] += processed
+        state['enrolled'] += enrolled
+        state['removed'] += removed
+        cache.set(key, state, ROSTER_JOB_TIMEOUT)
+
+    try:
+        state['status'] = 'running'
+        cache.set(key, state, ROSTER_JOB_TIMEOUT)
+        apply(state['action'], module_ids, student_ids, progress)
+        state['status'] = 'done'
+    except Exception as e:
+        logger.exception('Roster job %s failed', state['id'])
+        state['status'] = 'failed'
+        state['error'] = str(e)
+    finally:
+        cache.set(key, state, ROSTER_JOB_TIMEOUT)
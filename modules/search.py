@@ -0,0 +1,233 @@
+"""
+Full-text search over course material: section contents (title and text),
+section descriptions, lessons, module notifications and course announcements.
+
+Each searchable row has a SearchDocument (title and body copied by
+modules.signals; ``rebuild`` redoes them all). Migration 0007 indexes the
+documents per database:
+
+* PostgreSQL: a generated ``search_vector`` column (title weighted above
+  body) under a GIN index; queries are ``websearch_to_tsquery`` (quotes,
+  ``or``, ``-word``), ranked by ``ts_rank_cd`` and highlighted by
+  ``ts_headline``;
+* SQLite (local development): an FTS5 table kept in step by triggers;
+  every word must match, the last one as a prefix, ranked by ``bm25``
+  and highlighted by ``snippet``.
+
+Either way one query does the matching, ranking and the enrollment scope (a
+student sees active modules they're enrolled in and courses they're
+enrolled in; an instructor what they teach), and highlights only the rows
+returned. Highlights are HTML-escaped with matches in ``<mark>``.
+"""
+import html
+import re
+
+from django.db import connection
+
+from courses.models import Announcement, Course, Lesson, Module
+from .models import ModuleNotification, ModuleSection, SearchDocument, SectionContent
+
+# PostgreSQL text search configuration; search_vector (migration 0007) is built with it
+SEARCH_CONFIG = 'english'
+SEARCH_SNIPPET_WORDS = 20
+SEARCH_MAX_RESULTS = 50
+
+# Match markers the databases put around hits: control characters, so they
+# survive HTML escaping and can't come from the text
+_START, _STOP = '\x02', '\x03'
+_word_re = re.compile(r'\w+')
+
+
+def _document_fields(instance):
+    """(kind, module_id, course_id, title, body) of a searchable row."""
+    if isinstance(instance, SectionContent):
+        return 'section_content', instance.section.module_id, None, instance.title, instance.text_content
+    if isinstance(instance, ModuleSection):
+        return 'section', instance.module_id, None, instance.title, instance.description
+    if isinstance(instance, Lesson):
+        return 'lesson', instance.module_id, None, instance.title, instance.content
+    if isinstance(instance, ModuleNotification):
+        return 'notification', instance.module_id, None, instance.title, instance.content
+    if isinstance(instance, Announcement):
+        return 'announcement', None, instance.course_id, instance.title, instance.content
+    raise TypeError(f'{type(instance).__name__} is not searchable')
+
+
+def _document(instance):
+    kind, module_id, course_id, title, body = _document_fields(instance)
+    return SearchDocument(
+        kind=kind, object_id=instance.pk, module_id=module_id, course_id=course_id, title=title or '', body=body or '',
+    )
+
+
+KIND_OF = {
+    SectionContent: 'section_content',
+    ModuleSection: 'section',
+    Lesson: 'lesson',
+    ModuleNotification: 'notification',
+    Announcement: 'announcement',
+}
+
+# Fields a document is made of; saves with other update_fields leave it be
+INDEXED_FIELDS = {
+    SectionContent: {'title', 'text_content', 'section'},
+    ModuleSection: {'title', 'description', 'module'},
+    Lesson: {'title', 'content', 'module'},
+    ModuleNotification: {'title', 'content', 'module'},
+    Announcement: {'title', 'content', 'course'},
+}
+
+
+def index(instance, update_fields=None):
+    """Create or refresh the document of a saved row."""
+    if update_fields is not None and not INDEXED_FIELDS[type(instance)].intersection(update_fields):
+        return
+    kind, module_id, course_id, title, body = _document_fields(instance)
+    SearchDocument.objects.update_or_create(
+        kind=kind, object_id=instance.pk,
+        defaults={'module_id': module_id, 'course_id': course_id, 'title': title or '', 'body': body or ''},
+    )
+    if isinstance(instance, ModuleSection):
+        # The section's contents follow it to its module
+        SearchDocument.objects.filter(
+            kind='section_content', object_id__in=instance.contents.values('id'),
+        ).exclude(module_id=instance.module_id).update(module_id=instance.module_id)
+
+
+def index_many(instances):
+    """Refresh the documents of rows of one model written without signals (``bulk_update``)."""
+    if not instances:
+        return
+    unindex(type(instances[0]), *(instance.pk for instance in instances))
+    SearchDocument.objects.bulk_create([_document(instance) for instance in instances], batch_size=1000)
+
+
+def unindex(model, *object_ids):
+    SearchDocument.objects.filter(kind=KIND_OF[model], object_id__in=object_ids).delete()
+
+
+def rebuild():
+    """Recreate every document from its row; returns how many there are."""
+    SearchDocument.objects.all().delete()
+    querysets = [
+        SectionContent.objects.select_related('section'),
+        ModuleSection.objects.all(),
+        Lesson.objects.all(),
+        ModuleNotification.objects.all(),
+        Announcement.objects.all(),
+    ]
+    count = 0
+    for queryset in querysets:
+        documents = [_document(instance) for instance in queryset.iterator(chunk_size=1000)]
+        SearchDocument.objects.bulk_create(documents, batch_size=1000)
+        count += len(documents)
+    return count
+
+
+def _compiled(queryset):
+    sql, params = queryset.query.sql_with_params()
+    return sql, list(params)
+
+
+def _scope(role, profile):
+    """SQL condition on ``d`` (a SearchDocument) for what the principal may see, and its params."""
+    if role == 'instructor':
+        modules = Module.objects.filter(instructor_id=profile.pk)
+        courses = Course.objects.filter(instructor_id=profile.user_id)
+    else:
+        modules = Module.objects.filter(moduleenrollment__student_id=profile.pk, is_active=True)
+        courses = Course.objects.filter(
+            course_enrollments__student_id=profile.pk, course_enrollments__status__in=['enrolled', 'completed'],
+        )
+    module_sql, module_params = _compiled(modules.values('id'))
+    course_sql, course_params = _compiled(courses.values('id'))
+    return f'(d.module_id IN ({module_sql}) OR d.course_id IN ({course_sql}))', module_params + course_params
+
+
+def _fts5_query(query):
+    """Every word of ``query`` as an FTS5 string, the last one also as a prefix."""
+    words = _word_re.findall(query)
+    if not words:
+        return None
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _highlighted(text):
+    return html.escape(text or '').replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+def search(query, role, profile, module_id=None, kinds=None, limit=20):
+    """
+    The documents matching ``query`` that the principal may see, best first:
+    dicts of ``kind``, ``id`` (of the row), ``module_id``, ``course_id``,
+    ``title`` and ``snippet`` (highlighted) and ``rank`` (higher is better).
+    """
+    limit = max(1, min(limit, SEARCH_MAX_RESULTS))
+    scope, params = _scope(role, profile)
+    conditions = [scope]
+    if module_id is not None:
+        conditions.append('d.module_id = %s')
+        params.append(module_id)
+    if kinds:
+        conditions.append(f'd.kind IN ({", ".join(["%s"] * len(kinds))})')
+        params.extend(kinds)
+    where = ' AND '.join(conditions)
+
+    if connection.vendor == 'postgresql':
+        markers = f'StartSel={_START}, StopSel={_STOP}'
+        options = f'{markers}, MaxWords={SEARCH_SNIPPET_WORDS}, MinWords=5, MaxFragments=2'
+        # Ranked and limited first: ts_headline re-parses the text, so only
+        # the rows returned pay for it
+        sql = f"""
+            SELECT r.kind, r.object_id, r.module_id, r.course_id,
+                   ts_headline(%s::regconfig, r.title, r.q, %s),
+                   ts_headline(%s::regconfig, r.body, r.q, %s),
+                   r.rank
+            FROM (
+                SELECT d.kind, d.object_id, d.module_id, d.course_id, d.title, d.body, q,
+                       ts_rank_cd(d.search_vector, q) AS rank
+                FROM modules_searchdocument d, websearch_to_tsquery(%s::regconfig, %s) q
+                WHERE d.search_vector @@ q AND {where}
+                ORDER BY rank DESC, d.id
+                LIMIT %s
+            ) r
+            ORDER BY r.rank DESC
+        """
+        params = [
+            SEARCH_CONFIG, f'HighlightAll=true, {markers}', SEARCH_CONFIG, options, SEARCH_CONFIG, query,
+        ] + params + [limit]
+    else:
+        match = _fts5_query(query)
+        if match is None:
+            return []
+        # Columns: title, body; a title hit counts ten times a body hit
+        sql = f"""
+            SELECT d.kind, d.object_id, d.module_id, d.course_id,
+                   highlight(modules_searchdocument_fts, 0, '{_START}', '{_STOP}'),
+                   snippet(modules_searchdocument_fts, 1, '{_START}', '{_STOP}', '…', {SEARCH_SNIPPET_WORDS}),
+                   -bm25(modules_searchdocument_fts, 10.0, 1.0) AS rank
+            FROM modules_searchdocument_fts
+            JOIN modules_searchdocument d ON d.id = modules_searchdocument_fts.rowid
+            WHERE modules_searchdocument_fts MATCH %s AND {where}
+            ORDER BY rank DESC, d.id
+            LIMIT %s
+        """
+        params = [match] + params + [limit]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [
+        {
+            'kind': kind,
+            'id': object_id,
+            'module_id': module_id,
+            'course_id': course_id,
+            'title': _highlighted(title),
+            'snippet': _highlighted(snippet),
+            'rank': float(rank),
+        }
+        for kind, object_id, module_id, course_id, title, snippet, rank in rows
+    ]
@@ -1,30 +1,81 @@
+import os
+
+from django.db import models
+from django.utils.text import get_valid_filename
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 from accounts.models import Student
+from . import media, previews, roster, uploads
 from .models import (
     Module, ModuleContent, StudentModuleProgress, ModuleNotification,
     NotificationComment, ModuleTest, Quiz, QuizQuestion, 
     QuizChoice, QuizAttempt, QuizAnswer, ModuleTemplate,
-    SectionContent, ModuleSection
+    SectionContent, ModuleSection, UploadSession
 )
 
+class ModuleFieldsetMixin:
+    """
+    Drops the fields a ``module_fieldset`` in the serializer context (see
+    modules.queries.ModuleFieldset) didn't ask for, so unrequested relations
+    are neither rendered nor touched. ``expandable_fields`` maps a field to
+    the expand token that switches it on.
+    """
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('module_fieldset')
+        if fieldset is None:
+            return fields
+        for name, token in self.expandable_fields.items():
+            if not fieldset.expands(token):
+                fields.pop(name, None)
+        return fields
+
 class StudentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Student
         fields = ['id', 'user', 'registration_number']
         depth = 1
 
+def signed_media_url(context, name):
+    """
+    A signed URL for the stored file ``name`` (see modules.media), absolute
+    when the serializer has a request. Links and ``<img>`` tags can't send
+    the Authorization header that protected files otherwise need.
+    """
+    url = media.signed_url(name)
+    request = context.get('request')
+    return request.build_absolute_uri(url) if request is not None else url
+
+class SignedFileField(serializers.FileField):
+    """A FileField rendered as a signed URL."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return signed_media_url(self.context, value.name)
+
+# serializer_field_mapping of ModelSerializers whose file fields render as SignedFileField
+SIGNED_FILE_FIELD_MAPPING = {**serializers.ModelSerializer.serializer_field_mapping, models.FileField: SignedFileField}
+
+class PreviewsField(serializers.Field):
+    """A content's ``previews`` (see modules.previews) with signed URLs for the derivatives."""
+
+    def __init__(self, **kwargs):
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        return previews.preview_urls(obj.previews, lambda name: signed_media_url(self.context, name))
+
 class ModuleContentSerializer(serializers.ModelSerializer):
-    file_url = serializers.SerializerMethodField()
+    file_url = SignedFileField(source='file', read_only=True)
+    previews = PreviewsField()
 
     class Meta:
         model = ModuleContent
-        fields = ['id', 'title', 'file_type', 'file_url', 'uploaded_at']
-
-    def get_file_url(self, obj):
-        request = self.context.get('request')
-        if obj.file and hasattr(request, 'build_absolute_uri'):
-            return request.build_absolute_uri(obj.file.url)
-        return None
+        fields = ['id', 'title', 'file_type', 'file_url', 'previews', 'uploaded_at']
 
 class NotificationCommentSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
@@ -34,7 +85,8 @@ class NotificationCommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'text', 'user_name', 'created_at']
         read_only_fields = ['user']
 
-class ModuleNotificationSerializer(serializers.ModelSerializer):
+class ModuleNotificationSerializer(ModuleFieldsetMixin, serializers.ModelSerializer):
+    expandable_fields = {'comments': 'notifications.comments'}
     comments = NotificationCommentSerializer(many=True, read_only=True)
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     module_name = serializers.CharField(source='module.title', read_only=True)
@@ -49,18 +101,22 @@ class ModuleTestSerializer(serializers.ModelSerializer):
         model = ModuleTest
         fields = ['id', 'title', 'description', 'date', 'duration']
 
-class SectionContentSerializer(serializers.ModelSerializer):
+class SectionContentSerializer(ModuleFieldsetMixin, serializers.ModelSerializer):
+    expandable_fields = {'text_content': 'sections.contents.text_content'}
     uploaded_by_name = serializers.CharField(source='uploaded_by.username', read_only=True)
+    previews = PreviewsField()
+    serializer_field_mapping = SIGNED_FILE_FIELD_MAPPING
 
     class Meta:
         model = SectionContent
         fields = [
-            'id', 'section', 'title', 'file', 'file_type', 'text_content',
+            'id', 'section', 'title', 'file', 'file_type', 'previews', 'text_content',
             'order', 'uploaded_at', 'uploaded_by', 'uploaded_by_name'
         ]
         read_only_fields = ['uploaded_at', 'uploaded_by', 'uploaded_by_name']
 
-class ModuleSectionSerializer(serializers.ModelSerializer):
+class ModuleSectionSerializer(ModuleFieldsetMixin, serializers.ModelSerializer):
+    expandable_fields = {'contents': 'sections.contents'}
     contents = SectionContentSerializer(many=True, read_only=True)
 
     class Meta:
@@ -71,12 +127,70 @@ class ModuleSectionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'updated_at', 'contents']
 
-class ModuleSerializer(serializers.ModelSerializer):
+class SectionEditSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField(max_length=200, required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+    order = serializers.IntegerField(min_value=0, required=False)
+
+class SectionContentEditSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField(max_length=200, required=False)
+    text_content = serializers.CharField(required=False, allow_blank=True)
+    file_type = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    order = serializers.IntegerField(min_value=0, required=False)
+
+class BulkEditSerializer(serializers.Serializer):
+    """
+    A new order for the items of one parent (``parent`` and every item id
+    in ``order``), a batch of partial ``edits``, or both (see modules.bulk).
+    """
+    parent = serializers.IntegerField(required=False)
+    order = serializers.ListField(child=serializers.IntegerField(), min_length=1, required=False)
+
+    def validate(self, attrs):
+        if 'order' in attrs and 'parent' not in attrs:
+            raise serializers.ValidationError({'parent': 'Required with order.'})
+        if 'order' not in attrs and 'edits' not in attrs:
+            raise serializers.ValidationError('Send order, edits or both.')
+        return attrs
+
+class SectionBulkEditSerializer(BulkEditSerializer):
+    edits = serializers.ListField(child=SectionEditSerializer(), min_length=1, required=False)
+
+class SectionContentBulkEditSerializer(BulkEditSerializer):
+    edits = serializers.ListField(child=SectionContentEditSerializer(), min_length=1, required=False)
+
+class StudentIdsField(serializers.ListField):
+    """
+    Student primary keys, like PrimaryKeyRelatedField(many=True) but
+    validated with one query rather than one per id.
+    """
+    child = serializers.IntegerField()
+
+    def to_representation(self, value):
+        return [student.pk for student in value.all()]
+
+    def to_internal_value(self, data):
+        ids = set(super().to_internal_value(data))
+        missing = ids - set(Student.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        if missing:
+            raise serializers.ValidationError(f'Invalid pk "{min(missing)}" - object does not exist.')
+        return sorted(ids)
+
+
+class ModuleSerializer(ModuleFieldsetMixin, serializers.ModelSerializer):
+    # Only walks relations; pair with modules.queries.with_module_relations
+    # so that every walk is served from the prefetch cache.
+    expandable_fields = {
+        'contents': 'contents', 'notifications': 'notifications', 'tests': 'tests',
+        'students': 'students', 'sections': 'sections',
+    }
     instructor_name = serializers.SerializerMethodField()
     contents = serializers.SerializerMethodField()
     notifications = serializers.SerializerMethodField()
     tests = serializers.SerializerMethodField()
-    students = serializers.PrimaryKeyRelatedField(queryset=Student.objects.all(), many=True, required=False)
+    students = StudentIdsField(required=False)
     sections = ModuleSectionSerializer(many=True, read_only=True)
 
     class Meta:
@@ -89,6 +203,15 @@ class ModuleSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['instructor_name', 'contents', 'notifications', 'tests', 'sections']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('module_fieldset')
+        if fieldset is not None:
+            for name in list(fields):
+                if name not in self.expandable_fields and not fieldset.wants_field(name):
+                    del fields[name]
+        return fields
+
     def get_instructor_name(self, obj):
         return obj.instructor.user.get_full_name() if obj.instructor else None
 
@@ -96,18 +219,19 @@ class ModuleSerializer(serializers.ModelSerializer):
         return ModuleContentSerializer(obj.contents.all(), many=True).data
 
     def get_notifications(self, obj):
-        return ModuleNotificationSerializer(obj.notifications.all(), many=True).data
+        context = {'module_fieldset': self.context.get('module_fieldset')}
+        return ModuleNotificationSerializer(obj.notifications.all(), many=True, context=context).data
 
     def get_tests(self, obj):
         return ModuleTestSerializer(obj.tests.all(), many=True).data
 
     def create(self, validated_data):
         students = validated_data.pop('students', [])
-        instructor = self.context['request'].user.instructor
+        instructor = self.context['request'].profile
         validated_data['instructor'] = instructor
         module = super().create(validated_data)
         if students:
-            module.students.set(students)
+            roster.enroll([module.pk], students)
         return module
 
     def update(self, instance, validated_data):
@@ -116,13 +240,48 @@ class ModuleSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         if students is not None:
-            instance.students.set(students)
+            roster.set_roster(instance.pk, students)
         return instance
 
 class ModuleStudentManagementSerializer(serializers.Serializer):
     student_ids = serializers.ListField(child=serializers.IntegerField())
     action = serializers.ChoiceField(choices=['add', 'remove'])
 
+class ModuleRosterSerializer(serializers.Serializer):
+    """
+    A bulk roster change: students picked by primary key, student number,
+    a CSV upload with a ``student_id`` column, or a whole batch/program.
+    """
+    module_ids = serializers.ListField(child=serializers.IntegerField(), min_length=1)
+    action = serializers.ChoiceField(choices=['add', 'remove'])
+    student_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    student_numbers = serializers.ListField(child=serializers.CharField(), required=False)
+    file = serializers.FileField(required=False)
+    batch = serializers.CharField(required=False)
+    program = serializers.CharField(required=False)
+    background = serializers.BooleanField(required=False, default=False)
+
+    def validate_file(self, value):
+        try:
+            return roster.parse_student_numbers(value.read())
+        except (ValueError, UnicodeDecodeError) as e:
+            raise serializers.ValidationError(str(e))
+
+    def validate(self, attrs):
+        attrs['student_numbers'] = attrs.get('student_numbers', []) + attrs.pop('file', [])
+        if not (attrs.get('student_ids') or attrs['student_numbers'] or attrs.get('batch') or attrs.get('program')):
+            raise serializers.ValidationError('Select students by student_ids, student_numbers, file, batch or program.')
+        return attrs
+
+class ModuleCloneSerializer(serializers.Serializer):
+    """The new module of a copy (see modules.cloning); title and description default to the source's."""
+    code = serializers.CharField(max_length=20, validators=[UniqueValidator(queryset=Module.objects.all())])
+    title = serializers.CharField(max_length=200, required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+
+class ModuleFromTemplateSerializer(ModuleCloneSerializer):
+    template = serializers.PrimaryKeyRelatedField(queryset=ModuleTemplate.objects.filter(is_active=True))
+
 class QuizChoiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = QuizChoice
@@ -160,4 +319,42 @@ class QuizAttemptSerializer(serializers.ModelSerializer):
 class ModuleTemplateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ModuleTemplate
-        fields = ['id', 'name', 'code', 'description', 'created_at', 'updated_at', 'is_active'] 
\ No newline at end of file
+        fields = ['id', 'name', 'code', 'description', 'source_module', 'created_at', 'updated_at', 'is_active']
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """A resumable upload (see modules.uploads); ``missing`` lists the chunks still to send."""
+    chunk_size = serializers.IntegerField(
+        min_value=uploads.UPLOAD_MIN_CHUNK_SIZE, max_value=uploads.UPLOAD_MAX_CHUNK_SIZE, required=False
+    )
+    size = serializers.IntegerField(min_value=1, max_value=uploads.UPLOAD_MAX_SIZE)
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True)
+    chunk_count = serializers.IntegerField(read_only=True)
+    missing = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'module', 'section', 'title', 'file_name', 'file_type', 'size', 'chunk_size', 'sha256',
+            'chunk_count', 'missing', 'created_at', 'expires_at',
+        ]
+        read_only_fields = ['created_at', 'expires_at']
+
+    def get_missing(self, obj):
+        return uploads.missing_chunks(obj)
+
+    def validate_file_name(self, value):
+        name = get_valid_filename(os.path.basename(value))
+        if not name:
+            raise serializers.ValidationError('Invalid file name.')
+        return name
+
+    def validate(self, attrs):
+        request = self.context['request']
+        if attrs['module'].instructor_id != request.profile.id:
+            raise serializers.ValidationError({'module': 'You can only upload to your own modules.'})
+        if attrs.get('section') and attrs['section'].module_id != attrs['module'].id:
+            raise serializers.ValidationError({'section': 'The section is not part of this module.'})
+        return attrs
+
+    def create(self, validated_data):
+        return uploads.create_session(owner=self.context['request'].user, **validated_data)
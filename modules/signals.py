@@ -0,0 +1,271 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from assignments.models import Assignment, AssignmentSubmission
+from courses.models import Announcement, Lesson, Module, ModuleEnrollment
+from . import completion, events, inbox, membership, previews, search
+from .cache import bump_module_versions
+from .storage import content_storage
+from .models import (
+    ModuleContent, ModuleNotification, NotificationComment, ModuleTest,
+    ModuleSection, SectionContent, QuizAttempt,
+)
+
+
+@receiver([post_save, post_delete], sender=Module)
+def invalidate_module(sender, instance, **kwargs):
+    bump_module_versions(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ModuleContent)
+@receiver([post_save, post_delete], sender=ModuleSection)
+@receiver([post_save, post_delete], sender=ModuleNotification)
+@receiver([post_save, post_delete], sender=ModuleTest)
+@receiver([post_save, post_delete], sender=ModuleEnrollment)
+def invalidate_module_child(sender, instance, **kwargs):
+    bump_module_versions(instance.module_id)
+
+
+@receiver(post_delete, sender=ModuleContent)
+def clear_content_completion(sender, instance, **kwargs):
+    # Keeps each enrollment's popcount equal to its completed, existing contents
+    completion.clear_position(instance.module_id, instance.position)
+
+
+@receiver([post_save, post_delete], sender=SectionContent)
+def invalidate_section_content(sender, instance, **kwargs):
+    # During a cascading delete the section may already be gone; its own
+    # post_delete has bumped the module then.
+    if SectionContent.section.is_cached(instance):
+        module_id = instance.section.module_id
+    else:
+        module_id = ModuleSection.objects.filter(
+            pk=instance.section_id
+        ).values_list('module_id', flat=True).first()
+    bump_module_versions(module_id)
+
+
+@receiver([post_save, post_delete], sender=NotificationComment)
+def invalidate_notification_comment(sender, instance, **kwargs):
+    if NotificationComment.notification.is_cached(instance):
+        module_id = instance.notification.module_id
+    else:
+        module_id = ModuleNotification.objects.filter(
+            pk=instance.notification_id
+        ).values_list('module_id', flat=True).first()
+    bump_module_versions(module_id)
+
+
+@receiver(m2m_changed, sender=Module.students.through)
+def invalidate_module_students(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            bump_module_versions(instance.pk)
+    elif action == 'pre_clear':
+        # student.enrolled_modules.clear(): the module ids are gone after it
+        instance._cleared_module_ids = list(
+            ModuleEnrollment.objects.filter(student=instance).values_list('module_id', flat=True)
+        )
+    elif action == 'post_clear':
+        bump_module_versions(*getattr(instance, '_cleared_module_ids', ()))
+    elif action.startswith('post_'):
+        bump_module_versions(*pk_set)
+
+
+# Enrollment membership (see modules.membership)
+
+@receiver(post_save, sender=Module)
+def invalidate_module_membership(sender, instance, created, **kwargs):
+    # is_active may have changed; a new module has no students yet
+    if not created:
+        membership.invalidate_module(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ModuleEnrollment)
+def invalidate_enrollment_membership(sender, instance, **kwargs):
+    membership.invalidate(instance.student_id)
+
+
+# Inbox: posting fans a notification out to the enrolled students, enrolling
+# delivers a module's notifications, unenrolling withdraws them
+
+@receiver(post_save, sender=ModuleNotification)
+def deliver_notification(sender, instance, created, **kwargs):
+    if created:
+        student_ids = inbox.deliver(instance)
+        events.publish_to_students(student_ids, 'notification', {
+            'id': instance.pk,
+            'module_id': instance.module_id,
+            'title': instance.title,
+            'created_at': instance.created_at,
+        })
+
+
+@receiver(post_save, sender=ModuleEnrollment)
+def deliver_enrollment(sender, instance, created, **kwargs):
+    if created:
+        inbox.deliver_module(instance.module_id, [instance.student_id])
+
+
+@receiver(post_delete, sender=ModuleEnrollment)
+def withdraw_enrollment(sender, instance, **kwargs):
+    inbox.withdraw_module(instance.module_id, [instance.student_id])
+
+
+@receiver(m2m_changed, sender=Module.students.through)
+def sync_enrolled_students(sender, instance, action, reverse, pk_set, **kwargs):
+    """Inbox and membership for module.students.add/remove/set/clear (either side)."""
+    if action == 'pre_clear':
+        enrollments = ModuleEnrollment.objects.filter(**{'student' if reverse else 'module': instance})
+        instance._cleared_enrollments = list(enrollments.values_list('module_id', 'student_id'))
+        return
+    if action == 'post_clear':
+        pairs = getattr(instance, '_cleared_enrollments', ())
+    elif action in ('post_add', 'post_remove'):
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+    else:
+        return
+    by_module = {}
+    for module_id, student_id in pairs:
+        by_module.setdefault(module_id, []).append(student_id)
+    membership.invalidate(*{student_id for _, student_id in pairs})
+    for module_id, student_ids in by_module.items():
+        if action == 'post_add':
+            inbox.deliver_module(module_id, student_ids)
+        else:
+            inbox.withdraw_module(module_id, student_ids)
+
+
+@receiver(pre_delete, sender=ModuleNotification)
+def collect_notification_readers(sender, instance, **kwargs):
+    # The deliveries are cascaded away; their readers' unread counts change
+    instance._inbox_student_ids = list(instance.deliveries.values_list('student_id', flat=True))
+
+
+@receiver(post_delete, sender=ModuleNotification)
+def forget_notification_readers(sender, instance, **kwargs):
+    inbox.forget_unread(*getattr(instance, '_inbox_student_ids', ()))
+
+
+# Live events (see modules.events); notifications are published on delivery above
+
+@receiver(post_save, sender=NotificationComment)
+def publish_comment(sender, instance, created, **kwargs):
+    if not created:
+        return
+    module_id = ModuleNotification.objects.filter(
+        pk=instance.notification_id
+    ).values_list('module_id', flat=True).first()
+    student_ids = ModuleEnrollment.objects.filter(module_id=module_id).values_list('student_id', flat=True)
+    events.publish_to_students(student_ids, 'comment', {
+        'id': instance.pk,
+        'notification_id': instance.notification_id,
+        'module_id': module_id,
+        'user': instance.user.username,
+        'text': instance.text,
+        'created_at': instance.created_at,
+    })
+
+
+@receiver(post_save, sender=AssignmentSubmission)
+def publish_assignment_grade(sender, instance, **kwargs):
+    if instance.grade is not None and instance.student_id is not None:
+        events.publish_to_students([instance.student_id], 'grade', {
+            'kind': 'assignment',
+            'id': instance.assignment_id,
+            'grade': instance.grade,
+        })
+
+
+@receiver(post_save, sender=QuizAttempt)
+def publish_quiz_grade(sender, instance, **kwargs):
+    if instance.is_completed:
+        events.publish_to_students([instance.student_id], 'grade', {
+            'kind': 'quiz',
+            'id': instance.quiz_id,
+            'score': instance.score,
+        })
+
+
+# Content-addressed files (see modules.storage): each row's file is a
+# reference to its blob, dropped once the row is deleted or re-uploaded
+
+STORED_FILE_FIELDS = {
+    ModuleContent: 'file',
+    SectionContent: 'file',
+    Assignment: 'file',
+    AssignmentSubmission: 'submitted_file',
+}
+
+
+def _release_on_commit(name):
+    if name:
+        transaction.on_commit(lambda: content_storage().release(name))
+
+
+@receiver(pre_save, sender=ModuleContent)
+@receiver(pre_save, sender=SectionContent)
+@receiver(pre_save, sender=Assignment)
+@receiver(pre_save, sender=AssignmentSubmission)
+def remember_replaced_file(sender, instance, **kwargs):
+    # An uncommitted FieldFile is a new upload about to be stored
+    field = STORED_FILE_FIELDS[sender]
+    if instance.pk is not None and not getattr(instance, field)._committed:
+        instance._replaced_file = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=ModuleContent)
+@receiver(post_save, sender=SectionContent)
+@receiver(post_save, sender=Assignment)
+@receiver(post_save, sender=AssignmentSubmission)
+def release_replaced_file(sender, instance, **kwargs):
+    replaced = instance.__dict__.pop('_replaced_file', None)
+    if replaced != getattr(instance, STORED_FILE_FIELDS[sender]).name:
+        _release_on_commit(replaced)
+
+
+@receiver(post_delete, sender=ModuleContent)
+@receiver(post_delete, sender=SectionContent)
+@receiver(post_delete, sender=Assignment)
+@receiver(post_delete, sender=AssignmentSubmission)
+def release_deleted_file(sender, instance, **kwargs):
+    _release_on_commit(getattr(instance, STORED_FILE_FIELDS[sender]).name)
+
+
+# Previews (see modules.previews): a newly stored file gets them generated
+
+@receiver(pre_save, sender=ModuleContent)
+@receiver(pre_save, sender=SectionContent)
+def reset_previews(sender, instance, **kwargs):
+    # New rows, and re-uploads (an uncommitted FieldFile)
+    if instance.file and (instance._state.adding or not instance.file._committed):
+        instance.previews = {'status': 'pending'}
+        instance._previews_due = True
+
+
+@receiver(post_save, sender=ModuleContent)
+@receiver(post_save, sender=SectionContent)
+def schedule_previews(sender, instance, **kwargs):
+    if instance.__dict__.pop('_previews_due', False):
+        previews.schedule(sender, instance.pk)
+
+
+# Search (see modules.search): each searchable row's document follows it
+
+@receiver(post_save, sender=SectionContent)
+@receiver(post_save, sender=ModuleSection)
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=ModuleNotification)
+@receiver(post_save, sender=Announcement)
+def index_document(sender, instance, update_fields=None, **kwargs):
+    search.index(instance, update_fields)
+
+
+@receiver(post_delete, sender=SectionContent)
+@receiver(post_delete, sender=ModuleSection)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=ModuleNotification)
+@receiver(post_delete, sender=Announcement)
+def unindex_document(sender, instance, **kwargs):
+    search.unindex(sender, instance.pk)
@@ -0,0 +1,209 @@
+"""
+Content-addressed, deduplicated storage for uploaded course files.
+
+The same syllabus or slide deck used to be stored again for every module
+and intake, each copy under a new random suffix. ``ContentAddressedStorage``
+hashes a file while it streams to disk and keeps each distinct file once, at
+``blobs/<ab>/<cd>/<sha256><ext>`` (sharded so no directory grows huge).
+
+FileField values keep their ``upload_to`` folder and become
+``<upload_to>/<sha256><ext>``: URLs still say what kind of file they are
+(modules.media authorizes by that folder) and never change content, so they
+can be cached as immutable. ``path()`` resolves such names to the blob;
+names from before (no hash) resolve under MEDIA_ROOT as they always did.
+
+Every FileField value holding a blob is a reference, counted on its
+StoredBlob row: saving a file adds one, ``release`` (``delete``) drops one
+and removes the blob with the last. modules.signals releases the files of
+deleted or re-uploaded rows; code that copies a name to new rows without
+saving a file (``bulk_create``, cloning) must ``retain`` it. Derivatives
+(``derivative_name``) live beside their blob and go with it.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from collections import Counter
+
+from django.apps import apps
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+BLOB_DIR = 'blobs'
+# upload_to of the fields using this storage; hashed names elsewhere (a
+# profile picture named like a blob) are ordinary files
+CONTENT_FOLDERS = ('module_contents/', 'section_contents/', 'assignments/', 'assignment_submissions/')
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_content_name_re = re.compile(r'^([0-9a-f]{64})(\.[0-9a-z]{1,16})?$')
+_ext_re = re.compile(r'^\.[0-9a-z]{1,16}$')
+_derivative_re = re.compile(r'^(.+)(\.(?:thumb|page|w\d+)\.(?:jpg|png))$')
+
+
+def derivative_name(name, variant, fmt='jpg'):
+    """Name of a rendition of the file ``name`` (see modules.previews)."""
+    return f'{name}.{variant}.{fmt}'
+
+
+def original_name(name):
+    """The file a derivative name was made from, or None."""
+    match = _derivative_re.match(name)
+    return match.group(1) if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    @staticmethod
+    def blob_name(name):
+        """The blob a content-addressed name points at, or None for other names."""
+        folder, basename = posixpath.split(name)
+        match = _content_name_re.match(basename)
+        if match is None or f'{folder}/' not in CONTENT_FOLDERS:
+            return None
+        digest, ext = match.group(1), match.group(2) or ''
+        return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def stored_name(self, name):
+        """
+        Where ``name`` lives under MEDIA_ROOT: its blob; for a derivative of
+        a content-addressed file, beside that blob; otherwise ``name``.
+        """
+        blob_name = self.blob_name(name)
+        if blob_name:
+            return blob_name
+        original = original_name(name)
+        if original and self.blob_name(original):
+            return self.blob_name(original) + name[len(original):]
+        return name
+
+    def path(self, name):
+        return super().path(self.stored_name(name))
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save; equal content is
+        # meant to share it, so there's nothing to make unique
+        return name
+
+    def _save(self, name, content):
+        if f'{posixpath.dirname(name)}/' not in CONTENT_FOLDERS:
+            raise ValueError(f'Only files under CONTENT_FOLDERS are content-addressed, not {name}')
+        ext = os.path.splitext(name)[1].lower()
+        if not _ext_re.match(ext):
+            ext = ''
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk: hash it there and move it, like Django does
+            source, owned = content.temporary_file_path(), False
+            digest = getattr(content, 'sha256', None) or _file_sha256(source)
+        else:
+            source, owned, digest = self._spool(content)
+        name = posixpath.join(posixpath.dirname(name), digest + ext)
+        blob_name = self.blob_name(name)
+        blob_path = super().path(blob_name)
+
+        try:
+            with transaction.atomic():
+                blob = self._lock_blob(blob_name, os.path.getsize(source))
+                # Checked under the lock: the last release removes the file
+                # while holding it
+                if not os.path.exists(blob_path):
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    file_move_safe(source, blob_path, allow_overwrite=True)
+                    owned = False
+                    if self.file_permissions_mode is not None:
+                        os.chmod(blob_path, self.file_permissions_mode)
+                _blobs().filter(pk=blob.pk).update(refs=F('refs') + 1)
+        finally:
+            if owned:
+                os.remove(source)
+        return name
+
+    def _spool(self, content):
+        """Stream ``content`` to a temporary file next to the blobs, hashing it; ``(path, True, sha256)``."""
+        directory = super().path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=directory, suffix='.upload')
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+                    digest.update(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path, True, digest.hexdigest()
+
+    def _lock_blob(self, blob_name, size):
+        blobs = _blobs().select_for_update()
+        try:
+            with transaction.atomic():
+                blob, _ = blobs.get_or_create(name=blob_name, defaults={'size': size})
+        except IntegrityError:
+            # Created concurrently
+            blob = blobs.get(name=blob_name)
+        return blob
+
+    def retain(self, name, count=1):
+        """Add ``count`` references to a content-addressed name copied to new rows."""
+        blob_name = self.blob_name(name or '')
+        if blob_name and count:
+            _blobs().filter(name=blob_name).update(refs=F('refs') + count)
+
+    def retain_all(self, names):
+        """``retain`` each of ``names`` once per occurrence, with one UPDATE per distinct count."""
+        counts = Counter(filter(None, (self.blob_name(name or '') for name in names)))
+        by_count = {}
+        for blob_name, count in counts.items():
+            by_count.setdefault(count, []).append(blob_name)
+        for count, blob_names in by_count.items():
+            _blobs().filter(name__in=blob_names).update(refs=F('refs') + count)
+
+    def release(self, name):
+        """Drop a reference; the blob is removed with the last one. Other names are left alone."""
+        blob_name = self.blob_name(name or '')
+        if blob_name is None:
+            return
+        with transaction.atomic():
+            blob = _blobs().select_for_update().filter(name=blob_name).first()
+            if blob is None:
+                return
+            if blob.refs > 1:
+                _blobs().filter(pk=blob.pk).update(refs=F('refs') - 1)
+                return
+            blob.delete()
+            super().delete(blob_name)
+            # and its derivatives
+            directory, prefix = os.path.split(super().path(blob_name))
+            for entry in os.listdir(directory):
+                if entry.startswith(prefix + '.'):
+                    os.remove(os.path.join(directory, entry))
+
+    def delete(self, name):
+        if self.blob_name(name):
+            self.release(name)
+        else:
+            super().delete(name)
+
+
+def _blobs():
+    # modules.models can't be imported here: the models use this storage
+    return apps.get_model('modules', 'StoredBlob').objects
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_storage = ContentAddressedStorage()
+
+
+def content_storage():
+    """``storage=`` of the course file fields (a callable keeps it out of migrations)."""
+    return _storage
@@ -1,3 +1,1352 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from PIL import Image
+from django.db import connection
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User, Student, Instructor
+from assignments.models import Assignment, AssignmentSubmission
+from courses.models import Announcement, Course, CourseEnrollment, Lesson, Module, ModuleEnrollment
+from .cache import bump_module_versions
+from .models import (
+    ModuleContent, ModuleNotification, NotificationComment, ModuleTest,
+    ModuleSection, SectionContent, Quiz, QuizQuestion, QuizChoice, UploadSession, StoredBlob, SearchDocument,
+    ModuleTemplate,
+)
+from . import bulk, cloning, jobs, media, previews, roster, uploads
+from .completion import mark_complete
+from .storage import content_storage
+
+
+class ModuleFixtureMixin:
+    def setUp(self):
+        instructor_user = User.objects.create_user(
+            username='I9001', email='i9@GAS.education', first_name='Ina', last_name='Structor', role='instructor'
+        )
+        self.instructor = Instructor.objects.create(
+            user=instructor_user, employee_id='I9001', department='IT', designation='Lecturer'
+        )
+        self.instructor_auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(instructor_user)}'}
+        student_user = User.objects.create_user(username='S9001', email='s9@GAS.education', role='student')
+        self.student = Student.objects.create(user=student_user, student_id='S9001')
+        self.student_auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(student_user)}'}
+        self.modules_made = 0
+        # Background jobs (previews) run inline, not on the pool's threads
+        workers = mock.patch.object(jobs, 'BACKGROUND_WORKERS', 0)
+        workers.start()
+        self.addCleanup(workers.stop)
+
+    def make_modules(self, count, size):
+        for _ in range(count):
+            self.modules_made += 1
+            module = Module.objects.create(
+                code=f'QB{self.modules_made:03}', title='Budget', description='d', instructor=self.instructor
+            )
+            module.students.add(self.student)
+            for i in range(size):
+                ModuleContent.objects.create(
+                    module=module, title=f'c{i}', file=f'module_contents/c{i}.pdf', file_type='pdf',
+                    uploaded_by=self.instructor.user,
+                )
+                ModuleTest.objects.create(
+                    module=module, title=f't{i}', description='d', date=timezone.now(), duration=timedelta(hours=1)
+                )
+                notification = ModuleNotification.objects.create(
+                    module=module, title=f'n{i}', content='x', created_by=self.instructor.user
+                )
+                for j in range(size):
+                    NotificationComment.objects.create(notification=notification, user=self.student.user, text=f'{j}')
+                section = ModuleSection.objects.create(module=module, title=f's{i}', order=i)
+                for j in range(size):
+                    SectionContent.objects.create(
+                        section=section, title=f'{j}', text_content='x', order=j, uploaded_by=self.instructor.user
+                    )
+        return module
+
+
+class ModuleQueryBudgetTests(ModuleFixtureMixin, TestCase):
+    """Serializing modules costs the same number of queries at any size."""
+
+    # modules, contents, notifications, comments, tests, sections, section contents, students
+    LIST_QUERIES = 8
+
+    def get(self, url, auth, queries):
+        # First request warms the cached principal; bumping every module
+        # keeps cached payloads from hiding the real cost
+        self.client.get(url, **auth)
+        bump_module_versions(*Module.objects.values_list('id', flat=True))
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, **auth)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_instructor_list_and_retrieve(self):
+        self.make_modules(1, 1)
+        self.get('/api/modules/instructor/modules/', self.instructor_auth, self.LIST_QUERIES)
+
+        module = self.make_modules(4, 3)
+        response = self.get('/api/modules/instructor/modules/', self.instructor_auth, self.LIST_QUERIES)
+        self.assertEqual(len(response.data), 5)
+        last = response.data[-1]
+        self.assertEqual(last['instructor_name'], 'Ina Structor')
+        self.assertEqual(len(last['notifications'][0]['comments']), 3)
+        self.assertEqual(last['notifications'][0]['module_name'], 'Budget')
+        self.assertEqual(len(last['sections'][0]['contents']), 3)
+        self.assertEqual(last['students'], [self.student.id])
+
+        self.get(f'/api/modules/instructor/modules/{module.id}/', self.instructor_auth, self.LIST_QUERIES)
+
+    def test_student_list_and_notifications(self):
+        self.make_modules(1, 1)
+        # Module ids come from the cached membership; a cache miss loads the full tree
+        self.get('/api/modules/student/modules/', self.student_auth, self.LIST_QUERIES)
+        # One page of the inbox; the unread count is cached
+        self.get('/api/modules/student/modules/notifications/', self.student_auth, 1)
+
+        self.make_modules(3, 3)
+        response = self.get('/api/modules/student/modules/', self.student_auth, self.LIST_QUERIES)
+        self.assertEqual(len(response.data), 4)
+        response = self.get('/api/modules/student/modules/notifications/', self.student_auth, 1)
+        self.assertEqual(len(response.data['results']), 10)
+
+
+class ModuleFieldsetTests(ModuleFixtureMixin, TestCase):
+    url = '/api/modules/instructor/modules/'
+
+    def setUp(self):
+        super().setUp()
+        self.make_modules(3, 2)
+        self.client.get(self.url, **self.instructor_auth)
+
+    def fetch(self, params, auth=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params, **(auth or self.instructor_auth))
+        return response, [q['sql'] for q in queries]
+
+    def test_card_fields_cost_one_query(self):
+        response, queries = self.fetch({'fields': 'code,title,instructor_name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"description"', queries[0])
+        self.assertEqual(set(response.data[0]), {'code', 'title', 'instructor_name'})
+        self.assertEqual(response.data[0]['instructor_name'], 'Ina Structor')
+
+    def test_nested_expand_defers_text_content(self):
+        response, queries = self.fetch({'fields': 'code', 'expand': 'sections.contents'})
+        self.assertEqual(len(queries), 3)
+        self.assertFalse([sql for sql in queries if '"text_content"' in sql])
+        section = response.data[0]['sections'][0]
+        self.assertEqual(len(section['contents']), 2)
+        self.assertNotIn('text_content', section['contents'][0])
+        self.assertNotIn('notifications', response.data[0])
+
+        response, _ = self.fetch({'fields': 'code', 'expand': 'sections.contents.text_content,notifications'})
+        self.assertEqual(response.data[0]['sections'][0]['contents'][0]['text_content'], 'x')
+        self.assertNotIn('comments', response.data[0]['notifications'][0])
+
+    def test_unknown_names_are_rejected(self):
+        self.assertEqual(self.fetch({'fields': 'secret'})[0].status_code, 400)
+        self.assertEqual(self.fetch({'expand': 'sections.files'})[0].status_code, 400)
+
+    def test_student_and_assigned_modules_endpoints(self):
+        self.client.get('/api/modules/student/modules/', **self.student_auth)
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/api/modules/student/modules/', {'fields': 'code', 'expand': 'tests'}, **self.student_auth
+            )
+        self.assertEqual(set(response.data[0]), {'code', 'tests'})
+
+        response = self.client.get(
+            '/api/accounts/instructors/assigned_modules/', {'fields': 'code,title'}, **self.instructor_auth
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(module) for module in response.data], [{'code', 'title'}] * 3)
+
+
+class StudentModuleCacheTests(ModuleFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.module = self.make_modules(2, 2)
+        self.detail = f'/api/modules/student/modules/{self.module.id}/'
+
+    def assertCached(self, url, queries=0):
+        self.client.get(url, **self.student_auth)
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, **self.student_auth)
+        return response
+
+    def test_payloads_are_cached_until_a_child_changes(self):
+        # Warm requests don't touch the database: membership and payloads are cached
+        for url in ['/api/modules/student/modules/', self.detail] + [
+            f'{self.detail}{action}/' for action in ('sections', 'contents', 'announcements')
+        ]:
+            self.assertEqual(self.assertCached(url).status_code, 200)
+
+        notification = self.module.notifications.first()
+        NotificationComment.objects.create(notification=notification, user=self.student.user, text='new')
+        response = self.client.get(self.detail, **self.student_auth)
+        comments = [n for n in response.data['notifications'] if n['id'] == notification.id][0]['comments']
+        self.assertIn('new', [comment['text'] for comment in comments])
+
+        content = SectionContent.objects.filter(section__module=self.module).first()
+        content.title = 'Renamed'
+        content.save()
+        response = self.client.get(f'{self.detail}sections/', **self.student_auth)
+        titles = [c['title'] for section in response.data for c in section['contents']]
+        self.assertIn('Renamed', titles)
+
+    def test_payload_built_before_the_commit_is_not_served_after_it(self):
+        self.assertCached(self.detail)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.module.sections.update(title='Renamed')
+            bump_module_versions(self.module.id)
+            # Cached under the new version, as by a concurrent request that
+            # still reads the old rows
+            stale = self.client.get(self.detail, **self.student_auth)
+        # The commit moves the version on again, past that payload
+        response = self.client.get(self.detail, **self.student_auth)
+        self.assertNotEqual(response['ETag'], stale['ETag'])
+
+    def test_enrollment_changes_invalidate(self):
+        self.assertCached(self.detail)
+        other = Student.objects.create(
+            user=User.objects.create_user(username='S9002', email='s92@GAS.education', role='student'),
+            student_id='S9002',
+        )
+        self.module.students.add(other)
+        response = self.client.get(self.detail, **self.student_auth)
+        self.assertEqual(sorted(response.data['students']), sorted([self.student.id, other.id]))
+
+
+class ConditionalGetTests(ModuleFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.module = self.make_modules(2, 1)
+        self.quiz = Quiz.objects.create(
+            module=self.module, title='Q', description='d', time_limit=timedelta(minutes=10), is_published=True
+        )
+        self.assignment = Assignment.objects.create(
+            module=self.module, title='A', description='d', due_date=timezone.now(), total_marks=10,
+            instructor=self.instructor,
+        )
+        self.submission = AssignmentSubmission.objects.create(assignment=self.assignment, student=self.student)
+
+    def revalidate(self, url, queries):
+        """The first response's ETag comes back as a 304 for ``queries`` queries."""
+        response = self.client.get(url, **self.student_auth)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.student_auth)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        return etag
+
+    def test_module_payloads(self):
+        detail = f'/api/modules/student/modules/{self.module.id}/'
+        etag = self.revalidate(detail, 0)
+        self.revalidate(f'{detail}sections/', 0)
+        self.revalidate('/api/modules/student/modules/', 0)
+
+        response = self.client.get(detail, **self.student_auth)
+        self.assertIn('Last-Modified', response)
+        ModuleSection.objects.create(module=self.module, title='new', order=9)
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag, **self.student_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_quizzes_and_grades(self):
+        quizzes = self.revalidate('/api/modules/student/quizzes/', 1)
+        grades = self.revalidate('/api/modules/student/grades/', 1)
+
+        self.submission.grade = 7
+        self.submission.save()
+        response = self.client.get('/api/modules/student/grades/', HTTP_IF_NONE_MATCH=grades, **self.student_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[-1]['assignments'][0]['grade'], 7)
+
+        self.quiz.title = 'Renamed'
+        self.quiz.save()
+        response = self.client.get('/api/modules/student/quizzes/', HTTP_IF_NONE_MATCH=quizzes, **self.student_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['quizzes'][0]['title'], 'Renamed')
+
+
+class StudentInboxTests(ModuleFixtureMixin, TestCase):
+    url = '/api/modules/student/modules/notifications/'
+
+    def setUp(self):
+        super().setUp()
+        self.module = self.make_modules(1, 0)
+
+    def post(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                f'/api/modules/instructor/modules/{self.module.id}/notifications/',
+                {'title': title, 'content': 'x'}, **self.instructor_auth
+            )
+
+    def read(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'{self.url[:-1]}-read/', data, content_type='application/json', **self.student_auth)
+
+    def test_posting_fans_out_and_pages_newest_first(self):
+        for i in range(5):
+            self.assertEqual(self.post(f'n{i}').status_code, 201)
+
+        response = self.client.get(self.url, {'page_size': 2}, **self.student_auth)
+        self.assertEqual(response.data['unread'], 5)
+        titles = [row['title'] for row in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'], **self.student_auth)
+            titles += [row['title'] for row in response.data['results']]
+        self.assertEqual(titles, ['n4', 'n3', 'n2', 'n1', 'n0'])
+        self.assertEqual(response.data['results'][0]['module_name'], 'Budget')
+        self.assertEqual(self.client.get(self.url, {'cursor': 'junk'}, **self.student_auth).status_code, 400)
+        from lms_backend.pagination import encode_cursor
+        cursor = encode_cursor(['not a date', 'abc'])
+        self.assertEqual(self.client.get(self.url, {'cursor': cursor}, **self.student_auth).status_code, 400)
+
+    def test_read_state_and_unread_count(self):
+        first = self.post('first').data['id']
+        self.post('second')
+        response = self.read({'ids': [first]})
+        self.assertEqual(response.data, {'updated': 1, 'unread': 1})
+
+        # The count is cached again by the first feed read after the commit
+        self.client.get(self.url, **self.student_auth)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, **self.student_auth)
+        self.assertEqual([row['is_read'] for row in response.data['results']], [False, True])
+
+        self.post('third')
+        self.assertEqual(self.client.get(self.url, **self.student_auth).data['unread'], 2)
+        response = self.read({})
+        self.assertEqual(response.data, {'updated': 2, 'unread': 0})
+
+    def test_count_cached_before_commit_is_dropped(self):
+        from django.core.cache import cache
+        from . import inbox
+        self.assertEqual(inbox.unread_count(self.student.id), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            ModuleNotification.objects.create(module=self.module, title='t', content='x', created_by=self.instructor.user)
+            # What a concurrent request reading before the commit would cache
+            cache.set(inbox._unread_key(self.student.id), 0)
+        self.assertEqual(inbox.unread_count(self.student.id), 1)
+
+    def test_edit_and_delete(self):
+        url = f'/api/modules/instructor/modules/{self.module.id}/notifications/'
+        notification_id = self.post('draft').data['id']
+        response = self.client.put(
+            url, {'id': notification_id, 'title': 'final'}, content_type='application/json', **self.instructor_auth
+        )
+        self.assertEqual((response.status_code, response.data['title']), (200, 'final'))
+        self.assertEqual([row['title'] for row in self.client.get(self.url, **self.student_auth).data['results']], ['final'])
+
+        other = Module.objects.create(code='QB900', title='Other', description='d', instructor=self.instructor)
+        response = self.client.delete(
+            f'/api/modules/instructor/modules/{other.id}/notifications/?id={notification_id}', **self.instructor_auth
+        )
+        self.assertEqual(response.status_code, 404)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'{url}?id={notification_id}', **self.instructor_auth)
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get(self.url, **self.student_auth)
+        self.assertEqual((response.data['results'], response.data['unread']), ([], 0))
+
+    def test_enrollment_delivers_and_withdraws(self):
+        self.post('before')
+        other = Student.objects.create(
+            user=User.objects.create_user(username='S9002', email='s92@GAS.education', role='student'),
+            student_id='S9002',
+        )
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(other.user)}'}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.module.students.add(other)
+        response = self.client.get(self.url, **auth)
+        self.assertEqual([row['title'] for row in response.data['results']], ['before'])
+        self.assertEqual(response.data['unread'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.enrolled_modules.clear()
+        response = self.client.get(self.url, **auth)
+        self.assertEqual((response.data['results'], response.data['unread']), ([], 0))
+
+
+    def test_students_comment_on_notifications(self):
+        notification_id = self.post('question time').data['id']
+        url = f'/api/modules/student/modules/{self.module.id}/add_comment/'
+        response = self.client.post(url, {'notification_id': notification_id, 'text': 'When?'}, **self.student_auth)
+        self.assertEqual((response.status_code, response.data['text']), (201, 'When?'))
+        self.assertEqual(NotificationComment.objects.get().notification_id, notification_id)
+
+        other = Module.objects.create(code='QB901', title='Other', description='d', instructor=self.instructor)
+        elsewhere = ModuleNotification.objects.create(module=other, title='t', content='x', created_by=self.instructor.user)
+        response = self.client.post(url, {'notification_id': elsewhere.id, 'text': 'Hi'}, **self.student_auth)
+        self.assertEqual(response.status_code, 404)
+
+
+class StudentEventStreamTests(ModuleFixtureMixin, TestCase):
+    url = '/api/modules/student/events/'
+
+    def setUp(self):
+        super().setUp()
+        self.module = self.make_modules(1, 0)
+        self.token = self.student_auth['HTTP_AUTHORIZATION'].split()[1]
+
+    def committed(self, create):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create()
+
+    async def next_event(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+        return fields['event'], json.loads(fields['data'])
+
+    async def test_notifications_comments_and_grades_are_pushed(self):
+        response = await self.async_client.get(self.url, {'token': self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        notification = await sync_to_async(self.committed)(lambda: ModuleNotification.objects.create(
+            module=self.module, title='Exam moved', content='x', created_by=self.instructor.user
+        ))
+        event, data = await self.next_event(stream)
+        self.assertEqual((event, data['title'], data['module_id']), ('notification', 'Exam moved', self.module.id))
+
+        await sync_to_async(self.committed)(lambda: NotificationComment.objects.create(
+            notification=notification, user=self.instructor.user, text='Room 4'
+        ))
+        event, data = await self.next_event(stream)
+        self.assertEqual((event, data['text'], data['notification_id']), ('comment', 'Room 4', notification.id))
+
+        def grade():
+            assignment = Assignment.objects.create(
+                module=self.module, title='A', description='d', due_date=timezone.now(), total_marks=10,
+                instructor=self.instructor,
+            )
+            AssignmentSubmission.objects.create(assignment=assignment, student=self.student, grade=9)
+
+        await sync_to_async(self.committed)(grade)
+        event, data = await self.next_event(stream)
+        self.assertEqual((event, data['kind'], data['grade']), ('grade', 'assignment', 9))
+        await stream.aclose()
+
+    async def test_requires_a_student_token(self):
+        self.assertEqual((await self.async_client.get(self.url)).status_code, 401)
+        self.assertEqual((await self.async_client.get(self.url, {'token': 'junk'})).status_code, 401)
+        token = self.instructor_auth['HTTP_AUTHORIZATION'].split()[1]
+        self.assertEqual((await self.async_client.get(self.url, {'token': token})).status_code, 403)
+
+
+class ProgressDashboardTests(ModuleFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.make_modules(1, 4)
+        self.second = self.make_modules(1, 2)
+        self.classmate = Student.objects.create(
+            user=User.objects.create_user(username='S9002', email='s92@GAS.education', role='student'),
+            student_id='S9002',
+        )
+        self.first.students.add(self.classmate)
+        self.contents = list(self.first.contents.order_by('position'))
+        for content in self.contents[:2]:
+            mark_complete(self.student.id, self.first.id, content.position)
+        for content in self.contents:
+            mark_complete(self.classmate.id, self.first.id, content.position)
+        self.client.get('/api/modules/student/modules/', **self.student_auth)
+
+    def test_dashboard_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/modules/student/modules/dashboard/', **self.student_auth)
+        first, second = response.data['modules']
+        self.assertEqual(
+            (first['module_id'], first['total_contents'], first['completed_contents'], first['progress_percentage']),
+            (self.first.id, 4, 2, 50.0),
+        )
+        # (2 + 4 completed) / (4 contents * 2 students)
+        self.assertEqual(first['cohort_average'], 75.0)
+        self.assertIsNotNone(first['last_accessed'])
+        self.assertEqual((second['completed_contents'], second['last_accessed']), (0, None))
+        self.assertEqual(response.data['overall'], {
+            'total_contents': 6, 'completed_contents': 2, 'progress_percentage': 33.33,
+        })
+
+    def test_single_module_progress(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/modules/student/modules/{self.first.id}/progress/', **self.student_auth)
+        self.assertEqual(response.data['progress_percentage'], 50.0)
+        other = Module.objects.create(code='QB999', title='x', description='d', instructor=self.instructor)
+        response = self.client.get(f'/api/modules/student/modules/{other.id}/progress/', **self.student_auth)
+        self.assertEqual(response.status_code, 404)
+
+    def test_mark_content_complete_sets_a_bit(self):
+        url = f'/api/modules/student/modules/{self.first.id}/mark_content_complete/'
+        response = self.client.patch(
+            url, {'content_id': self.contents[3].id}, content_type='application/json', **self.student_auth
+        )
+        self.assertEqual(response.data['progress'], {'total_contents': 4, 'completed_contents': 3})
+        # Idempotent
+        response = self.client.patch(
+            url, {'content_id': self.contents[3].id}, content_type='application/json', **self.student_auth
+        )
+        self.assertEqual(response.data['progress']['completed_contents'], 3)
+        response = self.client.patch(
+            url, {'content_id': self.second.contents.first().id}, content_type='application/json', **self.student_auth
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_heatmap_and_content_deletion(self):
+        url = f'/api/modules/instructor/modules/{self.first.id}/heatmap/'
+        self.client.get(url, **self.instructor_auth)
+        with self.assertNumQueries(3):
+            response = self.client.get(url, **self.instructor_auth)
+        self.assertEqual([c['id'] for c in response.data['contents']], [c.id for c in self.contents])
+        matrix = {row['student_id']: row['completion'] for row in response.data['students']}
+        self.assertEqual(matrix, {self.student.id: [1, 1, 0, 0], self.classmate.id: [1, 1, 1, 1]})
+
+        # The deleted content's bit is cleared, so counts stay exact and a new
+        # content (next position) starts out incomplete
+        self.contents[0].delete()
+        ModuleContent.objects.create(
+            module=self.first, title='new', file='module_contents/new.pdf', file_type='pdf',
+            uploaded_by=self.instructor.user,
+        )
+        response = self.client.get(url, **self.instructor_auth)
+        rows = {row['student_id']: row for row in response.data['students']}
+        self.assertEqual(rows[self.student.id]['completion'], [1, 0, 0, 0])
+        self.assertEqual(rows[self.classmate.id]['completed_contents'], 3)
+        self.assertEqual(rows[self.classmate.id]['progress_percentage'], 75.0)
+
+
+class EnrollmentMembershipTests(ModuleFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.module = self.make_modules(1, 1)
+        self.url = f'/api/modules/student/modules/{self.module.id}/tests/'
+
+    def test_checks_are_cached_and_follow_enrollment(self):
+        self.client.get(self.url, **self.student_auth)
+        # Only the tests themselves
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url, **self.student_auth).status_code, 200)
+
+        self.module.students.remove(self.student)
+        self.assertEqual(self.client.get(self.url, **self.student_auth).status_code, 404)
+        self.student.enrolled_modules.add(self.module)
+        self.assertEqual(self.client.get(self.url, **self.student_auth).status_code, 200)
+        self.student.enrolled_modules.clear()
+        self.assertEqual(self.client.get(self.url, **self.student_auth).status_code, 404)
+
+    def test_changes_from_other_workers_are_seen_after_the_local_timeout(self):
+        from . import membership
+        self.assertEqual(self.client.get(self.url, **self.student_auth).status_code, 200)
+        # No signal, as when another process made the change
+        ModuleEnrollment.objects.filter(student=self.student)._raw_delete(connection.alias)
+        self.assertEqual(self.client.get(self.url, **self.student_auth).status_code, 200)
+
+        later = membership.MEMBERSHIP_LOCAL_CACHE_TIMEOUT + 1
+        with mock.patch('time.monotonic', return_value=time.monotonic() + later), \
+                mock.patch('time.time', return_value=time.time() + later):
+            self.assertEqual(self.client.get(self.url, **self.student_auth).status_code, 404)
+        ModuleEnrollment.objects.create(student=self.student, module=self.module)
+        self.assertEqual(self.client.get(self.url, **self.student_auth).status_code, 200)
+
+    def test_deactivated_modules_are_left_out(self):
+        self.client.get(self.url, **self.student_auth)
+        self.module.is_active = False
+        self.module.save()
+        self.assertEqual(self.client.get(self.url, **self.student_auth).status_code, 404)
+        self.assertEqual(self.client.get('/api/modules/student/modules/', **self.student_auth).data, [])
+
+
+class BulkRosterTests(ModuleFixtureMixin, TestCase):
+    url = '/api/modules/instructor/modules/roster/'
+
+    def setUp(self):
+        super().setUp()
+        self.module = self.make_modules(1, 1)
+        self.cohort = [
+            Student.objects.create(
+                user=User.objects.create_user(username=f'S95{i:02}', email=f's95{i:02}@GAS.education', role='student'),
+                student_id=f'S95{i:02}', batch='2024', program='BIT',
+            )
+            for i in range(3)
+        ]
+
+    def post(self, data, **extra):
+        return self.client.post(self.url, data, **self.instructor_auth, **extra)
+
+    def test_csv_and_selectors_enroll_once(self):
+        csv_file = SimpleUploadedFile('roster.csv', b'Student_ID,name\nS9500,a\nS9501,b\nNOPE,c\n')
+        response = self.post({'module_ids': [self.module.id], 'action': 'add', 'file': csv_file})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'students': 2, 'enrolled': 2, 'removed': 0})
+
+        response = self.post(
+            {'module_ids': [self.module.id], 'action': 'add', 'batch': '2024', 'program': 'BIT'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.data, {'students': 3, 'enrolled': 1, 'removed': 0})
+        self.assertEqual(ModuleEnrollment.objects.filter(module=self.module).count(), 4)
+        # Skipped signals' side effects: inbox and membership
+        student_auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.cohort[2].user)}'}
+        response = self.client.get('/api/modules/student/modules/notifications/', **student_auth)
+        self.assertEqual(response.data['unread'], 1)
+        response = self.client.get(f'/api/modules/student/modules/{self.module.id}/tests/', **student_auth)
+        self.assertEqual(response.status_code, 200)
+
+    def test_remove_is_one_delete(self):
+        roster.enroll([self.module.id], [s.pk for s in self.cohort])
+        student_auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.cohort[0].user)}'}
+        tests_url = f'/api/modules/student/modules/{self.module.id}/tests/'
+        self.assertEqual(self.client.get(tests_url, **student_auth).status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(
+                {'module_ids': [self.module.id], 'action': 'remove', 'student_ids': [s.pk for s in self.cohort]},
+                content_type='application/json',
+            )
+        self.assertEqual(response.data['removed'], 3)
+        deletes = [q['sql'] for q in queries if q['sql'].startswith('DELETE') and 'courses_moduleenrollment' in q['sql']]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(self.client.get(tests_url, **student_auth).status_code, 404)
+        self.assertTrue(ModuleEnrollment.objects.filter(module=self.module, student=self.student).exists())
+
+    def test_rejects_other_modules_and_empty_selection(self):
+        other = Instructor.objects.create(
+            user=User.objects.create_user(username='I9002', email='i92@GAS.education', role='instructor'),
+            employee_id='I9002', department='IT', designation='Lecturer',
+        )
+        foreign = Module.objects.create(code='QX001', title='x', description='d', instructor=other)
+        response = self.post(
+            {'module_ids': [foreign.id], 'action': 'add', 'batch': '2024'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.post({'module_ids': [self.module.id], 'action': 'add'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            self.url, {'module_ids': [self.module.id], 'action': 'add', 'batch': '2024'},
+            content_type='application/json', **self.student_auth,
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_module_serializer_sets_roster(self):
+        response = self.client.patch(
+            f'/api/modules/instructor/modules/{self.module.id}/', {'students': [self.cohort[0].pk]},
+            content_type='application/json', **self.instructor_auth,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['students'], [self.cohort[0].pk])
+        response = self.client.patch(
+            f'/api/modules/instructor/modules/{self.module.id}/', {'students': [999999]},
+            content_type='application/json', **self.instructor_auth,
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkRosterJobTests(ModuleFixtureMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.module = self.make_modules(1, 0)
+        for i in range(4):
+            Student.objects.create(
+                user=User.objects.create_user(username=f'S96{i:02}', email=f's96{i:02}@GAS.education', role='student'),
+                student_id=f'S96{i:02}', batch='2025',
+            )
+
+    def post(self, action):
+        return self.client.post(
+            '/api/modules/instructor/modules/roster/',
+            {'module_ids': [self.module.id], 'action': action, 'batch': '2025', 'background': True},
+            content_type='application/json', **self.instructor_auth,
+        )
+
+    def test_job_reports_progress(self):
+        module = self.module
+        # As with a shared cache
+        with mock.patch.object(roster, 'jobs_available', return_value=True):
+            response = self.post('add')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['total'], 4)
+        url = f'/api/modules/instructor/modules/roster/jobs/{response.data["id"]}/'
+
+        for _ in range(100):
+            job = self.client.get(url, **self.instructor_auth).data
+            if job['status'] in ('done', 'failed'):
+                break
+            time.sleep(0.05)
+        self.assertEqual(job['status'], 'done', job['error'])
+        self.assertEqual((job['processed'], job['enrolled']), (4, 4))
+        self.assertEqual(ModuleEnrollment.objects.filter(module=module).count(), 5)
+        self.assertEqual(self.client.get(url, **self.student_auth).status_code, 404)
+
+    def test_changes_run_in_the_request_without_a_shared_cache(self):
+        response = self.post('add')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['students'], response.data['enrolled']), (4, 4))
+
+    def test_removing_everyone_reports_progress(self):
+        roster.enroll([self.module.id], list(Student.objects.values_list('pk', flat=True)))
+        updates = []
+        removed = roster.unenroll([self.module.id], progress=lambda **counts: updates.append(counts))
+        self.assertEqual(removed, 5)
+        self.assertEqual(updates, [{'processed': 5, 'removed': 5}])
+
+
+class ChunkedUploadTests(ModuleFixtureMixin, TestCase):
+    url = '/api/modules/instructor/uploads/'
+
+    def setUp(self):
+        super().setUp()
+        self.module = self.make_modules(1, 0)
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        media = override_settings(
+            MEDIA_ROOT=os.path.join(self.tmp, 'media'), UPLOAD_SESSION_DIR=os.path.join(self.tmp, 'partial')
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+        self.data = os.urandom(2 * uploads.UPLOAD_MIN_CHUNK_SIZE + 1000)
+
+    def start(self, **fields):
+        response = self.client.post(self.url, {
+            'module': self.module.id, 'title': 'Lecture 1', 'file_name': '../lecture 1.mp4',
+            'size': len(self.data), 'chunk_size': uploads.UPLOAD_MIN_CHUNK_SIZE,
+            'sha256': hashlib.sha256(self.data).hexdigest(), **fields,
+        }, content_type='application/json', **self.instructor_auth)
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def put_chunk(self, session, index, body=None, **headers):
+        start = index * uploads.UPLOAD_MIN_CHUNK_SIZE
+        body = self.data[start:start + uploads.UPLOAD_MIN_CHUNK_SIZE] if body is None else body
+        return self.client.put(
+            f'{self.url}{session["id"]}/chunks/{index}/', body,
+            content_type='application/octet-stream', **headers, **self.instructor_auth,
+        )
+
+    def test_out_of_order_resumable_upload(self):
+        session = self.start()
+        self.assertEqual((session['chunk_count'], session['missing']), (3, [0, 1, 2]))
+        self.assertEqual(session['file_name'], 'lecture_1.mp4')
+
+        self.assertEqual(self.put_chunk(session, 2).status_code, 200)
+        response = self.put_chunk(session, 0, HTTP_X_CHUNK_SHA256='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.put_chunk(session, 1, body=b'short').status_code, 400)
+        self.assertEqual(self.put_chunk(session, 3).status_code, 400)
+
+        response = self.client.get(f'{self.url}{session["id"]}/', **self.instructor_auth)
+        self.assertEqual(response.data['missing'], [0, 1])
+        response = self.client.post(f'{self.url}{session["id"]}/finalize/', **self.instructor_auth)
+        self.assertEqual(response.status_code, 400)
+
+        chunk = self.data[:uploads.UPLOAD_MIN_CHUNK_SIZE]
+        response = self.put_chunk(session, 0, HTTP_X_CHUNK_SHA256=hashlib.sha256(chunk).hexdigest())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.put_chunk(session, 1).status_code, 200)
+        response = self.client.post(f'{self.url}{session["id"]}/finalize/', **self.instructor_auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['sha256'], hashlib.sha256(self.data).hexdigest())
+
+        content = ModuleContent.objects.get(pk=response.data['id'])
+        self.assertEqual((content.title, content.file_type, content.uploaded_by), ('Lecture 1', 'mp4', self.instructor.user))
+        with content.file.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.tmp, 'partial')), [])
+        response = self.client.post(f'{self.url}{session["id"]}/finalize/', **self.instructor_auth)
+        self.assertEqual(response.status_code, 404)
+
+    def test_repeated_finalize_is_rejected(self):
+        session = self.start()
+        for index in range(3):
+            self.put_chunk(session, index)
+        # Loaded before either finalize commits, as by two concurrent requests
+        first, second = UploadSession.objects.get(pk=session['id']), UploadSession.objects.get(pk=session['id'])
+        uploads.finalize(first)
+        with self.assertRaisesMessage(uploads.UploadError, 'already been finalized'):
+            uploads.finalize(second)
+        self.assertEqual(ModuleContent.objects.filter(module=self.module).count(), 1)
+
+    def test_section_upload_and_checksum_mismatch(self):
+        section = ModuleSection.objects.create(module=self.module, title='Week 1')
+        session = self.start(section=section.id, sha256='f' * 64, file_type='video')
+        for index in range(3):
+            self.put_chunk(session, index)
+        response = self.client.post(f'{self.url}{session["id"]}/finalize/', **self.instructor_auth)
+        self.assertEqual(response.status_code, 400)
+
+        UploadSession.objects.filter(pk=session['id']).update(sha256='')
+        response = self.client.post(f'{self.url}{session["id"]}/finalize/', **self.instructor_auth)
+        self.assertEqual(response.status_code, 201)
+        content = SectionContent.objects.get(pk=response.data['id'])
+        self.assertEqual((content.section, content.file_type), (section, 'video'))
+
+    def test_only_own_modules_and_sessions(self):
+        other = Module.objects.create(code='QX002', title='x', description='d', instructor=Instructor.objects.create(
+            user=User.objects.create_user(username='I9003', email='i93@GAS.education', role='instructor'),
+            employee_id='I9003', department='IT', designation='Lecturer',
+        ))
+        response = self.client.post(self.url, {
+            'module': other.id, 'title': 't', 'file_name': 'a.pdf', 'size': 10,
+        }, content_type='application/json', **self.instructor_auth)
+        self.assertEqual(response.status_code, 400)
+
+        session = self.start()
+        other_auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(other.instructor.user)}'}
+        response = self.client.get(f'{self.url}{session["id"]}/', **other_auth)
+        self.assertEqual(response.status_code, 404)
+        response = self.client.delete(f'{self.url}{session["id"]}/', **self.instructor_auth)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(os.listdir(os.path.join(self.tmp, 'partial')), [])
+
+
+class MediaDeliveryTests(ModuleFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        media_root = override_settings(MEDIA_ROOT=self.tmp)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.module = self.make_modules(1, 0)
+        self.content = ModuleContent(
+            module=self.module, title='Slides', file_type='pdf', uploaded_by=self.instructor.user
+        )
+        self.content.file.save('slides.pdf', ContentFile(b'0123456789'))
+        self.url = f'/media/{self.content.file.name}'
+        self.outsider = Student.objects.create(
+            user=User.objects.create_user(username='S9700', email='s97@GAS.education', role='student'),
+            student_id='S9700',
+        )
+        self.outsider_auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.outsider.user)}'}
+
+    def fetch(self, url, **extra):
+        response = self.client.get(url, **extra)
+        if response.streaming:
+            response.body = b''.join(response.streaming_content)
+            response.close()
+        return response
+
+    def test_serialized_file_urls_open_without_a_header(self):
+        section = ModuleSection.objects.create(module=self.module, title='Week 1')
+        section_content = SectionContent(section=section, title='Notes', file_type='pdf', uploaded_by=self.instructor.user)
+        section_content.file.save('notes.pdf', ContentFile(b'section notes'))
+        contents = self.client.get(f'/api/modules/student/modules/{self.module.id}/contents/', **self.student_auth)
+        sections = self.client.get(f'/api/modules/student/modules/{self.module.id}/sections/', **self.student_auth)
+        for url, body in (
+            (contents.data[0]['file_url'], b'0123456789'),
+            (sections.data[0]['contents'][0]['file'], b'section notes'),
+        ):
+            with self.subTest(url=url):
+                self.assertIn('?sig=', url)
+                response = self.fetch(url)
+                self.assertEqual((response.status_code, response.body), (200, body))
+        self.assertEqual(self.fetch(self.url).status_code, 401)
+
+    def test_dot_segments_are_not_served(self):
+        name = self.content.file.name
+        for url in (
+            f'/media/./{name}',
+            f'/media/profile_pics/%2e%2e/{name}',
+            f'/media/profile_pics/../{name}',
+            f'/media/module_contents//{name.rsplit("/", 1)[1]}',
+            f'/media//{name}',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.fetch(url).status_code, 404)
+                self.assertEqual(self.fetch(url, **self.outsider_auth).status_code, 404)
+
+    def test_blobs_only_served_under_protected_names(self):
+        basename = self.content.file.name.rsplit('/', 1)[1]
+        blob_name = content_storage().blob_name(self.content.file.name)
+        for url in (
+            f'/media/profile_pics/{basename}',
+            f'/media/profile_pics/{basename}.w320.jpg',
+            f'/media/{blob_name}',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.fetch(url).status_code, 404)
+        # Blob URLs are not even signable
+        self.assertEqual(self.fetch(media.signed_url(blob_name)).status_code, 404)
+
+    def test_checked_then_signed(self):
+        self.assertEqual(self.fetch(self.url).status_code, 401)
+        self.assertEqual(self.fetch(self.url, **self.outsider_auth).status_code, 403)
+        self.assertEqual(self.fetch('/media/module_contents/nope.pdf', **self.student_auth).status_code, 404)
+
+        response = self.fetch(self.url, **self.instructor_auth)
+        self.assertEqual(response.status_code, 302)
+        signed = self.fetch(self.url, **self.student_auth)['Location']
+        self.assertTrue(signed.startswith(self.url + '?sig='))
+        with self.assertNumQueries(0):
+            response = self.fetch(signed)
+        self.assertEqual((response.status_code, response.body), (200, b'0123456789'))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(b"0123456789").hexdigest()}"')
+        self.assertEqual(self.fetch(signed, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.fetch(signed + 'x').status_code, 403)
+        other = media.signed_url('module_contents/other.pdf').split('?')[1]
+        self.assertEqual(self.fetch(f'{self.url}?{other}').status_code, 403)
+
+    def test_range_requests(self):
+        signed = media.signed_url(self.content.file.name)
+        response = self.fetch(signed, HTTP_RANGE='bytes=2-5')
+        self.assertEqual((response.status_code, response.body), (206, b'2345'))
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 2-5/10', '4'))
+        self.assertEqual(self.fetch(signed, HTTP_RANGE='bytes=-3').body, b'789')
+        self.assertEqual(self.fetch(signed, HTTP_RANGE='bytes=8-').body, b'89')
+        response = self.fetch(signed, HTTP_RANGE='bytes=20-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+        # Stale If-Range: the whole (changed) file
+        response = self.fetch(signed, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='Thu, 01 Jan 2015 00:00:00 GMT')
+        self.assertEqual((response.status_code, response.body), (200, b'0123456789'))
+
+    def test_front_server_offload(self):
+        signed = media.signed_url(self.content.file.name)
+        with mock.patch.object(media, 'MEDIA_ACCEL', 'x-accel-redirect'):
+            response = self.fetch(signed)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{content_storage().blob_name(self.content.file.name)}')
+        self.assertEqual(response.content, b'')
+        with mock.patch.object(media, 'MEDIA_ACCEL', 'x-sendfile'):
+            response = self.fetch(signed)
+        self.assertEqual(response['X-Sendfile'], self.content.file.path)
+
+    def test_submissions_and_public_files(self):
+        assignment = Assignment.objects.create(
+            title='A1', description='d', due_date=timezone.now(), total_marks=10, instructor=self.instructor,
+            module=self.module,
+        )
+        submission = AssignmentSubmission(assignment=assignment, student=self.student)
+        submission.submitted_file.save('answer.pdf', ContentFile(b'answer'))
+        url = f'/media/{submission.submitted_file.name}'
+        self.assertEqual(self.fetch(url, **self.student_auth).status_code, 302)
+        self.assertEqual(self.fetch(url, **self.instructor_auth).status_code, 302)
+        self.assertEqual(self.fetch(url, **self.outsider_auth).status_code, 403)
+
+        os.makedirs(os.path.join(self.tmp, 'profile_pics'))
+        with open(os.path.join(self.tmp, 'profile_pics', 'me.png'), 'wb') as f:
+            f.write(b'png')
+        self.assertEqual(self.fetch('/media/profile_pics/me.png').body, b'png')
+
+
+class ContentAddressedStorageTests(ModuleFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        media_root = override_settings(MEDIA_ROOT=self.tmp)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.module = self.make_modules(1, 0)
+        self.section = ModuleSection.objects.create(module=self.module, title='Week 1')
+
+    def upload(self, model, name, data, **fields):
+        owner = {'module': self.module} if model is ModuleContent else {'section': self.section}
+        content = model(title=name, file_type='pdf', uploaded_by=self.instructor.user, **owner, **fields)
+        with self.captureOnCommitCallbacks(execute=True):
+            content.file.save(name, ContentFile(data))
+        return content
+
+    def blob_files(self):
+        return [name for _, _, names in os.walk(os.path.join(self.tmp, 'blobs')) for name in names]
+
+    def test_equal_files_are_stored_once(self):
+        digest = hashlib.sha256(b'syllabus').hexdigest()
+        first = self.upload(ModuleContent, 'Syllabus.PDF', b'syllabus')
+        second = self.upload(SectionContent, 'syllabus (1).pdf', b'syllabus')
+        self.assertEqual(first.file.name, f'module_contents/{digest}.pdf')
+        self.assertEqual(second.file.name, f'section_contents/{digest}.pdf')
+        self.assertEqual(self.blob_files(), [f'{digest}.pdf'])
+        self.assertEqual(StoredBlob.objects.get().refs, 2)
+        with second.file.open('rb') as f:
+            self.assertEqual(f.read(), b'syllabus')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(StoredBlob.objects.get().refs, 1)
+        self.assertEqual(len(self.blob_files()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertEqual(self.blob_files(), [])
+
+    def test_reupload_releases_the_old_file(self):
+        content = self.upload(SectionContent, 'v1.pdf', b'version 1')
+        content.file = SimpleUploadedFile('v2.pdf', b'version 2')
+        with self.captureOnCommitCallbacks(execute=True):
+            content.save()
+        self.assertEqual(list(StoredBlob.objects.values_list('refs', flat=True)), [1])
+        self.assertEqual(self.blob_files(), [f'{hashlib.sha256(b"version 2").hexdigest()}.pdf'])
+
+    def test_dedupe_media_moves_legacy_files(self):
+        os.makedirs(os.path.join(self.tmp, 'module_contents'))
+        for name in ('a.pdf', 'a_x1y2z3.pdf'):
+            with open(os.path.join(self.tmp, 'module_contents', name), 'wb') as f:
+                f.write(b'same slides')
+        for name in ('a.pdf', 'a.pdf', 'a_x1y2z3.pdf', 'gone.pdf'):
+            ModuleContent.objects.create(
+                module=self.module, title=name, file=f'module_contents/{name}', file_type='pdf',
+                uploaded_by=self.instructor.user,
+            )
+        call_command('dedupe_media', stdout=io.StringIO())
+
+        digest = hashlib.sha256(b'same slides').hexdigest()
+        names = ModuleContent.objects.filter(module=self.module).values_list('file', flat=True)
+        self.assertEqual(set(names), {'module_contents/gone.pdf', f'module_contents/{digest}.pdf'})
+        self.assertEqual(StoredBlob.objects.get().refs, 3)
+        self.assertEqual(os.listdir(os.path.join(self.tmp, 'module_contents')), [])
+        self.assertEqual(self.blob_files(), [f'{digest}.pdf'])
+
+
+class PreviewGenerationTests(ModuleFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        media_root = override_settings(MEDIA_ROOT=self.tmp)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.module = self.make_modules(1, 0)
+        self.section = ModuleSection.objects.create(module=self.module, title='Week 1')
+
+    def png(self, width, height):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (width, height), (200, 10, 10, 128)).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def upload(self, model, name, data):
+        owner = {'module': self.module} if model is ModuleContent else {'section': self.section}
+        content = model(title=name, file_type=name.rsplit('.', 1)[-1], uploaded_by=self.instructor.user, **owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            content.file.save(name, ContentFile(data))
+        content.refresh_from_db()
+        return content
+
+    def test_image_thumbnail_and_renditions(self):
+        content = self.upload(ModuleContent, 'diagram.png', self.png(700, 350))
+        self.assertEqual(content.previews['status'], 'ready')
+        self.assertEqual(sorted(content.previews['renditions']), ['320', '640'])
+        with Image.open(content.file.storage.path(content.previews['thumbnail'])) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ('JPEG', (160, 80)))
+        with Image.open(content.file.storage.path(content.previews['renditions']['640'])) as rendition:
+            self.assertEqual(rendition.size, (640, 320))
+
+        response = self.client.get(f'/api/modules/instructor/modules/{self.module.id}/contents/', **self.instructor_auth)
+        urls = response.data[0]['previews']
+        thumbnail = f'http://testserver/media/{content.file.name}.thumb.jpg'
+        self.assertTrue(urls['thumbnail'].startswith(f'{thumbnail}?sig='))
+        # Signed, so an <img> loads it without the Authorization header
+        response = self.client.get(urls['thumbnail'])
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/jpeg'))
+        response.close()
+        # Unsigned, served like the original to whoever may see it
+        self.assertEqual(self.client.get(thumbnail).status_code, 401)
+        self.assertEqual(self.client.get(thumbnail, **self.student_auth).status_code, 302)
+
+    def test_cached_payloads_are_rebuilt_before_their_signatures_expire(self):
+        content = self.upload(ModuleContent, 'diagram.png', self.png(200, 100))
+        url = f'/api/modules/student/modules/{self.module.id}/contents/'
+        first = self.client.get(url, **self.student_auth)
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'], **self.student_auth)
+        self.assertEqual(again.status_code, 304)
+
+        window = media.signing_window()
+        with mock.patch.object(media, 'signing_window', return_value=window + 1):
+            later = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'], **self.student_auth)
+        self.assertEqual(later.status_code, 200)
+        self.assertNotEqual(later.data[0]['previews']['thumbnail'], first.data[0]['previews']['thumbnail'])
+        self.assertIn(f'{content.file.name}.thumb.jpg?sig=', later.data[0]['previews']['thumbnail'])
+
+    def test_text_excerpt_and_shared_files(self):
+        text = 'Week one:   read chapters 1-3.\n' * 40
+        first = self.upload(SectionContent, 'notes.txt', text.encode())
+        self.assertTrue(first.previews['excerpt'].startswith('Week one: read chapters 1-3. Week one:'))
+        self.assertLessEqual(len(first.previews['excerpt']), previews.PREVIEW_EXCERPT_LENGTH + 1)
+
+        with mock.patch.object(previews, 'build', side_effect=AssertionError('built twice')):
+            second = self.upload(SectionContent, 'notes-copy.txt', text.encode())
+        self.assertEqual(second.previews, first.previews)
+
+    def test_derivatives_go_with_the_blob(self):
+        content = self.upload(SectionContent, 'photo.png', self.png(100, 100))
+        self.assertEqual(content.previews['renditions'], {'100': f'{content.file.name}.w100.jpg'})
+        blob_dir = os.path.dirname(content.file.path)
+        self.assertEqual(len(os.listdir(blob_dir)), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            content.delete()
+        self.assertEqual(os.listdir(blob_dir), [])
+
+    def test_backfill_command(self):
+        os.makedirs(os.path.join(self.tmp, 'module_contents'))
+        with open(os.path.join(self.tmp, 'module_contents', 'old.png'), 'wb') as f:
+            f.write(self.png(50, 40))
+        content = ModuleContent.objects.create(
+            module=self.module, title='old', file='module_contents/old.png', file_type='png',
+            uploaded_by=self.instructor.user,
+        )
+        ModuleContent.objects.filter(pk=content.pk).update(previews={})
+        call_command('generate_previews', stdout=io.StringIO())
+        content.refresh_from_db()
+        self.assertEqual(content.previews['thumbnail'], 'module_contents/old.png.thumb.jpg')
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, 'module_contents', 'old.png.thumb.jpg')))
+
+
+class ContentSearchTests(ModuleFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.module = self.make_modules(1, 0)
+        self.other = Module.objects.create(code='QB900', title='Other', description='d')
+        self.section = ModuleSection.objects.create(
+            module=self.module, title='Week 1', description='Plants and photosynthesis'
+        )
+        self.content = SectionContent.objects.create(
+            section=self.section, title='Photosynthesis notes', text_content='Light reactions happen in the thylakoid.',
+            uploaded_by=self.instructor.user,
+        )
+        Lesson.objects.create(module=self.other, title='Photosynthesis', content='Not for this student')
+        self.course = Course.objects.create(
+            title='Biology', code='BIO1', description='d', instructor=self.instructor.user,
+            start_date=timezone.now().date(), end_date=timezone.now().date(),
+        )
+        CourseEnrollment.objects.create(student=self.student, course=self.course)
+        self.announcement = Announcement.objects.create(
+            course=self.course, title='Lab moved', content='The photosynthesis lab is on Friday <b>sharp</b>',
+            created_by=self.instructor.user,
+        )
+
+    def search(self, auth, **params):
+        response = self.client.get('/api/modules/search/', params, **auth)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_scoped_ranked_and_highlighted(self):
+        results = self.search(self.student_auth, q='photosynthesis')
+        self.assertEqual(
+            [(result['kind'], result['id']) for result in results][:1], [('section_content', self.content.pk)]
+        )
+        self.assertEqual(
+            {(result['kind'], result['id']) for result in results},
+            {('section_content', self.content.pk), ('section', self.section.pk), ('announcement', self.announcement.pk)},
+        )
+        self.assertEqual(results[0]['title'], '<mark>Photosynthesis</mark> notes')
+        announcement = next(result for result in results if result['kind'] == 'announcement')
+        self.assertIn('<mark>photosynthesis</mark>', announcement['snippet'])
+        self.assertIn('&lt;b&gt;sharp&lt;/b&gt;', announcement['snippet'])
+
+        # Unenrolled: only the course announcement is left
+        self.module.students.remove(self.student)
+        results = self.search(self.student_auth, q='photosynthesis')
+        self.assertEqual([result['kind'] for result in results], ['announcement'])
+
+        results = self.search(self.instructor_auth, q='photosynthesis', kind='section,announcement')
+        self.assertEqual({result['kind'] for result in results}, {'section', 'announcement'})
+
+    def test_documents_follow_their_rows(self):
+        self.content.text_content = 'Calvin cycle in the stroma'
+        self.content.save()
+        self.assertEqual([result['id'] for result in self.search(self.student_auth, q='stroma')], [self.content.pk])
+        self.assertEqual(self.search(self.student_auth, q='thylakoid'), [])
+        # Prefix of the last word
+        self.assertEqual(len(self.search(self.student_auth, q='calvin cyc')), 1)
+
+        self.section.delete()
+        self.assertFalse(SearchDocument.objects.filter(kind__in=['section', 'section_content']).exists())
+        self.assertEqual(self.search(self.student_auth, q='stroma'), [])
+
+    def test_query_validation(self):
+        response = self.client.get('/api/modules/search/', {'q': ' '}, **self.student_auth)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/modules/search/', {'q': 'x', 'kind': 'quiz'}, **self.student_auth)
+        self.assertEqual(response.status_code, 400)
+        # Punctuation is not FTS syntax
+        self.assertEqual(self.search(self.student_auth, q='"photo* OR (NEAR'), [])
+
+    def test_rebuild_command(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(self.search(self.student_auth, q='photosynthesis'), [])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(len(self.search(self.student_auth, q='photosynthesis')), 3)
+
+
+class BulkEditTests(ModuleFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.module = self.make_modules(1, 0)
+        self.sections = [
+            ModuleSection.objects.create(module=self.module, title=f'Week {i}', order=i) for i in range(6)
+        ]
+
+    def post(self, url, data):
+        return self.client.post(url, data, content_type='application/json', **self.instructor_auth)
+
+    def test_sparse_keys(self):
+        self.assertEqual(bulk.sparse_keys([1024, 2048, 3072]), [1024, 2048, 3072])
+        # Last to first: one new key, below the others
+        self.assertEqual(bulk.sparse_keys([3072, 1024, 2048]), [512, 1024, 2048])
+        self.assertEqual(bulk.sparse_keys([0, 0, 0]), [0, 1024, 2048])
+        # No room between 5 and 6: renumbered
+        self.assertEqual(bulk.sparse_keys([5, 9, 6]), [1024, 2048, 3072])
+
+    def test_reorder_touches_only_moved_rows(self):
+        ids = [section.pk for section in self.sections]
+        response = self.post('/api/modules/instructor/sections/bulk/', {'parent': self.module.pk, 'order': ids[::-1]})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            list(ModuleSection.objects.filter(module=self.module).values_list('pk', flat=True)), ids[::-1]
+        )
+
+        # Drag the last one to the top: a single row gets a key in the gap
+        order = [ids[0]] + ids[:0:-1]
+        response = self.post('/api/modules/instructor/sections/bulk/', {'parent': self.module.pk, 'order': order})
+        self.assertEqual(response.data['reordered'], 1)
+        self.assertEqual(list(ModuleSection.objects.filter(module=self.module).values_list('pk', flat=True)), order)
+
+        response = self.post('/api/modules/instructor/sections/bulk/', {'parent': self.module.pk, 'order': ids[1:]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_edits_checked_and_applied_together(self):
+        contents = [
+            SectionContent.objects.create(
+                section=self.sections[0], title=f'c{i}', order=i, uploaded_by=self.instructor.user
+            )
+            for i in range(3)
+        ]
+        other = Module.objects.create(code='QB900', title='Other', description='d')
+        foreign = ModuleSection.objects.create(module=other, title='Not mine')
+
+        response = self.post('/api/modules/instructor/sections/bulk/', {
+            'edits': [{'id': self.sections[0].pk, 'title': 'Mine'}, {'id': foreign.pk, 'title': 'Taken'}],
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ModuleSection.objects.get(pk=self.sections[0].pk).title, 'Week 0')
+
+        # One select and one UPDATE for all three, the search documents
+        # replaced, and the view's and bulk.edit's savepoints
+        with self.assertNumQueries(8):
+            response = self.post('/api/modules/instructor/section-contents/bulk/', {
+                'edits': [{'id': content.pk, 'text_content': f'Glycolysis part {content.order}'} for content in contents],
+            })
+        self.assertEqual(response.data, {'updated': 3})
+        self.assertEqual(
+            list(SectionContent.objects.filter(pk__in=[c.pk for c in contents]).values_list('text_content', flat=True)),
+            ['Glycolysis part 0', 'Glycolysis part 1', 'Glycolysis part 2'],
+        )
+        self.module.students.add(self.student)
+        response = self.client.get('/api/modules/search/', {'q': 'glycolysis'}, **self.student_auth)
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class ModuleCloningTests(ModuleFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        media_root = override_settings(MEDIA_ROOT=self.tmp)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def make_source(self, size):
+        module = self.make_modules(1, size)
+        for i in range(size):
+            quiz = Quiz.objects.create(module=module, title=f'q{i}', description='d', time_limit=timedelta(minutes=5))
+            for j in range(size):
+                question = QuizQuestion.objects.create(quiz=quiz, question_text=f'{i}.{j}', question_type='MCQ', order=j)
+                QuizChoice.objects.create(question=question, choice_text=f'{i}.{j} yes', is_correct=True)
+                QuizChoice.objects.create(question=question, choice_text=f'{i}.{j} no')
+        return module
+
+    def test_query_count_does_not_grow_with_the_module(self):
+        counts = []
+        for size in (1, 3):
+            source = self.make_source(size)
+            with CaptureQueriesContext(connection) as queries:
+                cloning.clone_module(source, f'CL{size}', self.instructor)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_clone_copies_the_tree_and_shares_files(self):
+        source = self.make_source(2)
+        quiz = source.quizzes.first()
+        quiz.is_published = True
+        quiz.save()
+        content = SectionContent(section=source.sections.first(), title='Syllabus', uploaded_by=self.instructor.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            content.file.save('syllabus.txt', ContentFile(b'Week one: mitochondria'))
+
+        response = self.client.post(
+            f'/api/modules/instructor/modules/{source.pk}/clone/', {'code': 'QB2025', 'title': 'Budget 2025'},
+            content_type='application/json', **self.instructor_auth,
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['copied'], {
+            'sections': 2, 'section_contents': 5, 'contents': 2, 'tests': 2,
+            'quizzes': 2, 'questions': 4, 'choices': 8,
+        })
+        module = Module.objects.get(code='QB2025')
+        self.assertEqual((module.title, module.instructor_id, module.students.count()), ('Budget 2025', self.instructor.pk, 0))
+        self.assertFalse(module.quizzes.filter(is_published=True).exists())
+        self.assertEqual(
+            sorted(QuizChoice.objects.filter(question__quiz__module=module).values_list(
+                'question__quiz__title', 'question__question_text', 'choice_text'
+            )),
+            sorted(QuizChoice.objects.filter(question__quiz__module=source).values_list(
+                'question__quiz__title', 'question__question_text', 'choice_text'
+            )),
+        )
+        self.assertEqual(
+            sorted(module.contents.values_list('position', flat=True)),
+            sorted(source.contents.values_list('position', flat=True)),
+        )
+
+        # One blob, two references: deleting the original keeps the copy's file
+        copy = SectionContent.objects.get(section__module=module, title='Syllabus')
+        self.assertEqual(copy.file.name, content.file.name)
+        self.assertEqual(copy.previews, SectionContent.objects.get(pk=content.pk).previews)
+        self.assertEqual(StoredBlob.objects.get().refs, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            content.delete()
+        self.assertTrue(os.path.exists(copy.file.path))
+
+        module.students.add(self.student)
+        response = self.client.get('/api/modules/search/', {'q': 'syllabus'}, **self.student_auth)
+        self.assertEqual([result['id'] for result in response.data['results']], [copy.pk])
+
+    def test_from_template(self):
+        source = self.make_source(1)
+        template = ModuleTemplate.objects.create(name='Intro', code='T-INTRO', source_module=source)
+        response = self.client.post(
+            '/api/modules/instructor/modules/from-template/', {'template': template.pk, 'code': 'INTRO-26'},
+            content_type='application/json', **self.instructor_auth,
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['title'], 'Intro')
+        self.assertEqual(response.data['copied']['sections'], 1)
+
+        response = self.client.post(
+            '/api/modules/instructor/modules/from-template/', {'template': template.pk, 'code': 'INTRO-26'},
+            content_type='application/json', **self.instructor_auth,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('code', response.data)
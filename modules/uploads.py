@@ -0,0 +1,176 @@
+"""
+Resumable chunked uploads of module and section content.
+
+Large lecture videos and slide decks don't go through MultiPartParser in one
+request. A client creates an UploadSession with the file's name and size,
+PUTs numbered chunks (in any order, retrying or resuming as needed; the
+session lists what is still missing), then finalizes:
+
+* each chunk is streamed from the request straight to its offset in one
+  partial file, hashed as it is written and checked against the client's
+  ``X-Chunk-SHA256`` when sent;
+* finalize streams the assembled file once for its SHA-256, checks it
+  against the session's, and hands the file to the storage, which moves
+  rather than copies it where it can.
+
+Nothing is ever held in memory beyond ``HASH_BLOCK_SIZE``. Abandoned
+sessions expire after ``UPLOAD_SESSION_TTL``; ``manage.py purge_uploads``
+removes them and their partial files.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ModuleContent, SectionContent, UploadChunk, UploadSession
+
+UPLOAD_CHUNK_SIZE = getattr(settings, 'UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+UPLOAD_MIN_CHUNK_SIZE = 64 * 1024
+UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+UPLOAD_MAX_SIZE = getattr(settings, 'UPLOAD_MAX_SIZE', 4 * 1024 * 1024 * 1024)
+UPLOAD_SESSION_TTL = getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 60 * 60)  # seconds
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """A chunk or finalize request the client has to correct; the message says how."""
+
+
+class AssembledFile(File):
+    # FileSystemStorage moves a file that has a temporary_file_path instead
+    # of copying it, like it does for TemporaryUploadedFile; modules.storage
+    # also takes the digest from ``sha256`` instead of hashing it again
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def session_dir():
+    # Outside MEDIA_ROOT: partial files must never be served
+    return getattr(settings, 'UPLOAD_SESSION_DIR', os.path.join(settings.BASE_DIR, 'uploads'))
+
+
+def part_path(session):
+    return os.path.join(session_dir(), f'{session.pk.hex}.part')
+
+
+def create_session(**fields):
+    """Create a session and its partial file, sized up front."""
+    fields.setdefault('chunk_size', UPLOAD_CHUNK_SIZE)
+    fields.setdefault('expires_at', timezone.now() + timedelta(seconds=UPLOAD_SESSION_TTL))
+    session = UploadSession.objects.create(**fields)
+    os.makedirs(session_dir(), exist_ok=True)
+    with open(part_path(session), 'wb') as part:
+        part.truncate(session.size)
+    return session
+
+
+def chunk_length(session, index):
+    """Byte length of chunk ``index``; only the last chunk may be short."""
+    if not 0 <= index < session.chunk_count:
+        raise UploadError(f'Chunk index must be between 0 and {session.chunk_count - 1}')
+    return min(session.chunk_size, session.size - index * session.chunk_size)
+
+
+def write_chunk(session, index, stream, sha256=None):
+    """
+    Stream chunk ``index`` from ``stream`` into the partial file. Re-sending
+    a chunk overwrites it. Returns the UploadChunk.
+    """
+    length = chunk_length(session, index)
+    # Until it is verified the chunk doesn't count as received
+    UploadChunk.objects.filter(session=session, index=index).delete()
+
+    digest = hashlib.sha256()
+    remaining = length
+    with open(part_path(session), 'r+b') as part:
+        part.seek(index * session.chunk_size)
+        while remaining:
+            block = stream.read(min(HASH_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            part.write(block)
+            digest.update(block)
+            remaining -= len(block)
+    if remaining or stream.read(1):
+        raise UploadError(f'Chunk {index} must be exactly {length} bytes')
+    if sha256 and digest.hexdigest() != sha256.lower():
+        raise UploadError(f'Chunk {index} does not match its SHA-256')
+
+    chunk, _ = UploadChunk.objects.update_or_create(
+        session=session, index=index, defaults={'size': length, 'sha256': digest.hexdigest()}
+    )
+    return chunk
+
+
+def missing_chunks(session):
+    received = set(session.chunks.values_list('index', flat=True))
+    return [index for index in range(session.chunk_count) if index not in received]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize(session):
+    """
+    Attach the assembled file to a new content and end the session.
+    Returns ``(content, sha256)``.
+    """
+    path = part_path(session)
+    file_type = session.file_type or os.path.splitext(session.file_name)[1].lstrip('.').lower()
+    if session.section_id:
+        content = SectionContent(
+            section_id=session.section_id, title=session.title, file_type=file_type, uploaded_by_id=session.owner_id,
+        )
+    else:
+        content = ModuleContent(
+            module_id=session.module_id, title=session.title, file_type=file_type, uploaded_by_id=session.owner_id,
+        )
+    with transaction.atomic():
+        # Locked before the part file is read: a repeated finalize waits here
+        # and finds the session gone, rather than the file moved away or
+        # attached twice
+        if not UploadSession.objects.select_for_update().filter(pk=session.pk).exists():
+            raise UploadError('This upload has already been finalized')
+        missing = missing_chunks(session)
+        if missing:
+            raise UploadError(f'{len(missing)} chunks are missing, starting with chunk {missing[0]}')
+        sha256 = file_sha256(path)
+        if session.sha256 and sha256 != session.sha256.lower():
+            raise UploadError('The assembled file does not match the session SHA-256; re-send the chunks that differ')
+        with AssembledFile(open(path, 'rb'), name=session.file_name) as assembled:
+            assembled.sha256 = sha256
+            content.file.save(session.file_name, assembled, save=True)
+        session.delete()
+    # Left behind by storages that copy
+    _remove(path)
+    return content, sha256
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def discard(session):
+    path = part_path(session)
+    session.delete()
+    _remove(path)
+
+
+def purge_expired(now=None):
+    """Remove expired sessions and their partial files; returns how many."""
+    expired = list(UploadSession.objects.filter(expires_at__lte=now or timezone.now()))
+    for session in expired:
+        discard(session)
+    return len(expired)
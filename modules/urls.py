@@ -7,10 +7,17 @@ router.register(r'instructor/modules', views.ModuleViewSet, basename='instructor
 router.register(r'student/modules', views.StudentModuleViewSet, basename='student-module')
 router.register(r'instructor/sections', views.ModuleSectionViewSet, basename='instructor-section')
 router.register(r'instructor/section-contents', views.SectionContentViewSet, basename='instructor-section-content')
+router.register(r'instructor/uploads', views.UploadSessionViewSet, basename='instructor-upload')
 
 urlpatterns = [
     path('', include(router.urls)),
     
+    # Live events (Server-Sent Events)
+    path('student/events/', views.student_event_stream, name='student_event_stream'),
+
+    # Full-text search of course material
+    path('search/', views.search_content, name='search_content'),
+
     # Student Grades URL
     path('student/grades/', views.student_grades, name='student_grades'),
     
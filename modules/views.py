@@ -1,48 +1,91 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.core.exceptions import PermissionDenied
 from django.utils import timezone
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
 import modules.views
 from djoser.views import UserViewSet
 from datetime import timedelta
 
 from accounts.models import Student
 from .models import (
-    Module, ModuleContent, StudentModuleProgress, ModuleNotification,
+    Module, ModuleContent, ModuleNotification,
     NotificationComment, ModuleTest, Quiz, QuizQuestion, QuizChoice, QuizAttempt,
-    ModuleSection, SectionContent, QuizAnswer
+    ModuleSection, SectionContent, QuizAnswer, SearchDocument, UploadSession
 )
 from .serializers import (
-    ModuleSerializer, ModuleContentSerializer, ModuleStudentManagementSerializer,
+    ModuleSerializer, ModuleContentSerializer, ModuleStudentManagementSerializer, ModuleRosterSerializer,
     StudentSerializer, ModuleNotificationSerializer, NotificationCommentSerializer,
-    ModuleTestSerializer, ModuleSectionSerializer, SectionContentSerializer
+    ModuleTestSerializer, ModuleSectionSerializer, SectionContentSerializer, UploadSessionSerializer,
+    SectionBulkEditSerializer, SectionContentBulkEditSerializer, ModuleCloneSerializer, ModuleFromTemplateSerializer,
 )
 import mimetypes
 from django.contrib.auth.decorators import login_required
 from rest_framework import permissions
 from assignments.models import Assignment, AssignmentSubmission  # adjust import as needed
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from accounts.authentication import CachedJWTAuthentication
+from accounts.permissions import IsInstructor
+from accounts.roles import resolve_role
+from lms_backend.pagination import InvalidCursor, next_page_url, page_size_param
+from . import bulk, cloning, completion, events, inbox, media, membership, roster, search, uploads
+from .cache import module_payload_response
+from .conditional import ScalarAggregate, conditional_response
+from .queries import (
+    ModuleFieldset, with_module_relations, notification_queryset, section_queryset,
+    with_progress, percentage,
+)
 
 # Create your views here.
 
+# Server-Sent Events (see student_event_stream)
+EVENTS_HEARTBEAT = getattr(settings, 'EVENTS_HEARTBEAT', 15)  # seconds
+EVENTS_RETRY_MS = getattr(settings, 'EVENTS_RETRY_MS', 5000)
+
+class FieldsetViewMixin:
+    """``?fields=``/``?expand=`` for list and retrieve (see modules.queries.ModuleFieldset)."""
+
+    def get_module_fieldset(self):
+        if self.action not in ('list', 'retrieve'):
+            return None
+        if not hasattr(self, '_module_fieldset'):
+            self._module_fieldset = ModuleFieldset.from_request(self.request)
+        return self._module_fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['module_fieldset'] = self.get_module_fieldset()
+        return context
+
 @method_decorator(csrf_exempt, name='dispatch')
-class ModuleViewSet(viewsets.ModelViewSet):
+class ModuleViewSet(FieldsetViewMixin, viewsets.ModelViewSet):
     serializer_class = ModuleSerializer
     permission_classes = [IsAuthenticated]
     http_method_names = ['get', 'post', 'put', 'patch', 'delete']
 
     def get_queryset(self):
-        if hasattr(self.request.user, 'instructor'):
-            return Module.objects.filter(instructor=self.request.user.instructor)
+        if self.request.role == 'instructor':
+            modules = Module.objects.filter(instructor=self.request.profile)
+            if self.action in ('list', 'retrieve'):
+                modules = with_module_relations(modules, self.get_module_fieldset())
+            return modules
         return Module.objects.none()
 
     def create(self, request, *args, **kwargs):
-        if not hasattr(request.user, 'instructor'):
+        if request.role != 'instructor':
             return Response(
                 {"error": "Only instructors can create modules"}, 
                 status=status.HTTP_403_FORBIDDEN
@@ -59,7 +102,7 @@ class ModuleViewSet(viewsets.ModelViewSet):
         )
 
     def perform_create(self, serializer):
-        serializer.save(instructor=self.request.user.instructor)
+        serializer.save(instructor=self.request.profile)
 
     @action(detail=True, methods=['post'])
     def manage_students(self, request, pk=None):
@@ -69,24 +112,81 @@ class ModuleViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        student_ids = serializer.validated_data['student_ids']
+        student_ids = roster.select_students(ids=serializer.validated_data['student_ids'])
         action = serializer.validated_data['action']
-        
-        try:
-            students = Student.objects.filter(id__in=student_ids)
-            if action == 'add':
-                module.students.add(*students)
-                message = 'Students added successfully'
-            else:
-                module.students.remove(*students)
-                message = 'Students removed successfully'
-            
-            return Response({'message': message}, status=status.HTTP_200_OK)
-        except Exception as e:
+        roster.apply(action, [module.id], student_ids)
+        if action == 'add':
+            message = 'Students added successfully'
+        else:
+            message = 'Students removed successfully'
+        return Response({'message': message}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='roster',
+            parser_classes=[JSONParser, MultiPartParser, FormParser])
+    def bulk_roster(self, request):
+        """
+        Bulk enroll or remove students across modules (see modules.roster).
+        Changes over ROSTER_ASYNC_THRESHOLD enrollments, or with
+        ``background``, run as a job: 202 with its state, polled at
+        roster/jobs/<id>/. Without a shared cache they run in the request.
+        """
+        if request.role != 'instructor':
+            return Response({'error': 'Only instructors can manage rosters'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = ModuleRosterSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        module_ids = sorted(set(data['module_ids']))
+        owned = set(self.get_queryset().filter(pk__in=module_ids).values_list('pk', flat=True))
+        if owned != set(module_ids):
             return Response(
-                {'error': str(e)}, 
-                status=status.HTTP_400_BAD_REQUEST
+                {'module_ids': [f'Not your module: {", ".join(str(pk) for pk in sorted(set(module_ids) - owned))}']},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        student_ids = roster.select_students(
+            ids=data.get('student_ids', ()), student_numbers=data['student_numbers'],
+            batch=data.get('batch'), program=data.get('program'),
+        )
+
+        large = len(module_ids) * len(student_ids) > roster.ROSTER_ASYNC_THRESHOLD
+        if (data['background'] or large) and roster.jobs_available():
+            job = roster.start_job(data['action'], module_ids, student_ids, owner_id=request.profile.id)
+            return Response(job, status=status.HTTP_202_ACCEPTED)
+        result = roster.apply(data['action'], module_ids, student_ids)
+        return Response({'students': len(student_ids), **result})
+
+    @action(detail=False, methods=['get'], url_path='roster/jobs/(?P<job_id>[0-9a-f]{32})')
+    def roster_job(self, request, job_id=None):
+        job = roster.job_status(job_id)
+        if request.role != 'instructor' or job is None or job['owner'] != request.profile.id:
+            raise Http404
+        return Response(job)
+
+    @action(detail=True, methods=['post'])
+    def clone(self, request, pk=None):
+        """Copy one of your modules, with its sections, contents, tests and quizzes (see modules.cloning)."""
+        source = self.get_object()
+        serializer = ModuleCloneSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        module, copied = cloning.clone_module(source, instructor=request.profile, **serializer.validated_data)
+        return Response(
+            {'id': module.id, 'code': module.code, 'title': module.title, 'copied': copied},
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=False, methods=['post'], url_path='from-template')
+    def from_template(self, request):
+        """Start a module from a ModuleTemplate: a copy of its source module."""
+        if request.role != 'instructor':
+            return Response({'error': 'Only instructors can create modules'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = ModuleFromTemplateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = dict(serializer.validated_data)
+        module, copied = cloning.instantiate(data.pop('template'), instructor=request.profile, **data)
+        return Response(
+            {'id': module.id, 'code': module.code, 'title': module.title, 'copied': copied},
+            status=status.HTTP_201_CREATED,
+        )
 
     @action(detail=True, methods=['get', 'post', 'delete'],
             serializer_class=ModuleContentSerializer,
@@ -102,18 +202,18 @@ class ModuleViewSet(viewsets.ModelViewSet):
         module = self.get_object()
         
         if request.method == 'GET':
-            notifications = module.notifications.all()
+            notifications = notification_queryset().filter(module=module)
             serializer = ModuleNotificationSerializer(notifications, many=True)
             return Response(serializer.data)
         
         elif request.method == 'POST':
-            if not hasattr(request.user, 'instructor'):
+            if request.role != 'instructor':
                 return Response(
                     {"error": "Only instructors can create notifications"}, 
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            if module.instructor != request.user.instructor:
+            if module.instructor_id != request.profile.id:
                 return Response(
                     {"error": "You can only create notifications for your own modules"}, 
                     status=status.HTTP_403_FORBIDDEN
@@ -121,10 +221,12 @@ class ModuleViewSet(viewsets.ModelViewSet):
             
             serializer = ModuleNotificationSerializer(data=request.data)
             if serializer.is_valid():
-                serializer.save(
-                    module=module,
-                    created_by=request.user
-                )
+                # The post_save signal fans it out to the students' inboxes
+                with transaction.atomic():
+                    serializer.save(
+                        module=module,
+                        created_by=request.user
+                    )
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
@@ -137,14 +239,14 @@ class ModuleViewSet(viewsets.ModelViewSet):
                 )
             
             try:
-                notification = module.notifications.get(id=notification_id)
+                notification = ModuleNotification.objects.get(id=notification_id, module_id=module.id)
             except ModuleNotification.DoesNotExist:
                 return Response(
                     {"error": "Notification not found"}, 
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            if not hasattr(request.user, 'instructor') or module.instructor != request.user.instructor:
+            if request.role != 'instructor' or module.instructor_id != request.profile.id:
                 return Response(
                     {"error": "You can only modify notifications for your own modules"}, 
                     status=status.HTTP_403_FORBIDDEN
@@ -171,30 +273,35 @@ class ModuleViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def progress(self, request, pk=None):
         module = self.get_object()
-        if not module.students.filter(id=request.user.student.id).exists():
+        if request.role != 'student' or not membership.is_enrolled(request.profile.id, module.id):
             raise PermissionDenied("You are not enrolled in this module")
-        
-        total_contents = module.contents.count()
-        completed_contents = StudentModuleProgress.objects.filter(
-            student=request.user.student,
-            module=module,
-            completed=True
-        ).count()
-        
-        progress_percentage = (completed_contents / total_contents * 100) if total_contents > 0 else 0
-        
+
+        module = with_progress(Module.objects.filter(pk=module.pk), request.profile).get()
         return Response({
             'module_id': module.id,
-            'total_contents': total_contents,
-            'completed_contents': completed_contents,
-            'progress_percentage': round(progress_percentage, 2)
+            'total_contents': module.total_contents,
+            'completed_contents': module.completed_contents,
+            'progress_percentage': percentage(module.completed_contents, module.total_contents)
+        })
+
+    @action(detail=True, methods=['get'])
+    def heatmap(self, request, pk=None):
+        """Students × contents completion matrix of the module (see modules.completion)."""
+        module = self.get_object()
+        contents, rows = completion.completion_matrix(module.id)
+        for row in rows:
+            row['progress_percentage'] = percentage(row['completed_contents'], len(contents))
+        return Response({
+            'module_id': module.id,
+            'contents': contents,
+            'students': rows,
         })
 
     @action(detail=True, methods=['get'])
     def assignments(self, request, pk=None):
         module = self.get_object()
         # Only allow instructors who own the module
-        if not hasattr(request.user, 'instructor') or module.instructor != request.user.instructor:
+        if request.role != 'instructor' or module.instructor_id != request.profile.id:
             return Response({"detail": "Only the module's instructor can view assignments."}, status=403)
         assignments = module.assignments.all()
         from assignments.serializers import AssignmentSerializer
@@ -202,54 +309,110 @@ class ModuleViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 @method_decorator(csrf_exempt, name='dispatch')
-class StudentModuleViewSet(viewsets.ReadOnlyModelViewSet):
+class StudentModuleViewSet(FieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ModuleSerializer
     permission_classes = [IsAuthenticated]
     http_method_names = ['get', 'patch', 'post']
 
     def get_queryset(self):
-        if not hasattr(self.request.user, 'student'):
+        if self.request.role != 'student':
             raise PermissionDenied("Only students can access this view")
         return Module.objects.filter(
-            students=self.request.user.student,
+            students=self.request.profile,
             is_active=True
         )
 
+    def get_module_id(self):
+        """
+        The URL's module id, authorized against the cached membership (see
+        modules.membership) instead of fetching the module; 404 like
+        get_object() when the student isn't enrolled in it.
+        """
+        if self.request.role != 'student':
+            raise PermissionDenied("Only students can access this view")
+        try:
+            module_id = int(self.kwargs['pk'])
+        except ValueError:
+            raise Http404
+        if not membership.is_enrolled(self.request.profile.id, module_id):
+            raise Http404
+        return module_id
+
+    # list and retrieve take the module ids from the cached membership and
+    # serve the payload from the versioned cache; only a miss loads the
+    # module trees.
+
+    def list(self, request, *args, **kwargs):
+        modules = self.filter_queryset(self.get_queryset())
+        module_ids = sorted(membership.enrolled_module_ids(request.profile.id))
+
+        def build():
+            instances = with_module_relations(modules, self.get_module_fieldset())
+            return self.get_serializer(instances, many=True).data
+
+        return module_payload_response('student-modules:list', module_ids, request, build, signed_media=True)
+
+    def retrieve(self, request, *args, **kwargs):
+        module_id = self.get_module_id()
+
+        def build():
+            instance = with_module_relations(Module.objects.filter(pk=module_id), self.get_module_fieldset()).get()
+            return self.get_serializer(instance).data
+
+        return module_payload_response('student-modules:retrieve', [module_id], request, build, signed_media=True)
+
     @action(detail=False, methods=['get'])
     def notifications(self, request):
-        if not hasattr(request.user, 'student'):
+        """
+        The student's inbox, newest first: ``?cursor=`` and ``?page_size=``
+        (max 100) page through it, ``unread`` counts the unread ones.
+        """
+        if request.role != 'student':
             raise PermissionDenied("Only students can access this view")
-        
-        # Get all modules the student is enrolled in
-        enrolled_modules = Module.objects.filter(
-            students=request.user.student,
-            is_active=True
-        )
-        
-        # Get all notifications from these modules
-        notifications = ModuleNotification.objects.filter(
-            module__in=enrolled_modules
-        ).order_by('-created_at')
-        
-        serializer = ModuleNotificationSerializer(notifications, many=True)
-        return Response(serializer.data)
+
+        try:
+            rows, next_cursor = inbox.inbox_page(
+                request.profile.id,
+                cursor=request.query_params.get('cursor'),
+                page_size=page_size_param(request, default=20, maximum=100),
+            )
+        except InvalidCursor as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'next': next_page_url(request, next_cursor),
+            'unread': inbox.unread_count(request.profile.id),
+            'results': rows,
+        })
+
+    @action(detail=False, methods=['post'], url_path='notifications-read')
+    def mark_notifications_read(self, request):
+        """Mark the notifications in ``ids`` read, or all of them without ``ids``."""
+        if request.role != 'student':
+            raise PermissionDenied("Only students can access this view")
+
+        ids = request.data.get('ids')
+        if ids is not None and (
+            not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)
+        ):
+            return Response({"detail": "ids must be a list of notification IDs"}, status=status.HTTP_400_BAD_REQUEST)
+
+        updated = inbox.mark_read(request.profile.id, ids)
+        return Response({'updated': updated, 'unread': inbox.unread_count(request.profile.id)})
 
     @action(detail=True, methods=['get'])
     def contents(self, request, pk=None):
-        module = self.get_object()
-        if not module.students.filter(id=request.user.student.id).exists():
-            raise PermissionDenied("You are not enrolled in this module")
-        
-        contents = module.contents.all()
-        serializer = ModuleContentSerializer(contents, many=True)
-        return Response(serializer.data)
+        module_id = self.get_module_id()
+        return module_payload_response(
+            'student-modules:contents', [module_id], request,
+            lambda: ModuleContentSerializer(ModuleContent.objects.filter(module_id=module_id), many=True).data,
+            signed_media=True,
+        )
 
     @action(detail=True, methods=['post'])
     def add_comment(self, request, pk=None):
-        module = self.get_object()
-        if not module.students.filter(id=request.user.student.id).exists():
-            raise PermissionDenied("You are not enrolled in this module")
-        
+        module_id = self.get_module_id()
+
         notification_id = request.data.get('notification_id')
         text = request.data.get('text')
         
@@ -260,7 +423,7 @@ class StudentModuleViewSet(viewsets.ReadOnlyModelViewSet):
             )
         
         try:
-            notification = module.notifications.get(id=notification_id)
+            notification = ModuleNotification.objects.get(id=notification_id, module_id=module_id)
             comment = NotificationComment.objects.create(
                 notification=notification,
                 user=request.user,
@@ -276,39 +439,61 @@ class StudentModuleViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=True, methods=['get'])
     def tests(self, request, pk=None):
-        module = self.get_object()
-        if not module.students.filter(id=request.user.student.id).exists():
-            raise PermissionDenied("You are not enrolled in this module")
-        
-        tests = module.tests.all()
+        tests = ModuleTest.objects.filter(module_id=self.get_module_id())
         serializer = ModuleTestSerializer(tests, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'])
     def progress(self, request, pk=None):
-        module = self.get_object()
-        if not module.students.filter(id=request.user.student.id).exists():
-            raise PermissionDenied("You are not enrolled in this module")
-        
-        total_contents = module.contents.count()
-        completed_contents = StudentModuleProgress.objects.filter(
-            student=request.user.student,
-            module=module,
-            completed=True
-        ).count()
-        
-        progress_percentage = (completed_contents / total_contents * 100) if total_contents > 0 else 0
-        
+        module = with_progress(Module.objects.filter(pk=self.get_module_id()), request.profile).get()
+
         return Response({
             'module_id': module.id,
-            'total_contents': total_contents,
-            'completed_contents': completed_contents,
-            'progress_percentage': round(progress_percentage, 2)
+            'total_contents': module.total_contents,
+            'completed_contents': module.completed_contents,
+            'progress_percentage': percentage(module.completed_contents, module.total_contents)
+        })
+
+    @action(detail=False, methods=['get'])
+    def dashboard(self, request):
+        """
+        Progress in every enrolled module, from one query: the
+        student's completed/total contents, when they last opened the module,
+        and the cohort's average progress for comparison.
+        """
+        modules = with_progress(
+            self.get_queryset().only('id', 'code', 'title').order_by('code'), request.profile
+        )
+        rows = []
+        total = completed = 0
+        for module in modules:
+            total += module.total_contents
+            completed += module.completed_contents
+            rows.append({
+                'module_id': module.id,
+                'code': module.code,
+                'title': module.title,
+                'total_contents': module.total_contents,
+                'completed_contents': module.completed_contents,
+                'progress_percentage': percentage(module.completed_contents, module.total_contents),
+                'last_accessed': module.last_accessed,
+                'cohort_average': min(
+                    percentage(module.cohort_completed, module.total_contents * module.enrolled_students), 100
+                ),
+            })
+
+        return Response({
+            'modules': rows,
+            'overall': {
+                'total_contents': total,
+                'completed_contents': completed,
+                'progress_percentage': percentage(completed, total),
+            },
         })
 
     @action(detail=True, methods=['patch'])
     def mark_content_complete(self, request, pk=None):
-        module = self.get_object()
+        module_id = self.get_module_id()
         content_id = request.data.get('content_id')
         if not content_id:
             return Response(
@@ -316,53 +501,47 @@ class StudentModuleViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         try:
-            content = module.contents.get(id=content_id)
-            progress, created = StudentModuleProgress.objects.get_or_create(
-                student=request.user.student,
-                module=module,
-                content=content,
-                defaults={'completed': True, 'completed_at': timezone.now()}
+            content_id = int(content_id)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Content not found'}, 
+                status=status.HTTP_404_NOT_FOUND
             )
-            if not created and not progress.completed:
-                progress.completed = True
-                progress.completed_at = timezone.now()
-                progress.save()
-            return Response({
-                'message': 'Content marked as completed',
-                'progress': {
-                    'total_contents': module.contents.count(),
-                    'completed_contents': StudentModuleProgress.objects.filter(
-                        student=request.user.student,
-                        module=module,
-                        completed=True
-                    ).count()
-                }
-            })
-        except ModuleContent.DoesNotExist:
+
+        found = ModuleContent.objects.filter(module_id=module_id).aggregate(
+            total=Count('id'), position=Max('position', filter=Q(id=content_id))
+        )
+        if found['position'] is None:
             return Response(
                 {'error': 'Content not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        enrollment = completion.mark_complete(request.profile.id, module_id, found['position'])
+        if enrollment is None:
+            raise PermissionDenied("You are not enrolled in this module")
+        return Response({
+            'message': 'Content marked as completed',
+            'progress': {
+                'total_contents': found['total'],
+                'completed_contents': enrollment.completed_contents
+            }
+        })
 
     @action(detail=True, methods=['get'])
     def assignments(self, request, pk=None):
-        module = self.get_object()
-        # Only allow students enrolled in the module
-        if not module.students.filter(id=request.user.student.id).exists():
-            return Response({"detail": "You are not enrolled in this module."}, status=403)
-        assignments = module.assignments.all()
+        assignments = Assignment.objects.filter(module_id=self.get_module_id())
         from assignments.serializers import AssignmentSerializer
         serializer = AssignmentSerializer(assignments, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='notifications/(?P<pk>[^/.]+)')
     def notification_detail(self, request, pk=None):
-        if not hasattr(request.user, 'student'):
+        if request.role != 'student':
             raise PermissionDenied("Only students can access this view")
         try:
-            notification = ModuleNotification.objects.get(pk=pk)
+            notification = notification_queryset().get(pk=pk)
             # Ensure the student is assigned to the module
-            if not notification.module.students.filter(id=request.user.student.id).exists():
+            if not membership.is_enrolled(request.profile.id, notification.module_id):
                 return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
             serializer = ModuleNotificationSerializer(notification)
             return Response(serializer.data)
@@ -371,22 +550,24 @@ class StudentModuleViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=True, methods=['get'], url_path='sections')
     def sections(self, request, pk=None):
-        module = self.get_object()
-        # Ensure the student is enrolled in the module
-        if not module.students.filter(id=request.user.student.id).exists():
-            raise PermissionDenied("You are not enrolled in this module")
-        sections = module.sections.all().order_by('order')
-        serializer = ModuleSectionSerializer(sections, many=True)
-        return Response(serializer.data)
+        module_id = self.get_module_id()
+        return module_payload_response(
+            'student-modules:sections', [module_id], request,
+            lambda: ModuleSectionSerializer(
+                section_queryset().filter(module_id=module_id).order_by('order'), many=True
+            ).data,
+            signed_media=True,
+        )
 
     @action(detail=True, methods=['get'])
     def announcements(self, request, pk=None):
-        module = self.get_object()
-        if not module.students.filter(id=request.user.student.id).exists():
-            raise PermissionDenied("You are not enrolled in this module")
-        announcements = module.notifications.all().order_by('-created_at')
-        serializer = ModuleNotificationSerializer(announcements, many=True)
-        return Response(serializer.data)
+        module_id = self.get_module_id()
+        return module_payload_response(
+            'student-modules:announcements', [module_id], request,
+            lambda: ModuleNotificationSerializer(
+                notification_queryset().filter(module_id=module_id).order_by('-created_at'), many=True
+            ).data
+        )
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -496,8 +677,10 @@ def student_quizzes(request, module_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def start_quiz_attempt(request, quiz_id):
+    if request.role != 'student':
+        return Response({'error': 'Only students can attempt quizzes'}, status=403)
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    student = request.user.student
+    student = request.profile
     
     # Check if student has already completed the quiz
     existing_attempt = QuizAttempt.objects.filter(
@@ -645,7 +828,7 @@ def instructor_quiz_page(request, module_id):
     module = get_object_or_404(Module, id=module_id)
     
     # Check if the user is the instructor of this module
-    if not hasattr(request.user, 'instructor') or module.instructor != request.user.instructor:
+    if request.role != 'instructor' or module.instructor_id != request.profile.id:
         raise PermissionDenied("You don't have permission to access this page")
     
     return render(request, 'modules/instructor_quiz.html', {
@@ -657,32 +840,62 @@ def student_quiz_page(request, module_id):
     module = get_object_or_404(Module, id=module_id)
     
     # Check if the user is a student enrolled in this module
-    if not hasattr(request.user, 'student') or not module.students.filter(id=request.user.student.id).exists():
+    if request.role != 'student' or not membership.is_enrolled(request.profile.id, module.id):
         raise PermissionDenied("You don't have permission to access this page")
     
     return render(request, 'modules/student_quiz.html', {
         'module': module
     })
 
-class IsInstructor(permissions.BasePermission):
-    def has_permission(self, request, view):
-        return hasattr(request.user, 'instructor')
+class BulkEditMixin:
+    """
+    POST bulk/: reorder the items of one parent and/or apply a batch of
+    partial edits in one request (see modules.bulk).
+    """
+    bulk_serializer_class = None
+    # Lookup from an item to the instructor it belongs to
+    bulk_owner_field = None
 
-class ModuleSectionViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        serializer = self.bulk_serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        # Bare rows: modules.bulk locks and writes them, get_queryset()'s prefetches would go unused
+        owned = self.queryset.model.objects.filter(**{self.bulk_owner_field: request.profile})
+        result = {}
+        try:
+            with transaction.atomic():
+                if 'edits' in data:
+                    result['updated'] = bulk.edit(owned, data['edits'])
+                if 'order' in data:
+                    order, result['reordered'] = bulk.reorder(owned, data['parent'], data['order'])
+                    result['order'] = [{'id': pk, 'order': key} for pk, key in order]
+        except bulk.BulkEditError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+class ModuleSectionViewSet(BulkEditMixin, viewsets.ModelViewSet):
     queryset = ModuleSection.objects.all()
     serializer_class = ModuleSectionSerializer
+    bulk_serializer_class = SectionBulkEditSerializer
+    bulk_owner_field = 'module__instructor'
     permission_classes = [permissions.IsAuthenticated, IsInstructor]
 
     def get_queryset(self):
-        return ModuleSection.objects.filter(module__instructor=self.request.user.instructor)
+        return section_queryset().filter(module__instructor=self.request.profile)
 
-class SectionContentViewSet(viewsets.ModelViewSet):
+class SectionContentViewSet(BulkEditMixin, viewsets.ModelViewSet):
     queryset = SectionContent.objects.all()
     serializer_class = SectionContentSerializer
+    bulk_serializer_class = SectionContentBulkEditSerializer
+    bulk_owner_field = 'section__module__instructor'
     permission_classes = [permissions.IsAuthenticated, IsInstructor]
 
     def get_queryset(self):
-        return SectionContent.objects.filter(section__module__instructor=self.request.user.instructor)
+        return SectionContent.objects.filter(
+            section__module__instructor=self.request.profile
+        ).select_related('uploaded_by')
 
     def perform_create(self, serializer):
         serializer.save(uploaded_by=self.request.user)
@@ -690,13 +903,56 @@ class SectionContentViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         serializer.save(uploaded_by=self.request.user)
 
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable chunked uploads (see modules.uploads): create a session, PUT
+    each chunk's raw bytes to chunks/<index>/, then POST finalize/. GET
+    shows which chunks are still missing; DELETE abandons the upload.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated, IsInstructor]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(owner=self.request.user, expires_at__gt=timezone.now())
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, pk=None, index=None):
+        session = self.get_object()
+        index = int(index)
+        try:
+            length = uploads.chunk_length(session, index)
+            if request.META.get('CONTENT_LENGTH') != str(length):
+                raise uploads.UploadError(f'Chunk {index} must be exactly {length} bytes')
+            # The raw body, never parsed: request.data would buffer it
+            chunk = uploads.write_chunk(session, index, request.stream, request.headers.get('X-Chunk-SHA256'))
+        except uploads.UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'index': chunk.index, 'size': chunk.size, 'sha256': chunk.sha256})
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        session = self.get_object()
+        try:
+            content, sha256 = uploads.finalize(session)
+        except uploads.UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(content, SectionContent):
+            data = SectionContentSerializer(content, context={'request': request}).data
+        else:
+            data = ModuleContentSerializer(content, context={'request': request}).data
+        return Response({**data, 'sha256': sha256}, status=status.HTTP_201_CREATED)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def instructor_all_quizzes(request):
-    if not hasattr(request.user, 'instructor'):
+    if request.role != 'instructor':
         return Response({"error": "Only instructors can access this view"}, status=403)
     
-    quizzes = Quiz.objects.filter(module__instructor=request.user.instructor)
+    quizzes = Quiz.objects.filter(module__instructor=request.profile)
     return Response({
         'quizzes': [{
             'id': quiz.id,
@@ -717,38 +973,49 @@ def instructor_all_quizzes(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def student_all_quizzes(request):
-    if not hasattr(request.user, 'student'):
+    if request.role != 'student':
         return Response({"error": "Only students can access this view"}, status=403)
     
     # Get all modules the student is enrolled in
-    enrolled_modules = Module.objects.filter(students=request.user.student)
+    enrolled_modules = Module.objects.filter(students=request.profile)
     
     # Get all published quizzes from these modules
     quizzes = Quiz.objects.filter(
         module__in=enrolled_modules,
         is_published=True
     ).select_related('module')
-    
-    return Response({
-        'quizzes': [{
-            'id': quiz.id,
-            'title': quiz.title,
-            'description': quiz.description,
-            'time_limit': quiz.time_limit.total_seconds() / 60,  # Convert to minutes
-            'total_points': quiz.total_points,
-            'module': {
-                'id': quiz.module.id,
-                'title': quiz.module.title
-            } if quiz.module else None,
-            'created_at': quiz.created_at,
-            'updated_at': quiz.updated_at
-        } for quiz in quizzes]
-    })
+
+    # One aggregate query stands in for the list as the ETag
+    stamp = quizzes.aggregate(
+        count=Count('id'), ids=Sum('id'),
+        updated=Max('updated_at'), modules_updated=Max('module__updated_at'),
+    )
+
+    def build():
+        return {
+            'quizzes': [{
+                'id': quiz.id,
+                'title': quiz.title,
+                'description': quiz.description,
+                'time_limit': quiz.time_limit.total_seconds() / 60,  # Convert to minutes
+                'total_points': quiz.total_points,
+                'module': {
+                    'id': quiz.module.id,
+                    'title': quiz.module.title
+                } if quiz.module else None,
+                'created_at': quiz.created_at,
+                'updated_at': quiz.updated_at
+            } for quiz in quizzes]
+        }
+
+    return conditional_response(
+        request, build, etag=('student-quizzes', request.profile.pk, *stamp.values())
+    )
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def student_grades(request):
-    if not hasattr(request.user, 'student'):
+    if request.role != 'student':
         return Response(
             {"error": "Only students can access grades"}, 
             status=status.HTTP_403_FORBIDDEN
@@ -756,68 +1023,119 @@ def student_grades(request):
     
     # Get all modules the student is enrolled in
     enrolled_modules = Module.objects.filter(
-        students=request.user.student,
+        students=request.profile,
         is_active=True
     )
     
-    grades_data = []
+    # Everything the grades depend on, aggregated in a single query for the ETag
+    assignments = Assignment.objects.filter(module__in=enrolled_modules)
+    quizzes = Quiz.objects.filter(module__in=enrolled_modules)
+    submissions = AssignmentSubmission.objects.filter(student=request.profile)
+    attempts = QuizAttempt.objects.filter(student=request.profile)
+    stamp = Student.objects.filter(pk=request.profile.pk).values(
+        modules=ScalarAggregate(enrolled_modules, 'COUNT', 'id'),
+        modules_updated=ScalarAggregate(enrolled_modules, 'MAX', 'updated_at'),
+        assignments=ScalarAggregate(assignments, 'COUNT', 'id'),
+        assignments_updated=ScalarAggregate(assignments, 'MAX', 'updated_at'),
+        quizzes=ScalarAggregate(quizzes, 'COUNT', 'id'),
+        quizzes_updated=ScalarAggregate(quizzes, 'MAX', 'updated_at'),
+        submissions=ScalarAggregate(submissions, 'COUNT', 'id'),
+        submissions_last=ScalarAggregate(submissions, 'MAX', 'id'),
+        submitted=ScalarAggregate(submissions, 'MAX', 'submitted_at'),
+        graded=ScalarAggregate(submissions, 'SUM', 'grade'),
+        attempts=ScalarAggregate(attempts, 'COUNT', 'id'),
+        attempts_last=ScalarAggregate(attempts, 'MAX', 'id'),
+        completed=ScalarAggregate(attempts, 'MAX', 'completed_at'),
+        scored=ScalarAggregate(attempts, 'SUM', 'score'),
+    ).first()
+
+    def build():
+        grades_data = []
     
-    for module in enrolled_modules:
-        module_data = {
-            'module_id': module.id,
-            'module_name': module.title,
-            'assignments': [],
-            'quizzes': []
-        }
+        for module in enrolled_modules:
+            module_data = {
+                'module_id': module.id,
+                'module_name': module.title,
+                'assignments': [],
+                'quizzes': []
+            }
         
-        # Get assignment grades
-        assignments = module.assignments.all()
-        for assignment in assignments:
-            submission = assignment.submissions.filter(student=request.user.student).first()
-            if submission:
-                module_data['assignments'].append({
-                    'id': assignment.id,
-                    'title': assignment.title,
-                    'grade': submission.grade,
-                    'max_grade': assignment.total_marks,
-                    'submitted_at': submission.submitted_at
-                })
+            # Get assignment grades
+            assignments = module.assignments.all()
+            for assignment in assignments:
+                submission = assignment.submissions.filter(student=request.profile).first()
+                if submission:
+                    module_data['assignments'].append({
+                        'id': assignment.id,
+                        'title': assignment.title,
+                        'grade': submission.grade,
+                        'max_grade': assignment.total_marks,
+                        'submitted_at': submission.submitted_at
+                    })
         
-        # Get quiz grades
-        quizzes = module.quizzes.all()
-        for quiz in quizzes:
-            attempt = quiz.attempts.filter(student=request.user.student).first()
-            if attempt and attempt.is_completed:
-                module_data['quizzes'].append({
-                    'id': quiz.id,
-                    'title': quiz.title,
-                    'score': attempt.score,
-                    'max_score': quiz.total_points,
-                    'attempted_at': attempt.completed_at
-                })
+            # Get quiz grades
+            quizzes = module.quizzes.all()
+            for quiz in quizzes:
+                attempt = quiz.attempts.filter(student=request.profile).first()
+                if attempt and attempt.is_completed:
+                    module_data['quizzes'].append({
+                        'id': quiz.id,
+                        'title': quiz.title,
+                        'score': attempt.score,
+                        'max_score': quiz.total_points,
+                        'attempted_at': attempt.completed_at
+                    })
         
-        grades_data.append(module_data)
+            grades_data.append(module_data)
     
-    return Response(grades_data)
+        return grades_data
+
+    return conditional_response(
+        request, build, etag=('student-grades', *(stamp or {}).values())
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_content(request):
+    """
+    Full-text search of what the user can see (see modules.search):
+    ``?q=``, optional ``?module=``, ``?kind=`` (comma-separated kinds) and
+    ``?limit=`` (max 50).
+    """
+    if request.role not in ('student', 'instructor'):
+        return Response({"error": "Only students and instructors can search"}, status=403)
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({"error": "q is required"}, status=400)
+    kinds = [kind for kind in request.query_params.get('kind', '').split(',') if kind]
+    if set(kinds) - {kind for kind, _ in SearchDocument.KINDS}:
+        return Response({"error": f"kind must be one of {', '.join(kind for kind, _ in SearchDocument.KINDS)}"}, status=400)
+    try:
+        module_id = int(request.query_params['module']) if request.query_params.get('module') else None
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        return Response({"error": "module and limit must be integers"}, status=400)
+    results = search.search(query, request.role, request.profile, module_id=module_id, kinds=kinds, limit=limit)
+    return Response({'results': results})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def student_assignment_detail(request, assignment_id):
-    if not hasattr(request.user, 'student'):
+    if request.role != 'student':
         return Response({"error": "Only students can access assignments"}, status=403)
     try:
         assignment = Assignment.objects.get(id=assignment_id)
         # Check if the student is enrolled in the module
-        if not assignment.module.students.filter(id=request.user.student.id).exists():
+        if not membership.is_enrolled(request.profile.id, assignment.module_id):
             return Response({"error": "You are not enrolled in this module"}, status=403)
         # Optionally, include student's submission
-        submission = assignment.submissions.filter(student=request.user.student).first()
+        submission = assignment.submissions.filter(student=request.profile).first()
         from assignments.serializers import AssignmentSerializer
         data = AssignmentSerializer(assignment).data
         data['submissions'] = []
         if submission:
             data['submissions'].append({
-                "file": submission.submitted_file.url if submission.submitted_file else None,
+                "file": media.signed_url(submission.submitted_file.name) if submission.submitted_file else None,
                 "grade": submission.grade,
             })
         return Response(data)
@@ -827,15 +1145,15 @@ def student_assignment_detail(request, assignment_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def student_assignment_submit(request, assignment_id):
-    if not hasattr(request.user, 'student'):
+    if request.role != 'student':
         return Response({"error": "Only students can submit assignments"}, status=403)
     try:
         assignment = Assignment.objects.get(id=assignment_id)
         # Check if the student is enrolled in the module
-        if not assignment.module.students.filter(id=request.user.student.id).exists():
+        if not membership.is_enrolled(request.profile.id, assignment.module_id):
             return Response({"error": "You are not enrolled in this module"}, status=403)
         # Check if already submitted
-        if assignment.submissions.filter(student=request.user.student).exists():
+        if assignment.submissions.filter(student=request.profile).exists():
             return Response({"error": "You have already submitted this assignment"}, status=400)
         # Handle file only
         file = request.FILES.get('file')
@@ -843,9 +1161,98 @@ def student_assignment_submit(request, assignment_id):
             return Response({"error": "No file uploaded."}, status=400)
         submission = AssignmentSubmission.objects.create(
             assignment=assignment,
-            student=request.user.student,
+            student=request.profile,
             submitted_file=file
         )
         return Response({"success": "Assignment submitted successfully"})
     except Assignment.DoesNotExist:
         return Response({"error": "Assignment not found"}, status=404)
+
+
+def _token_principal(request):
+    """
+    ``(role, profile)`` for an event stream or media request, or
+    ``(None, None)``. EventSource and media elements can't send headers, so
+    the access token may also come as ``?token=`` (keep such URLs out of
+    access logs).
+    """
+    header = request.headers.get('Authorization', '')
+    raw_token = header[len('Bearer '):] if header.startswith('Bearer ') else request.GET.get('token')
+    if not raw_token:
+        return None, None
+    authenticator = CachedJWTAuthentication()
+    try:
+        user = authenticator.get_user(authenticator.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None, None
+    return resolve_role(user)
+
+
+async def _event_stream(student_id):
+    async with events.broker.subscribe(events.student_channel(student_id)) as subscription:
+        yield f'retry: {EVENTS_RETRY_MS}\n\n'
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from closing an idle stream
+                yield ': keep-alive\n\n'
+                continue
+            yield f"id: {message['id']}\nevent: {message['type']}\ndata: {json.dumps(message['data'])}\n\n"
+
+
+async def student_event_stream(request):
+    """
+    Server-Sent Events stream of the student's live events: ``notification``,
+    ``comment``, ``grade`` and ``resync`` (refetch, events were dropped).
+    Needs an ASGI server; every open stream holds a connection.
+    """
+    role, profile = await sync_to_async(_token_principal)(request)
+    if role is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided or are invalid"}, status=401)
+    if role != 'student':
+        return JsonResponse({"error": "Only students can access this view"}, status=403)
+
+    response = StreamingHttpResponse(_event_stream(profile.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Don't let nginx buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def serve_media(request, path):
+    """
+    Uploaded files (see modules.media). Protected files need a signed URL,
+    or a principal allowed to see them, who is redirected to a signed URL.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    path = media.clean_path(path)
+    if path is None or media.is_blob(path):
+        raise Http404
+    if media.is_protected(path):
+        signature = request.GET.get('sig')
+        if signature is not None:
+            if not media.has_valid_signature(path, signature):
+                return JsonResponse({"error": "This link has expired"}, status=403)
+        else:
+            role, profile = _token_principal(request)
+            if role is None:
+                return JsonResponse({"detail": "Authentication credentials were not provided or are invalid"}, status=401)
+            allowed = media.can_access(role, profile, path)
+            if allowed is None:
+                raise Http404
+            if not allowed:
+                return JsonResponse({"error": "You do not have access to this file"}, status=403)
+            return HttpResponseRedirect(media.signed_url(path))
+
+    response = media.file_response(request, path)
+    if response is None:
+        raise Http404
+    if media.is_protected(path):
+        # No cached copy outlives the signed URL
+        max_age = media.MEDIA_SIGNED_URL_MAX_AGE - media.MEDIA_SIGNED_URL_WINDOW
+        response['Cache-Control'] = f'private, max-age={max_age}'
+        if media.is_immutable(path):
+            response['Cache-Control'] += ', immutable'
+    return response